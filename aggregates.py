@@ -0,0 +1,104 @@
+# aggregates.py
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+TOP_FRAUD_CUSTOMERS = 10
+
+
+def _add(total: pd.Series, part: pd.Series) -> pd.Series:
+    if part.empty:
+        return total
+    return part if total.empty else total.add(part, fill_value=0)
+
+
+class UploadSummary:
+    """
+    Chart aggregates for an upload that can be built chunk by chunk:
+    amount per category, transactions per hour and fraud count per customer.
+    Its size depends on the number of distinct keys, not on the row count.
+    Every dashboard chart and the API read from this object, so an upload
+    is aggregated once, in a single pass, whatever is displayed.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.category_amount = pd.Series(dtype=float)
+        self.hour_counts = pd.Series(dtype=float)
+        self.fraud_customers = pd.Series(dtype=float)
+        self.has_category = False
+        self.has_step = False
+        self.has_fraud = False
+
+    def update(self, df: pd.DataFrame | pl.DataFrame):
+        """Fold one chunk of raw transactions into the aggregates."""
+        if isinstance(df, pd.DataFrame):
+            # Only the aggregated columns are converted, not the whole frame
+            cols = [c for c in ('category', 'amount', 'step', 'fraud', 'customer') if c in df.columns]
+            df = pl.from_pandas(df[cols].astype({c: str for c in ('category', 'customer') if c in cols}))
+        return self._update_polars(df)
+
+    def _update_polars(self, df: pl.DataFrame):
+        self.rows += df.height
+        has_category = 'category' in df.columns and 'amount' in df.columns
+        has_step = 'step' in df.columns
+        has_fraud = 'fraud' in df.columns and 'customer' in df.columns
+
+        # All group-bys are planned together and collected in one call, so
+        # the chunk is read once and they run in parallel
+        lf = df.lazy()
+        queries = {}
+        if has_category:
+            queries['category'] = lf.group_by('category').agg(
+                pl.col('amount').cast(pl.Float64, strict=False).sum())
+        if has_fraud:
+            queries['customer'] = lf.filter(pl.col('fraud').cast(pl.Int64, strict=False) == 1)\
+                                    .group_by('customer').len()
+        if has_step:
+            queries['hour'] = lf.select(
+                ((pl.col('step').cast(pl.Float64, strict=False) - 1) % 24)
+                .fill_nan(None).cast(pl.Int64).drop_nulls().alias('hour'))
+        results = dict(zip(queries, pl.collect_all(list(queries.values()))))
+
+        if has_category:
+            self.has_category = True
+            self.category_amount = _add(self.category_amount,
+                                        _to_series(results['category'], 'category', 'amount'))
+        if has_step:
+            self.has_step = True
+            # 24 fixed bins: a bincount over the hour codes instead of a group-by
+            counts = np.bincount(results['hour']['hour'].to_numpy(), minlength=24)
+            hours = np.flatnonzero(counts)
+            self.hour_counts = _add(self.hour_counts,
+                                    pd.Series(counts[hours], index=hours, dtype=float))
+        if has_fraud:
+            self.has_fraud = True
+            self.fraud_customers = _add(self.fraud_customers,
+                                        _to_series(results['customer'], 'customer', 'len'))
+        return self
+
+    def top_fraud_customers(self, n: int = TOP_FRAUD_CUSTOMERS) -> pd.Series:
+        return self.fraud_customers.astype(int).nlargest(n)
+
+    def to_dict(self) -> dict:
+        """The aggregates as plain JSON-friendly values."""
+        return {
+            'rows': self.rows,
+            'category_amount': {str(k): float(v) for k, v in self.category_amount.items()}
+            if self.has_category else None,
+            'hour_counts': {int(k): int(v) for k, v in self.hour_counts.sort_index().items()}
+            if self.has_step else None,
+            'top_fraud_customers': {str(k): int(v) for k, v in self.top_fraud_customers().items()}
+            if self.has_fraud else None,
+        }
+
+
+def summarize(df) -> UploadSummary:
+    """df's aggregates, or df itself if it is already an UploadSummary."""
+    return df if isinstance(df, UploadSummary) else UploadSummary().update(df)
+
+
+def _to_series(agg: pl.DataFrame, key: str, value: str) -> pd.Series:
+    """A small polars group-by result as a pandas Series indexed by key."""
+    return pd.Series(agg[value].to_numpy(), index=agg[key].to_list(), dtype=float)
@@ -8,6 +8,7 @@ import dash_bootstrap_components as dbc
 from layout import layout
 from server import register_api_routes
 from callbacks import register_callbacks
+from ml_model import start_warmup
 
 # 1) Flask + API
 server = Flask(__name__)
@@ -28,5 +29,9 @@ app.layout = dcc.Loading(
 # 3) Callbacks
 register_callbacks(app)
 
+# 4) Load the model in the background, then pick up newly published
+#    versions without a restart; /api/v1/ready reports when scoring works
+start_warmup(watch=True)
+
 if __name__ == '__main__':
     app.run_server(debug=True, host='0.0.0.0', port=8050)
@@ -0,0 +1,59 @@
+# benchmarks/bench_bulk_load.py
+"""
+Insert throughput of the save_to_database loaders (bulk_load.LOADERS).
+
+    python benchmarks/bench_bulk_load.py [--url sqlite:///bench.db] [--rows 100000] [--batch 20000]
+
+Point --url at a SQL Server instance (mssql+pyodbc://...) to measure the
+fast_executemany path; the default is a temporary SQLite file.
+"""
+
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import polars as pl
+from sqlalchemy import create_engine
+
+from bulk_load import LOADERS, typed_frame
+
+
+def load_rows(n_rows: int) -> pl.DataFrame:
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")))
+    frames, total = [], 0
+    for path in files:
+        frames.append(pl.read_csv(path, infer_schema=False))
+        total += frames[-1].height
+        if total >= n_rows:
+            break
+    return pl.concat(frames).head(n_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", default=None)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=None)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    engine = create_engine(url)
+    df = load_rows(args.rows)
+
+    for name, cls in LOADERS.items():
+        loader = cls(engine, args.batch) if args.batch else cls(engine)
+        data = typed_frame(df) if name != "to_sql" else df
+        start = time.perf_counter()
+        written = loader.load(data, f"bench_{name}")
+        elapsed = time.perf_counter() - start
+        print(f"{name:<12} rows={written}  {elapsed:.2f}s  {written / elapsed:,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    main()
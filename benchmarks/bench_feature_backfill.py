@@ -0,0 +1,72 @@
+# benchmarks/bench_feature_backfill.py
+"""
+Time to compute the point-in-time history features for a training set:
+feature_store.backfill_history (sorted prefix sums) against replaying the
+rows through a FeatureStore one step at a time, as scoring records them.
+Rows come from data set/split_files, repeated up to each size with the
+steps shifted so the copies follow each other in time. Every run checks
+that both paths return identical features.
+
+    python benchmarks/bench_feature_backfill.py [--sizes 100000,593466,2000000] [--window 30] [--output out.json]
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import polars as pl
+
+from feature_store import FeatureStore, backfill_history
+
+
+def load_rows(n_rows: int) -> pl.DataFrame:
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")))
+    df = pl.concat([pl.read_csv(path, infer_schema=False) for path in files], how="diagonal")
+    df = df.with_columns(pl.col('step').cast(pl.Int64))
+    period = df['step'].max() + 1
+    copies = [df.with_columns(pl.col('step') + i * period) for i in range(-(-n_rows // df.height))]
+    return pl.concat(copies).head(n_rows)
+
+
+def timed(fn, repeat: int):
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="100000,593466,2000000")
+    parser.add_argument("--window", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    results = {'window': args.window, 'runs': []}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        df = load_rows(size)
+        backfill_s, backfilled = timed(lambda: backfill_history(df, args.window), args.repeat)
+        replay_s, replayed = timed(lambda: FeatureStore(args.window).observe(df), args.repeat)
+        run = {'rows': df.height, 'backfill_s': backfill_s, 'replay_s': replay_s,
+               'identical': backfilled.equals(replayed)}
+        results['runs'].append(run)
+        print(f"rows={df.height:<8} backfill {backfill_s:6.2f}s  replay {replay_s:6.2f}s  "
+              f"identical {run['identical']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+# benchmarks/bench_inference.py
+"""
+Latency and throughput of the inference backends (inference.BACKENDS) on
+the model at MODEL_PATH: single-row calls and one large batch, plus the
+time to load the model from pickle and from the native format.
+
+    python benchmarks/bench_inference.py [--rows 100000] [--single 2000] [--backends booster,sklearn] [--output out.json]
+
+Backends whose packages are missing (Treelite, ONNX Runtime) are skipped.
+"""
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import polars as pl
+
+import ml_model
+from inference import BACKENDS, load_native, make_backend, save_native
+
+
+def load_features(n_rows: int) -> np.ndarray:
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")))
+    frames, total = [], 0
+    for path in files:
+        frames.append(pl.read_csv(path, infer_schema=False))
+        total += frames[-1].height
+        if total >= n_rows:
+            break
+    df = pl.concat(frames).head(n_rows)
+    df = df.rename({c: c.replace('[', '').replace(']', '') for c in df.columns})
+    return ml_model.feature_matrix(df, ml_model.fit_encoders(df))
+
+
+def timed(fn, repeat: int = 1) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--single", type=int, default=2000, help="single-row calls to time")
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    model_path = os.getenv("MODEL_PATH", os.path.join(ROOT, "fraud_model.pkl"))
+    import xgboost  # noqa: F401  (keep the import out of the load timings)
+    load_pickle_s = timed(lambda: pickle.load(open(model_path, "rb")))
+    with open(model_path, "rb") as f:
+        model = pickle.load(f)
+    native_path = os.path.join(tempfile.mkdtemp(), "model.ubj")
+    save_native(model, native_path)
+    load_native_s = timed(lambda: load_native(native_path))
+    print(f"load: pickle {load_pickle_s * 1000:.1f} ms   native {load_native_s * 1000:.1f} ms")
+
+    X = load_features(args.rows)
+    results = {'rows': len(X), 'load_pickle_ms': load_pickle_s * 1000,
+               'load_native_ms': load_native_s * 1000, 'backends': {}}
+
+    for name in args.backends.split(","):
+        backend = make_backend(model, name, lib_dir=tempfile.mkdtemp())
+        if backend.name != name:
+            print(f"{name:<9} skipped (not available)")
+            continue
+        backend.predict_proba(X[:1])  # warm-up
+
+        latencies = []
+        for i in range(args.single):
+            row = X[i % len(X):i % len(X) + 1]
+            start = time.perf_counter()
+            backend.predict_proba(row)
+            latencies.append(time.perf_counter() - start)
+        batch_s = timed(lambda: backend.predict_proba(X), repeat=3)
+
+        lat_us = np.array(latencies) * 1e6
+        results['backends'][name] = {
+            'single_p50_us': float(np.percentile(lat_us, 50)),
+            'single_p99_us': float(np.percentile(lat_us, 99)),
+            'batch_s': batch_s,
+            'batch_rows_per_s': len(X) / batch_s,
+        }
+        r = results['backends'][name]
+        print(f"{name:<9} single p50 {r['single_p50_us']:8.1f} us  p99 {r['single_p99_us']:8.1f} us   "
+              f"batch {len(X)} rows {batch_s * 1000:8.1f} ms  {r['batch_rows_per_s']:,.0f} rows/s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# benchmarks/bench_parallel_scoring.py
+"""
+Wall-clock time to score (and chart) a large upload with
+scoring.ParallelScorer at different worker counts. Rows are taken from
+data set/split_files, repeated up to --rows.
+
+    python benchmarks/bench_parallel_scoring.py [--rows 600000] [--workers 1,2,4] [--output out.json]
+
+Pool start-up is excluded: each scorer scores the frame once to warm up.
+"""
+
+import argparse
+import glob
+import json
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import polars as pl
+
+import ml_model
+from aggregates import UploadSummary
+from charts import create_summary_charts
+from inference import make_backend
+from model_registry import ServingModel
+from scoring import ParallelScorer
+
+
+def load_rows(n_rows: int) -> pl.DataFrame:
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")))
+    df = pl.concat([pl.read_csv(path, infer_schema=False) for path in files[:4]])
+    df = df.rename({c: c.replace('[', '').replace(']', '') for c in df.columns})
+    df = df.with_columns(pl.col('step').cast(pl.Int64), pl.col('amount').cast(pl.Float64),
+                         pl.col('fraud').cast(pl.Int64))
+    repeats = -(-n_rows // df.height)
+    return pl.concat([df] * repeats).head(n_rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=600_000)
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    cpus = os.cpu_count() or 1
+    counts = [int(w) for w in args.workers.split(",")] if args.workers else \
+        sorted({1, 2, max(cpus // 2, 1), cpus})
+
+    df = load_rows(args.rows)
+    with open(os.getenv("MODEL_PATH", os.path.join(ROOT, "fraud_model.pkl")), "rb") as f:
+        model = pickle.load(f)
+    ml_model.swap_model(ServingModel(make_backend(model, "booster"), ml_model.fit_encoders(df), "bench"))
+
+    results = {'rows': df.height, 'cpus': cpus, 'runs': {}}
+    charts = ThreadPoolExecutor(max_workers=1)
+    for workers in counts:
+        scorer = ParallelScorer(workers=workers, min_rows=1)
+        scorer.score(df)  # start the pool and load the model in every worker
+
+        start = time.perf_counter()
+        scorer.score(df)
+        score_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        pending = charts.submit(lambda: create_summary_charts(UploadSummary().update(df)))
+        scorer.score(df)
+        pending.result()
+        overlapped_s = time.perf_counter() - start
+        scorer.close()
+
+        results['runs'][workers] = {'score_s': score_s, 'score_and_charts_s': overlapped_s}
+        print(f"workers={workers:<3} score {score_s:6.2f}s  ({df.height / score_s:,.0f} rows/s)   "
+              f"score+charts {overlapped_s:6.2f}s")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
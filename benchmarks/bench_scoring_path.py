@@ -0,0 +1,109 @@
+# benchmarks/bench_scoring_path.py
+"""
+Compare the pandas scoring path (process_uploaded_file -> pandas encode ->
+pandas chart aggregates) with the polars-native one (parse_uploaded_file ->
+polars encode -> polars aggregates) on the data set/split_files corpus.
+
+    python benchmarks/bench_scoring_path.py [--rows N] [--repeat 3] [--output out.json]
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import ml_model
+import charts
+from aggregates import UploadSummary
+from model_registry import ServingModel
+from utils import parse_uploaded_file, process_uploaded_file
+
+
+def load_corpus(max_rows: int | None) -> str:
+    """The split_files CSVs joined into one upload, as a base64 data URL."""
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")),
+                   key=lambda p: int(p.rsplit("_", 1)[1].split(".")[0]))
+    lines = []
+    for i, path in enumerate(files):
+        with open(path) as f:
+            part = f.read().splitlines()
+        lines.extend(part if i == 0 else part[1:])
+        if max_rows and len(lines) > max_rows:
+            lines = lines[:max_rows + 1]
+            break
+    b64 = base64.b64encode("\n".join(lines).encode()).decode()
+    return f"data:text/csv;base64,{b64}"
+
+
+def pandas_path(contents):
+    t = {}
+    start = time.perf_counter()
+    df = process_uploaded_file(contents)
+    t["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ml_model.score_transactions(df)
+    t["score"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    charts.create_summary_charts(df)
+    t["charts"] = time.perf_counter() - start
+    return t, len(df)
+
+
+def polars_path(contents):
+    t = {}
+    start = time.perf_counter()
+    df = parse_uploaded_file(contents)
+    t["parse"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    ml_model.score_transactions(df)
+    t["score"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    charts.create_summary_charts(UploadSummary().update(df))
+    t["charts"] = time.perf_counter() - start
+    return t, df.height
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", type=int, default=None, help="limit the corpus to N rows")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    contents = load_corpus(args.rows)
+
+    # Score with a bundle fitted on the corpus so both paths do real lookups
+    df = parse_uploaded_file(contents)
+    serving = ml_model.ensure_model_loaded()
+    model = getattr(serving, "model", serving)
+    ml_model.swap_model(ServingModel(model, ml_model.fit_encoders(df), "bench"))
+    del df
+
+    results = {}
+    for name, fn in (("pandas", pandas_path), ("polars", polars_path)):
+        runs = [fn(contents) for _ in range(args.repeat)]
+        best = {stage: min(r[0][stage] for r in runs) for stage in runs[0][0]}
+        best["total"] = sum(best.values())
+        results[name] = {"rows": runs[0][1], "seconds": best}
+        stages = "  ".join(f"{k}={v:.3f}s" for k, v in best.items())
+        print(f"{name:<7} rows={runs[0][1]}  {stages}")
+
+    speedup = results["pandas"]["seconds"]["total"] / results["polars"]["seconds"]["total"]
+    print(f"speedup {speedup:.2f}x")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start cost of the app: wall time of `import <module>` in a fresh
+interpreter, time until /api/v1/ready reports a loaded model, and the
+slowest imports from `python -X importtime`.
+
+    python benchmarks/bench_startup.py [--module app] [--repeat 5] [--top 15] [--output out.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Run in the child: import the module, then poll readiness through the API
+_CHILD = """
+import json, sys, time
+start = time.perf_counter()
+mod = __import__({module!r})
+imported = time.perf_counter() - start
+ready = None
+server = getattr(mod, 'server', None)
+if server is not None and {wait_ready!r}:
+    client = server.test_client()
+    while time.perf_counter() - start < 120:
+        if client.get('/api/v1/ready').status_code == 200:
+            ready = time.perf_counter() - start
+            break
+        time.sleep(0.01)
+print(json.dumps({{'import_s': imported, 'ready_s': ready}}))
+"""
+
+
+def run_once(module: str, wait_ready: bool) -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _CHILD.format(module=module, wait_ready=wait_ready)],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> list[dict]:
+    """Top-level-ish imports ranked by cumulative time (microseconds)."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cum_us, name = line.split(":", 1)[1].split("|")
+        rows.append({'module': name.strip(), 'self_ms': int(self_us) / 1000,
+                     'cumulative_ms': int(cum_us) / 1000})
+    return sorted(rows, key=lambda r: r['cumulative_ms'], reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--no-ready", action="store_true", help="skip waiting for the model")
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    runs = [run_once(args.module, not args.no_ready) for _ in range(args.repeat)]
+    imports = [r['import_s'] for r in runs]
+    readies = [r['ready_s'] for r in runs if r['ready_s'] is not None]
+    result = {
+        'module': args.module,
+        'import_s': {'min': min(imports), 'median': statistics.median(imports)},
+        'ready_s': {'min': min(readies), 'median': statistics.median(readies)} if readies else None,
+        'slowest_imports': slowest_imports(args.module, args.top),
+    }
+
+    print(f"import {args.module}: min {result['import_s']['min']:.2f}s  "
+          f"median {result['import_s']['median']:.2f}s")
+    if result['ready_s']:
+        print(f"ready:          min {result['ready_s']['min']:.2f}s  "
+              f"median {result['ready_s']['median']:.2f}s")
+    for row in result['slowest_imports']:
+        print(f"  {row['cumulative_ms']:9.1f} ms  {row['module']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
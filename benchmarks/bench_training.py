@@ -0,0 +1,214 @@
+# benchmarks/bench_training.py
+"""
+Time and peak RSS of ml_model.train_fraud_model, per phase, at several data
+sizes. Rows come from data set/split_files (or --csv, e.g.
+"data set/Bdika/fraud_training_10000.csv"), repeated up to each size and
+stored as uploads of --table-rows rows in a local SQLite stand-in for the
+database (fact-table storage, see storage.py).
+
+    python benchmarks/bench_training.py [--sizes 10000,100000,600000] [--modes in_memory,streaming] [--output out.json]
+
+Each run trains in a fresh interpreter with an empty training snapshot, so
+peak RSS is not inherited from earlier runs and the SQL read is included.
+Phases follow train_fraud_model's progress reports: read (snapshot sync
+and load), encode, SMOTE (in_memory) or build matrix (streaming), fit, save.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PHASES = {
+    "loading tables": "read",
+    "encoding": "encode",
+    "SMOTE": "SMOTE",
+    "building matrix": "build matrix",
+    "fitting": "fit",
+    "saving": "save",
+}
+
+
+def load_rows(n_rows: int, csv: str | None = None):
+    import polars as pl
+
+    files = [csv] if csv else sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")))
+    frames, total = [], 0
+    for path in files:
+        frames.append(pl.read_csv(path, infer_schema=False))
+        total += frames[-1].height
+        if total >= n_rows:
+            break
+    df = pl.concat(frames, how="diagonal")
+    df = df.rename({c: c.replace('[', '').replace(']', '') for c in df.columns})
+    return pl.concat([df] * -(-n_rows // df.height)).head(n_rows)
+
+
+def make_engine(workdir: str):
+    from sqlalchemy import create_engine, event
+
+    # SQLite stand-in: a second database file attached as the 'dbo' schema
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'main.db')}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{os.path.join(workdir, 'dbo.db')}' AS dbo")
+
+    return engine
+
+
+def build_database(workdir: str, n_rows: int, table_rows: int, csv: str | None):
+    """Store n_rows as registered uploads of table_rows rows each."""
+    from sqlalchemy import text
+    from bulk_load import typed_frame
+    from storage import write_batch
+
+    os.environ["STORAGE_MODE"] = "fact"
+    engine = make_engine(workdir)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at DATETIME)"))
+    df = load_rows(n_rows, csv)
+    start = datetime(2025, 1, 1)
+    for i, offset in enumerate(range(0, df.height, table_rows)):
+        name = f"transactions_bench_{i:04d}"
+        write_batch(engine, typed_frame(df.slice(offset, table_rows)), name)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO dbo.MasterTable VALUES (:tn, :fn, :ts)"),
+                         {"tn": name, "fn": f"{name}.csv", "ts": start + timedelta(minutes=i)})
+    engine.dispose()
+
+
+class RssSampler:
+    """Samples this process's RSS in a thread; mark() returns the peak since the last mark."""
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak = self.current()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def current() -> int:
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except OSError:
+            import resource
+            # Not Linux: fall back to the lifetime peak (KiB on Linux, bytes on macOS)
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return rss if sys.platform == "darwin" else rss * 1024
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.current())
+
+    def mark(self) -> int:
+        now = self.current()
+        peak, self.peak = max(self.peak, now), now
+        return peak
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_child(workdir: str, mode: str) -> dict:
+    """Train once in this process and return the phase timings."""
+    os.environ["STORAGE_MODE"] = "fact"
+    os.environ["TRAINING_MODE"] = mode
+    os.environ["TRAINING_SNAPSHOT_DIR"] = tempfile.mkdtemp(dir=workdir)
+
+    import database
+    import ml_model
+    import xgboost  # noqa: F401  (keep the imports out of the read phase)
+    if mode == "in_memory":
+        import imblearn  # noqa: F401
+
+    database.set_engine(make_engine(workdir))
+    sampler = RssSampler()
+    phases = []
+
+    def progress(phase, rows=0):
+        now = time.perf_counter()
+        if phases and phases[-1]['phase'] == PHASES.get(phase, phase):
+            phases[-1]['rows'] = max(phases[-1]['rows'], rows)
+            return
+        if phases:
+            phases[-1]['seconds'] = now - phases[-1].pop('_start')
+            phases[-1]['peak_rss_mb'] = sampler.mark() / 2**20
+        phases.append({'phase': PHASES.get(phase, phase), 'rows': rows, '_start': now})
+
+    start = time.perf_counter()
+    saved = ml_model.train_fraud_model(force=True, progress=progress,
+                                       model_path=os.path.join(workdir, f"model_{mode}.pkl"))
+    total = time.perf_counter() - start
+    if phases:
+        phases[-1]['seconds'] = time.perf_counter() - phases[-1].pop('_start')
+        phases[-1]['peak_rss_mb'] = sampler.mark() / 2**20
+    sampler.stop()
+    return {'mode': mode, 'saved': saved is not None, 'total_s': total,
+            'peak_rss_mb': max(p['peak_rss_mb'] for p in phases) if phases else None,
+            'phases': phases}
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10000,100000,600000")
+    parser.add_argument("--modes", default="in_memory,streaming")
+    parser.add_argument("--table-rows", type=int, default=50_000, help="rows per stored upload")
+    parser.add_argument("--csv", default=None, help="read rows from this CSV instead of split_files")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--child", nargs=2, metavar=("WORKDIR", "MODE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(*args.child)))
+        return
+
+    results = {'revision': git_revision(), 'python': platform.python_version(),
+               'cpus': os.cpu_count(), 'runs': []}
+    for size in [int(s) for s in args.sizes.split(",")]:
+        with tempfile.TemporaryDirectory(prefix="bench_training_") as workdir:
+            build_database(workdir, size, args.table_rows, args.csv)
+            for mode in args.modes.split(","):
+                out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", workdir, mode],
+                                     cwd=ROOT, capture_output=True, text=True)
+                if out.returncode != 0:
+                    print(out.stderr, file=sys.stderr)
+                    continue
+                run = json.loads(out.stdout.strip().splitlines()[-1])
+                run['rows'] = size
+                results['runs'].append(run)
+
+                print(f"rows={size:<8} {mode:<10} total {run['total_s']:7.2f}s  "
+                      f"peak {run['peak_rss_mb']:8.1f} MB")
+                for p in run['phases']:
+                    print(f"    {p['phase']:<13} {p['seconds']:7.2f}s  peak {p['peak_rss_mb']:8.1f} MB")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+# benchmarks/bench_update_table.py
+"""
+End-to-end latency of the upload callback (callbacks.update_table), driven
+through Dash's /_dash-update-component endpoint with uploads of increasing
+size built from data set/split_files, followed by the table's request for
+its first page. Reports time per stage and the bytes of each output sent
+back to the browser.
+
+    python benchmarks/bench_update_table.py [--rows 1000,10000,100000,600000] [--repeat 3] [--output out.json]
+
+Stages are timed by wrapping the functions update_table calls: parse
+(base64 decode + CSV parse), encode, predict, charts (built on a thread
+while scoring; charts_wait is the time update_table then blocks on them),
+suspicious_table and alert. 'records' is the rest of the callback (caching
+the frame for the table); 'json' is Dash encoding the outputs, 'dispatch'
+the remaining request handling and 'first_page' the whole page request. Uploads over
+STREAMING_UPLOAD_BYTES take the chunked path, timed as 'stream_upload'.
+The DB writes and historical-rate refresh run on background threads
+after the response; they are reported separately and waited for between
+runs. The database is a temporary SQLite file (fact-table storage);
+notifications are disabled. The fastest of --repeat runs is reported.
+"""
+
+import argparse
+import base64
+import glob
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("MODEL_PATH", os.path.join(ROOT, "fraud_model.pkl"))
+os.environ.setdefault("STORAGE_MODE", "fact")
+
+import dash
+import dash._callback
+from flask import Flask
+from sqlalchemy import create_engine, event, text
+
+import callbacks
+import database
+import ml_model
+from layout import layout
+
+BACKGROUND = ('save_to_database', 'historical_rate')
+
+
+def load_upload(n_rows: int) -> str:
+    """The first n_rows of split_files (repeated if needed) as a base64 CSV data URL."""
+    files = sorted(glob.glob(os.path.join(ROOT, "data set", "split_files", "*.csv")),
+                   key=lambda p: int(p.rsplit("_", 1)[1].split(".")[0]))
+    header, rows = None, []
+    while len(rows) < n_rows:
+        for path in files:
+            with open(path) as f:
+                lines = f.read().splitlines()
+            header = header or lines[0]
+            rows.extend(lines[1:])
+            if len(rows) >= n_rows:
+                break
+    csv = "\n".join([header] + rows[:n_rows])
+    return "data:text/csv;base64," + base64.b64encode(csv.encode()).decode()
+
+
+def make_engine(workdir: str):
+    # SQLite stand-in: a second database file attached as the 'dbo' schema
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'main.db')}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{os.path.join(workdir, 'dbo.db')}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at DATETIME)"))
+    return engine
+
+
+class StageTimer:
+    """Accumulates wall time per stage from wrapped functions, on any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self.pending = 0
+        self.reset()
+
+    def reset(self):
+        self.seconds = {}
+
+    def wrap(self, fn, stage: str, background: bool = False):
+        def timed(*args, **kwargs):
+            if background:
+                with self._lock:
+                    self.pending += 1
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.seconds[stage] = self.seconds.get(stage, 0.0) + time.perf_counter() - start
+                    if background:
+                        self.pending -= 1
+                        self._idle.notify_all()
+        return timed
+
+    def wait_background(self, timeout: float = 600):
+        with self._idle:
+            self._idle.wait_for(lambda: self.pending == 0, timeout=timeout)
+
+
+class _TimedScorer:
+    def __init__(self, scorer, timer):
+        self.score = timer.wrap(scorer.score, 'score')
+
+
+class _TimedExecutor:
+    """Times how long the caller blocks on the futures of executor."""
+
+    def __init__(self, executor, timer, stage: str):
+        self._executor, self._timer, self._stage = executor, timer, stage
+
+    def submit(self, fn, *args, **kwargs):
+        future = self._executor.submit(fn, *args, **kwargs)
+        future.result = self._timer.wrap(future.result, self._stage)
+        return future
+
+
+def instrument(timer: StageTimer):
+    """Wrap the functions update_table calls so each reports its time."""
+    callbacks.parse_uploaded_file = timer.wrap(callbacks.parse_uploaded_file, 'parse')
+    ml_model.feature_matrix = timer.wrap(ml_model.feature_matrix, 'encode')
+    scorer = callbacks.get_parallel_scorer()
+    callbacks.get_parallel_scorer = lambda: _TimedScorer(scorer, timer)
+    callbacks._build_charts = timer.wrap(callbacks._build_charts, 'charts')
+    callbacks._chart_executor = _TimedExecutor(callbacks._chart_executor, timer, 'charts_wait')
+    callbacks.create_suspicious_transaction_table = timer.wrap(
+        callbacks.create_suspicious_transaction_table, 'suspicious_table')
+    callbacks.send_slack_notification = lambda *args: None
+    callbacks.send_email_notification = lambda *args: None
+    callbacks._severity_alert = timer.wrap(callbacks._severity_alert, 'alert')
+    callbacks.stream_upload = timer.wrap(callbacks.stream_upload, 'stream_upload')
+    callbacks.save_to_database = timer.wrap(callbacks.save_to_database, 'save_to_database',
+                                            background=True)
+    callbacks._cache_historical_rate = timer.wrap(callbacks._cache_historical_rate,
+                                                  'historical_rate', background=True)
+    dash._callback.to_json = timer.wrap(dash._callback.to_json, 'json')
+
+
+def build_app(timer: StageTimer):
+    app = dash.Dash(__name__, server=Flask(__name__))
+    app.config.suppress_callback_exceptions = True
+    app.layout = layout
+    callbacks.register_callbacks(app)
+    # The registered wrapper runs update_table and JSON-encodes its outputs
+    for entry in app.callback_map.values():
+        entry['callback'] = timer.wrap(entry['callback'], 'callback')
+    return app
+
+
+def callback_body(app, output_id: str, inputs: list[dict], state: list[dict] = ()) -> dict:
+    """The request Dash's renderer sends for the callback that updates output_id."""
+    output = next(key for key in app.callback_map if output_id in key.strip('.').split('...'))
+    outputs = [
+        {'id': part.rsplit('.', 1)[0], 'property': part.rsplit('.', 1)[1]}
+        for part in output.strip('.').split('...')
+    ]
+    return {
+        'output': output,
+        'outputs': outputs,
+        'inputs': inputs,
+        'state': list(state),
+        'changedPropIds': [f"{inputs[0]['id']}.{inputs[0]['property']}"],
+    }
+
+
+def upload_body(app, contents: str, filename: str) -> dict:
+    return callback_body(
+        app, 'upload-key.data',
+        [{'id': 'uploader', 'property': 'contents', 'value': contents}],
+        [{'id': 'uploader', 'property': 'filename', 'value': filename}],
+    )
+
+
+def page_body(app, key: str) -> dict:
+    """The first-page request the table makes once the upload key arrives."""
+    table = [('page_current', 0), ('page_size', 10), ('sort_by', []), ('filter_query', '')]
+    return callback_body(
+        app, 'transaction-table.data',
+        [{'id': 'upload-key', 'property': 'data', 'value': key}]
+        + [{'id': 'transaction-table', 'property': prop, 'value': value} for prop, value in table],
+    )
+
+
+def _post(client, body):
+    resp = client.post('/_dash-update-component', json=body)
+    if resp.status_code != 200:
+        raise RuntimeError(f"callback failed with {resp.status_code}: {resp.data[:500]!r}")
+    return resp
+
+
+def run_once(client, timer, app, body) -> dict:
+    timer.wait_background()
+    timer.reset()
+    start = time.perf_counter()
+    resp = _post(client, body)
+    total = time.perf_counter() - start
+    timer.wait_background()
+
+    stages = dict(timer.seconds)
+    if 'score' in stages:
+        stages['predict'] = stages.pop('score') - stages.get('encode', 0.0)
+    background = {name: stages.pop(name) for name in BACKGROUND if name in stages}
+    callback = stages.pop('callback', total)
+    # Charts run on another thread; only the wait for them is on the request
+    # path. The chunked path scores inside stream_upload.
+    nested = {'charts', 'json'} | ({'encode', 'predict'} if 'stream_upload' in stages else set())
+    inline = sum(v for k, v in stages.items() if k not in nested)
+    stages['records'] = max(callback - stages.get('json', 0.0) - inline, 0.0)
+    stages['dispatch'] = max(total - callback, 0.0)
+
+    outputs = resp.get_json()['response']
+    responses = [resp]
+    # The table then fetches its first page in a second request
+    key = outputs.get('upload-key', {}).get('data')
+    if key:
+        start = time.perf_counter()
+        page = _post(client, page_body(app, key))
+        stages['first_page'] = time.perf_counter() - start
+        total += stages['first_page']
+        outputs = {**outputs, **page.get_json()['response']}
+        responses.append(page)
+
+    payload = {f"{cid}.{prop}": len(json.dumps(value, separators=(',', ':')))
+               for cid, props in outputs.items() for prop, value in props.items()}
+    return {'total_s': total, 'stages_s': stages, 'background_s': background,
+            'response_bytes': sum(len(r.data) for r in responses), 'output_bytes': payload}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rows", default="1000,10000,100000,600000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_update_table_")
+    database.set_engine(make_engine(workdir))
+    if ml_model.ensure_model_loaded() is None:
+        sys.exit(f"No model could be loaded from {os.environ['MODEL_PATH']}")
+
+    timer = StageTimer()
+    instrument(timer)
+    app = build_app(timer)
+    client = app.server.test_client()
+
+    results = {'streaming_upload_bytes': callbacks.STREAMING_UPLOAD_BYTES, 'runs': []}
+    for n_rows in [int(r) for r in args.rows.split(",")]:
+        contents = load_upload(n_rows)
+        body = upload_body(app, contents, f"bench_{n_rows}.csv")
+        run = min((run_once(client, timer, app, body) for _ in range(args.repeat)),
+                  key=lambda r: r['total_s'])
+        run.update(rows=n_rows, upload_bytes=len(contents),
+                   streamed=len(contents) > callbacks.STREAMING_UPLOAD_BYTES)
+        results['runs'].append(run)
+
+        stages = "  ".join(f"{k} {v:.3f}" for k, v in run['stages_s'].items())
+        background = "  ".join(f"{k} {v:.3f}" for k, v in run['background_s'].items())
+        print(f"rows={n_rows:<8} total {run['total_s']:7.3f}s  upload {len(contents) / 2**20:7.1f} MB  "
+              f"response {run['response_bytes'] / 2**20:7.2f} MB{'  (streamed)' if run['streamed'] else ''}")
+        print(f"    stages (s): {stages}")
+        print(f"    background (s): {background}")
+        largest = sorted(run['output_bytes'].items(), key=lambda kv: kv[1], reverse=True)[:3]
+        print("    largest outputs: " + ", ".join(f"{k} {v / 1024:,.0f} KB" for k, v in largest))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
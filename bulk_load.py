@@ -0,0 +1,166 @@
+# bulk_load.py
+
+import os
+
+import pandas as pd
+import polars as pl
+import sqlalchemy
+from sqlalchemy import MetaData, Table, Column, Integer, SmallInteger, Float, String
+
+# Stored transaction columns and their SQL / polars types. Bounded NVARCHARs
+# keep pyodbc's fast_executemany on its array-binding path; NVARCHAR(MAX)
+# parameters force it back to row-by-row sends.
+TRANSACTION_SCHEMA = {
+    'step':        (Integer(),      pl.Int64),
+    'customer':    (String(64),     pl.Utf8),
+    'age':         (String(16),     pl.Utf8),
+    'gender':      (String(16),     pl.Utf8),
+    'zipcodeOri':  (String(16),     pl.Utf8),
+    'merchant':    (String(64),     pl.Utf8),
+    'zipMerchant': (String(16),     pl.Utf8),
+    'category':    (String(64),     pl.Utf8),
+    'amount':      (Float(),        pl.Float64),
+    'fraud':       (SmallInteger(), pl.Int64),
+    # Written by stream_consumer; uploads are stored without scores
+    'fraud_probability': (Float(), pl.Float64),
+}
+
+
+def _cast(col: str) -> pl.Expr:
+    dtype = TRANSACTION_SCHEMA[col][1]
+    expr = pl.col(col)
+    # Integers go through Float64 so text such as "1.0" still parses
+    if dtype.is_integer():
+        expr = expr.cast(pl.Float64, strict=False)
+    return expr.cast(dtype, strict=False)
+
+
+def typed_frame(df: pd.DataFrame | pl.DataFrame) -> pl.DataFrame:
+    """
+    The stored columns of df, cast to their storage types, as polars.
+    Values that cannot be cast are stored as NULL and counted in a warning.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = pl.from_pandas(df)
+    df = df.rename({c: c.replace('[', '').replace(']', '') for c in df.columns})
+    columns = [c for c in TRANSACTION_SCHEMA if c in df.columns]
+    typed = df.select([_cast(c) for c in columns])
+    lost = {c: typed[c].null_count() - df[c].null_count() for c in columns}
+    lost = {c: n for c, n in lost.items() if n}
+    if lost:
+        counts = ", ".join(f"{c}: {n}" for c, n in lost.items())
+        print(f"[bulk_load] Values stored as NULL because they could not be cast ({counts}).")
+    return typed
+
+
+def transactions_table(table_name: str, columns: list[str]) -> Table:
+    return Table(
+        table_name, MetaData(),
+        *[Column(c, TRANSACTION_SCHEMA[c][0]) for c in columns]
+    )
+
+
+class ToSqlLoader:
+    """The original pandas to_sql path: every column stored as a string."""
+
+    def __init__(self, engine, batch_size: int = 5000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def load(self, df: pl.DataFrame, table_name: str, append: bool = False, progress=None,
+             table: Table | None = None) -> int:
+        pdf = df.to_pandas()
+        # One transaction, so a failed replace leaves the old table in place
+        with self.engine.begin() as conn:
+            pdf.to_sql(
+                table_name,
+                conn,
+                schema=table.schema if table is not None else None,
+                if_exists='append' if append or table is not None else 'replace',
+                index=False,
+                chunksize=self.batch_size,
+                dtype={col: sqlalchemy.types.String() for col in pdf.columns}
+            )
+        if progress is not None:
+            progress(len(pdf), len(pdf))
+        return len(pdf)
+
+
+class ExecutemanyLoader:
+    """
+    Typed bulk insert: create the table with real column types, then send
+    rows in explicit batches through the raw DBAPI cursor's executemany.
+    On pyodbc the cursor's fast_executemany is switched on, so each batch
+    goes to SQL Server as one parameter array. Any SQLAlchemy engine works,
+    which lets tests use SQLite or DuckDB.
+    """
+
+    def __init__(self, engine, batch_size: int = 20000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def _insert_sql(self, table: Table, columns: list[str]) -> str:
+        dialect = self.engine.dialect
+        preparer = dialect.identifier_preparer
+        cols = ", ".join(preparer.quote(c) for c in columns)
+        style = dialect.paramstyle
+        if style == 'qmark':
+            marks = ", ".join("?" for _ in columns)
+        elif style == 'numeric':
+            marks = ", ".join(f":{i + 1}" for i in range(len(columns)))
+        elif style in ('format', 'pyformat'):
+            marks = ", ".join("%s" for _ in columns)
+        else:
+            raise ValueError(f"Unsupported DBAPI paramstyle '{style}'")
+        return f"INSERT INTO {preparer.format_table(table)} ({cols}) VALUES ({marks})"
+
+    def load(self, df: pl.DataFrame, table_name: str, append: bool = False, progress=None,
+             table: Table | None = None) -> int:
+        """
+        Insert df into table_name, created from TRANSACTION_SCHEMA and
+        replaced unless append is set. Pass an existing `table` definition
+        to append into it instead (its name wins over table_name). The
+        drop, create and inserts run in one transaction.
+        """
+        create = table is None
+        if create:
+            table = transactions_table(table_name, df.columns)
+        sql = self._insert_sql(table, df.columns)
+
+        total = df.height
+        written = 0
+        with self.engine.begin() as conn:
+            if create:
+                if not append:
+                    table.drop(conn, checkfirst=True)
+                table.create(conn, checkfirst=True)
+            cursor = conn.connection.cursor()
+            try:
+                if hasattr(cursor, 'fast_executemany'):
+                    cursor.fast_executemany = True
+                for offset in range(0, total, self.batch_size):
+                    rows = df.slice(offset, self.batch_size).rows()
+                    cursor.executemany(sql, rows)
+                    written += len(rows)
+                    if progress is not None:
+                        progress(written, total)
+            finally:
+                cursor.close()
+        return written
+
+
+LOADERS = {
+    'executemany': ExecutemanyLoader,
+    'to_sql': ToSqlLoader,
+}
+
+
+def get_loader(engine, name: str | None = None, batch_size: int | None = None):
+    """
+    Build the loader named by BULK_LOADER ('executemany' by default, or
+    'to_sql'), with BULK_BATCH_SIZE rows per batch if set.
+    """
+    name = name or os.getenv("BULK_LOADER", "executemany")
+    batch_size = batch_size or os.getenv("BULK_BATCH_SIZE")
+    cls = LOADERS[name]
+    return cls(engine, int(batch_size)) if batch_size else cls(engine)
@@ -1,21 +1,29 @@
 # callbacks.py
 
-from dash import Input, Output, State
+from dash import Input, Output, State, ctx
+import os
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import plotly.express as px
+import polars as pl
 import dash_bootstrap_components as dbc
 from math import isnan
 
-from utils import process_uploaded_file, save_to_database, get_historical_fraud_rate
-from ml_model import fraud_model
+import feature_store
+from utils import parse_uploaded_file, save_to_database, get_historical_fraud_rate
+from ml_model import FEATURE_COLUMNS
+from ingest import stream_upload
+from scoring import get_parallel_scorer
+from aggregates import UploadSummary
 from charts import (
-    create_category_chart,
-    create_pie_chart,
-    create_transaction_time_chart,
-    create_fraud_customers_chart,
+    create_history_charts,
+    create_summary_charts,
     create_suspicious_transaction_table
 )
 from notifications import send_slack_notification, send_email_notification
+from table_pages import cache_upload, table_columns, table_page, upload_frames
+from rollups import query_rollup, rollup_date_range
 
 # In-memory cache for historical fraud rate
 _cached_hist_rate = None
@@ -27,13 +35,116 @@ def _cache_historical_rate():
     if rate is not None:
         _cached_hist_rate = rate
 
-# Preload the cache on startup in a background thread
-threading.Thread(target=_cache_historical_rate, daemon=True).start()
+# Uploads larger than this (base64 characters) are streamed in chunks
+STREAMING_UPLOAD_BYTES = int(os.getenv("STREAMING_UPLOAD_BYTES", 20 * 1024 * 1024))
+
+# Builds the charts while the upload is being scored
+_chart_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="charts")
+
+
+def _build_charts(df):
+    return create_summary_charts(UploadSummary().update(df))
+
+
+def _status_message(fraud_count, total):
+    fraud_rate = fraud_count / total * 100
+    hist = _cached_hist_rate if _cached_hist_rate is not None else float('nan')
+    return (
+        f"Detected {fraud_count}/{total} frauds ({fraud_rate:.2f}%). "
+        + (f"Historical rate: {hist:.2f}%." if not isnan(hist) else "Computing historical rate...")
+    )
+
+
+def _severity_alert(severity):
+    """Build the severity alert and send notifications in background threads."""
+    if severity > 0.7:
+        level, color = "Severe", "danger"
+    elif severity > 0.3:
+        level, color = "Medium", "warning"
+    else:
+        level, color = "Low", "info"
+
+    alert = dbc.Alert(f"Severity: {severity:.2f} ({level})", color=color)
+
+    if level == "Medium":
+        threading.Thread(
+            target=send_slack_notification,
+            args=(level, alert.children),
+            daemon=True
+        ).start()
+    elif level == "Severe":
+        threading.Thread(
+            target=send_slack_notification,
+            args=(level, alert.children),
+            daemon=True
+        ).start()
+        threading.Thread(
+            target=send_email_notification,
+            args=("Severe Fraud Alert", alert.children),
+            daemon=True
+        ).start()
+    return alert
+
+
+def _update_table_streaming(contents, filename):
+    """Chunked path for large uploads: only a preview of the rows is returned."""
+    try:
+        result = stream_upload(contents, filename or "", score_fn=get_parallel_scorer().score)
+    except (ValueError, RuntimeError) as e:
+        empty_fig = px.bar(title='No data').update_layout(template="plotly_dark")
+        return None, empty_fig, empty_fig, empty_fig, str(e), empty_fig, [], []
+
+    threading.Thread(target=_cache_historical_rate, daemon=True).start()
+
+    preview = result['preview']
+    status = _status_message(result['fraud_count'], result['rows'])
+    if len(preview) < result['rows']:
+        status += f" Showing the first {len(preview)} rows."
+    alert = _severity_alert(result['max_prob'])
+    suspicious = (
+        create_suspicious_transaction_table(result['suspicious'])
+        if result['max_prob'] >= 0.5 else []
+    )
+    category, pie, hours, customers = create_summary_charts(result['summary'])
+    return (
+        cache_upload(pl.from_pandas(preview)),
+        category,
+        pie,
+        hours,
+        status,
+        customers,
+        suspicious,
+        alert
+    )
+
+
+def _history(start_date, end_date):
+    """Rollup frames for the history charts and a status line."""
+    start = time.perf_counter()
+    frames = (
+        query_rollup('hour', start_date, end_date),
+        query_rollup('category', start_date, end_date),
+        query_rollup('merchant', start_date, end_date, order_by='fraud_sum', limit=10),
+        query_rollup('customer', start_date, end_date, order_by='fraud_sum', limit=10),
+    )
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    hours = frames[0]
+    if hours is None:
+        return frames, "History is unavailable."
+    total = int(hours['row_count'].sum())
+    frauds = int(hours['fraud_sum'].sum())
+    labelled = int(hours['labelled_rows'].sum())
+    rate = f"{frauds / labelled * 100:.2f}%" if labelled else "n/a"
+    return frames, f"{total:,} transactions, {frauds:,} frauds ({rate}) — queried in {elapsed_ms:.0f} ms."
 
 
 def register_callbacks(app):
+    # Preload the historical rate in the background once the app is built,
+    # rather than at import time
+    threading.Thread(target=_cache_historical_rate, daemon=True).start()
+
     @app.callback(
-        Output('transaction-table', 'data'),
+        Output('upload-key', 'data'),
         Output('category-chart', 'figure'),
         Output('pie-chart', 'figure'),
         Output('transaction-time-chart', 'figure'),
@@ -48,71 +159,43 @@ def register_callbacks(app):
         # 1) No file uploaded: return empty UI
         if not contents:
             empty_fig = px.bar(title='No data available').update_layout(template="plotly_dark")
-            return [], empty_fig, empty_fig, empty_fig, "No file uploaded.", empty_fig, [], []
+            return None, empty_fig, empty_fig, empty_fig, "No file uploaded.", empty_fig, [], []
+
+        # Large files are decoded, scored and stored chunk by chunk
+        if len(contents) > STREAMING_UPLOAD_BYTES:
+            return _update_table_streaming(contents, filename)
 
-        # 2) Process uploaded file
-        df = process_uploaded_file(contents)
+        # 2) Process uploaded file (kept in polars through scoring and charts)
+        df = parse_uploaded_file(contents)
         if df is None:
             empty_fig = px.bar(title='Invalid file format').update_layout(template="plotly_dark")
-            return [], empty_fig, empty_fig, empty_fig, "Invalid file format.", empty_fig, [], []
+            return None, empty_fig, empty_fig, empty_fig, "Invalid file format.", empty_fig, [], []
 
         # 3) Prediction branch (do not retrain here)
-        required_cols = [
-            'step', 'customer', 'age', 'gender',
-            'zipcodeOri', 'merchant', 'zipMerchant',
-            'category', 'amount'
-        ]
-        missing = [c for c in required_cols if c not in df.columns]
+        missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
         if missing:
             empty_fig = px.bar(title='No data').update_layout(template="plotly_dark")
             msg = f"Missing columns: {', '.join(missing)}"
-            return [], empty_fig, empty_fig, empty_fig, msg, empty_fig, [], []
+            return None, empty_fig, empty_fig, empty_fig, msg, empty_fig, [], []
 
-        # 4) Encode categorical and predict probabilities
-        Xp = df[required_cols].copy()
-        for col in Xp.select_dtypes(include=['object']):
-            Xp[col] = Xp[col].astype('category').cat.codes
-
-        probs = fraud_model.predict_proba(Xp)[:, 1]
+        # 4) Encode and predict with whichever model is serving right now;
+        #    large frames are sharded across worker processes, and the chart
+        #    aggregations run on a thread meanwhile
+        charts_future = _chart_executor.submit(_build_charts, df)
+        try:
+            probs = get_parallel_scorer().score(df)
+        except RuntimeError as e:
+            empty_fig = px.bar(title='No data').update_layout(template="plotly_dark")
+            return None, empty_fig, empty_fig, empty_fig, str(e), empty_fig, [], []
         fraud_count = int((probs >= 0.5).sum())
-        fraud_rate = fraud_count / len(probs) * 100
+        feature_store.record(df)
 
         # 5) Build status message using cached historical rate
-        hist = _cached_hist_rate if _cached_hist_rate is not None else float('nan')
-        status = (
-            f"Detected {fraud_count}/{len(probs)} frauds ({fraud_rate:.2f}%). "
-            + (f"Historical rate: {hist:.2f}%." if not isnan(hist) else "Computing historical rate...")
-        )
+        status = _status_message(fraud_count, len(probs))
 
-        # 6) Determine severity level
+        # 6-7) Determine severity level and send notifications
         severity = float(probs.max())
-        if severity > 0.7:
-            level, color = "Severe", "danger"
-        elif severity > 0.3:
-            level, color = "Medium", "warning"
-        else:
-            level, color = "Low", "info"
-
-        alert = dbc.Alert(f"Severity: {severity:.2f} ({level})", color=color)
-
-        # 7) Send notifications in background threads
-        if level == "Medium":
-            threading.Thread(
-                target=send_slack_notification,
-                args=(level, alert.children),
-                daemon=True
-            ).start()
-        elif level == "Severe":
-            threading.Thread(
-                target=send_slack_notification,
-                args=(level, alert.children),
-                daemon=True
-            ).start()
-            threading.Thread(
-                target=send_email_notification,
-                args=("Severe Fraud Alert", alert.children),
-                daemon=True
-            ).start()
+        alert = _severity_alert(severity)
 
         # 8) Save to database and refresh historical cache in background
         threading.Thread(
@@ -125,18 +208,61 @@ def register_callbacks(app):
         # 9) Prepare suspicious transaction table if severity high
         if severity >= 0.5:
             idx = int(probs.argmax())
-            suspicious = create_suspicious_transaction_table(df.iloc[[idx]])
+            suspicious = create_suspicious_transaction_table(df.slice(idx, 1).to_pandas())
         else:
             suspicious = []
 
-        # 10) Return results for UI rendering
+        # 10) Return results for UI rendering; the table pages through the
+        #     cached frame, so no rows are sent here
+        category, pie, hours, customers = charts_future.result()
         return (
-            df.to_dict('records'),
-            create_category_chart(df),
-            create_pie_chart(df),
-            create_transaction_time_chart(df),
+            cache_upload(df),
+            category,
+            pie,
+            hours,
             status,
-            create_fraud_customers_chart(df),
+            customers,
             suspicious,
             alert
         )
+
+    @app.callback(
+        Output('transaction-table', 'data'),
+        Output('transaction-table', 'columns'),
+        Output('transaction-table', 'page_count'),
+        Output('transaction-table', 'page_current'),
+        Input('upload-key', 'data'),
+        Input('transaction-table', 'page_current'),
+        Input('transaction-table', 'page_size'),
+        Input('transaction-table', 'sort_by'),
+        Input('transaction-table', 'filter_query')
+    )
+    def update_table_page(key, page_current, page_size, sort_by, filter_query):
+        # Only the visible page crosses the wire; a new upload starts at page 0
+        df = upload_frames.get(key) if key else None
+        if df is None:
+            return [], [], 1, 0
+        if ctx.triggered_id == 'upload-key':
+            page_current = 0
+        records, page_count = table_page(df, page_current, page_size, sort_by, filter_query)
+        return records, table_columns(df), page_count, page_current
+
+    @app.callback(
+        Output('history-hour-chart', 'figure'),
+        Output('history-category-chart', 'figure'),
+        Output('history-merchant-chart', 'figure'),
+        Output('history-customer-chart', 'figure'),
+        Output('history-status', 'children'),
+        Output('history-range', 'min_date_allowed'),
+        Output('history-range', 'max_date_allowed'),
+        Input('history-range', 'start_date'),
+        Input('history-range', 'end_date'),
+        Input('upload-key', 'data')
+    )
+    def update_history(start_date, end_date, _upload_key):
+        # Reads only the rollup table. A new upload refreshes the view; rows
+        # saved by the background thread show up on the next refresh. The
+        # picker is bounded by the upload dates the rollups cover
+        frames, status = _history(start_date, end_date)
+        first, last = rollup_date_range()
+        return (*create_history_charts(*frames), status, first, last)
@@ -6,46 +6,91 @@ import plotly.graph_objects as go
 import dash_bootstrap_components as dbc
 from dash import html, dash_table
 
+from aggregates import UploadSummary, summarize
+
+
+def _no_data(kind=px.bar):
+    return kind(title='No data').update_layout(template="plotly_dark")
+
+
+def _category_frame(summary: UploadSummary) -> pd.DataFrame:
+    return summary.category_amount.rename_axis('category').reset_index(name='amount')
+
+
+def create_category_chart(data):
+    """Amount per category. data is an upload frame or its UploadSummary."""
+    summary = summarize(data)
+    if not summary.has_category:
+        return _no_data()
+    fig = px.bar(_category_frame(summary), x='category', y='amount',
+                 title='Transaction Amounts by Category')
+    return fig.update_layout(template="plotly_dark")
+
+
+def create_pie_chart(data):
+    summary = summarize(data)
+    if not summary.has_category:
+        return _no_data(px.pie)
+    fig = px.pie(_category_frame(summary), names='category', values='amount',
+                 title='Transactions Distribution by Category')
+    return fig.update_layout(template="plotly_dark")
+
+
+def create_transaction_time_chart(data):
+    summary = summarize(data)
+    if not summary.has_step:
+        return _no_data()
+    counts = summary.hour_counts.sort_index().astype(int)\
+                    .rename_axis('hour').reset_index(name='count')
+    fig = px.bar(counts, x='hour', y='count',
+                 title='Transactions by Hour', text='count')
+    return fig.update_layout(template="plotly_dark")
+
+
+def create_fraud_customers_chart(data):
+    summary = summarize(data)
+    if not summary.has_fraud:
+        return _no_data()
+    top = summary.top_fraud_customers().rename_axis('customer').reset_index(name='count')
+    fig = px.bar(top, x='customer', y='count',
+                 title='Top 10 Fraud Customers', text='count')
+    return fig.update_layout(template="plotly_dark")
+
+
+def create_summary_charts(summary):
+    """
+    Category, pie, hour and fraud-customer charts from one UploadSummary
+    (or a frame, aggregated once for all four).
+    """
+    summary = summarize(summary)
+    return (
+        create_category_chart(summary),
+        create_pie_chart(summary),
+        create_transaction_time_chart(summary),
+        create_fraud_customers_chart(summary),
+    )
+
 
-def create_category_chart(df: pd.DataFrame):
-    if 'category' in df and 'amount' in df:
-        summary = df.groupby('category')['amount'].sum().reset_index()
-        fig = px.bar(summary, x='category', y='amount',
-                     title='Transaction Amounts by Category')
-        return fig.update_layout(template="plotly_dark")
-    return px.bar(title='No data').update_layout(template="plotly_dark")
-
-
-def create_pie_chart(df: pd.DataFrame):
-    if 'category' in df and 'amount' in df:
-        summary = df.groupby('category')['amount'].sum().reset_index()
-        fig = px.pie(summary, names='category', values='amount',
-                     title='Transactions Distribution by Category')
-        return fig.update_layout(template="plotly_dark")
-    return px.pie(title='No data').update_layout(template="plotly_dark")
-
-
-def create_transaction_time_chart(df: pd.DataFrame):
-    if 'step' in df:
-        df2 = df.copy()
-        df2['step'] = pd.to_numeric(df2['step'], errors='coerce')
-        df2['hour'] = (df2['step'] - 1) % 24
-        counts = df2.groupby('hour').size().reset_index(name='count')
-        fig = px.bar(counts, x='hour', y='count',
-                     title='Transactions by Hour', text='count')
-        return fig.update_layout(template="plotly_dark")
-    return px.bar(title='No data').update_layout(template="plotly_dark")
-
-
-def create_fraud_customers_chart(df: pd.DataFrame):
-    if 'fraud' in df and 'customer' in df:
-        fdf = df[df['fraud'] == 1]
-        top = fdf.groupby('customer').size().reset_index(name='count')\
-                 .nlargest(10, 'count')
-        fig = px.bar(top, x='customer', y='count',
-                     title='Top 10 Fraud Customers', text='count')
-        return fig.update_layout(template="plotly_dark")
-    return px.bar(title='No data').update_layout(template="plotly_dark")
+def _history_bar(frame, x, y, title, text=None):
+    if frame is None or frame.empty:
+        return _no_data()
+    fig = px.bar(frame, x=x, y=y, title=title, text=text)
+    return fig.update_layout(template="plotly_dark")
+
+
+def create_history_charts(hours, categories, merchants, customers):
+    """
+    History charts from rollups.query_rollup frames (None or empty gives
+    'No data'): transactions per hour, amount per category, and the
+    merchants and customers with the most frauds.
+    """
+    return (
+        _history_bar(hours, 'value', 'row_count', 'Transactions by Hour (all uploads)'),
+        _history_bar(categories, 'value', 'amount_sum', 'Transaction Amounts by Category (all uploads)'),
+        _history_bar(merchants, 'value', 'fraud_sum', 'Top 10 Fraud Merchants', text='fraud_sum'),
+        _history_bar(customers, 'value', 'fraud_sum', 'Top 10 Fraud Customers (all uploads)',
+                     text='fraud_sum'),
+    )
 
 
 def create_suspicious_transaction_table(row_df: pd.DataFrame):
@@ -0,0 +1,204 @@
+# database.py
+"""
+The process-wide SQLAlchemy engine, created on first use.
+
+Connection settings come from the environment:
+
+- DB_URL: a full SQLAlchemy URL (e.g. sqlite:///local.db); overrides the rest.
+- DB_SERVER, DB_NAME, DB_DRIVER: SQL Server host, database and ODBC driver.
+- DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+  DB_POOL_PRE_PING: connection pool tuning.
+
+Tests and tools can install their own engine with set_engine().
+"""
+
+import os
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+DEFAULT_SERVER = 'CND3420Y19'
+DEFAULT_DATABASE = 'TransactionsDB'
+DEFAULT_DRIVER = 'ODBC Driver 17 for SQL Server'
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+class _Stat:
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'mean_ms': round(1000 * self.total / self.count, 3) if self.count else 0.0,
+            'max_ms': round(1000 * self.max, 3),
+        }
+
+
+class DBMetrics:
+    """Pool checkout waits, connections in use and query latency per call site."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checkout_wait = _Stat()
+            self.queries = {}
+            self.active = 0
+
+    def observe_wait(self, seconds: float):
+        with self._lock:
+            self.checkout_wait.add(seconds)
+
+    def observe_query(self, site: str, seconds: float):
+        with self._lock:
+            self.queries.setdefault(site, _Stat()).add(seconds)
+
+    def connection_changed(self, delta: int):
+        with self._lock:
+            self.active += delta
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'active_connections': self.active,
+                'checkout_wait': self.checkout_wait.as_dict(),
+                'queries': {site: stat.as_dict() for site, stat in sorted(self.queries.items())},
+            }
+
+
+metrics = DBMetrics()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe_wait(time.perf_counter() - start)
+
+
+def _call_site() -> str:
+    """The innermost caller frame in this repository, as 'module:function'."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        path = frame.f_code.co_filename
+        if path.startswith(_ROOT) and os.path.abspath(path) != os.path.abspath(__file__) \
+                and 'site-packages' not in path:
+            module = os.path.splitext(os.path.relpath(path, _ROOT))[0].replace(os.sep, '.')
+            return f"{module}:{frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'unknown'
+
+
+def instrument_engine(engine):
+    """Attach the metrics listeners to engine (once)."""
+    if getattr(engine, "_instrumented", False):
+        return engine
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(*_):
+        metrics.connection_changed(1)
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(*_):
+        metrics.connection_changed(-1)
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, params, context, executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, params, context, executemany):
+        start = conn.info['query_start'].pop()
+        metrics.observe_query(_call_site(), time.perf_counter() - start)
+
+    @event.listens_for(engine, "handle_error")
+    def _failed(context):
+        starts = context.connection.info.get('query_start') if context.connection else None
+        if starts:
+            starts.pop()
+
+    engine._instrumented = True
+    return engine
+
+
+def database_url() -> str:
+    if os.getenv("DB_URL"):
+        return os.environ["DB_URL"]
+    server = os.getenv("DB_SERVER", DEFAULT_SERVER)
+    database = os.getenv("DB_NAME", DEFAULT_DATABASE)
+    driver = os.getenv("DB_DRIVER", DEFAULT_DRIVER).replace(' ', '+')
+    return f'mssql+pyodbc://@{server}/{database}?trusted_connection=yes&driver={driver}'
+
+
+def build_engine(url: str | None = None):
+    """Create an instrumented engine with the pool settings from the environment."""
+    url = make_url(url or database_url())
+    kwargs = {'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")}
+    if url.get_backend_name() == 'mssql':
+        kwargs['connect_args'] = {'fast_executemany': True}
+    # In-memory SQLite keeps one connection per thread and has no pool to size
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        kwargs.update(
+            poolclass=TimedQueuePool,
+            pool_size=int(os.getenv("DB_POOL_SIZE", 5)),
+            max_overflow=int(os.getenv("DB_MAX_OVERFLOW", 10)),
+            pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)),
+            pool_recycle=int(os.getenv("DB_POOL_RECYCLE", 1800)),
+        )
+    return instrument_engine(create_engine(url, **kwargs))
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """The shared engine, built on the first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = build_engine()
+    return _engine
+
+
+def set_engine(engine):
+    """Install engine as the shared engine (instrumenting it) and return the old one."""
+    global _engine
+    with _engine_lock:
+        previous, _engine = _engine, (instrument_engine(engine) if engine is not None else None)
+    return previous
+
+
+def pool_status() -> dict:
+    """Pool settings and occupancy, without creating an engine that does not exist yet."""
+    engine = _engine
+    if engine is None:
+        return {'created': False}
+    pool = engine.pool
+    status = {'created': True, 'dialect': engine.dialect.name, 'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(size=pool.size(), checked_out=pool.checkedout(),
+                      overflow=pool.overflow(), checked_in=pool.checkedin())
+    return status
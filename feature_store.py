@@ -0,0 +1,643 @@
+# feature_store.py
+"""
+Rolling per-customer and per-merchant history for scoring. For a
+transaction at step s the store reports what the same customer, and the
+same merchant, did in the previous FEATURE_WINDOW_STEPS steps (s-N..s-1):
+transaction count, amount mean and standard deviation and, for
+customers, the number of distinct merchants. Transactions in the same
+step never see each other, so the values do not depend on how a step is
+split across batches.
+
+Each entity owns a ring of N+1 step slots in NumPy arrays, so a lookup
+reads a fixed number of cells whatever the history size. observe() looks
+a batch up and then records it. Amounts are accumulated in integer cents,
+which keeps the sums exact. The store is snapshotted to FEATURE_STORE_PATH
+(by default next to MODEL_PATH).
+
+Scoring only reads the store (lookup()), so scoring the same rows twice
+gives the same features. Rows are recorded (record()) by the paths that
+ingest them: an upload as each chunk is scored, the stream consumer once
+a batch is written. One process records and saves the snapshot: the first
+to record takes a lock on '<snapshot>.lock'; every other process only
+reads, reloading the snapshot when the writer has saved a newer one.
+
+Training does not replay history through the store: backfill_history()
+computes the same values for a whole frame at once from prefix sums over
+rows sorted by entity and step. Both paths work on integers until the
+final mean/std, so their results are identical.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+HISTORY_FEATURES = [
+    'cust_txn_count', 'cust_amount_mean', 'cust_amount_std', 'cust_distinct_merchants',
+    'merch_txn_count', 'merch_amount_mean', 'merch_amount_std',
+]
+COUNT_FEATURES = ['cust_txn_count', 'cust_distinct_merchants', 'merch_txn_count']
+
+# Step value of a slot that has never been used
+_EMPTY = np.iinfo(np.int64).min // 2
+
+
+def window_steps() -> int:
+    return int(os.getenv("FEATURE_WINDOW_STEPS", 30))
+
+
+def history_enabled() -> bool:
+    """USE_HISTORY_FEATURES=0 trains models on the raw columns only."""
+    return os.getenv("USE_HISTORY_FEATURES", "1") != "0"
+
+
+def default_store_path(model_path: str | None = None) -> str:
+    """FEATURE_STORE_PATH, or '<model>_features.npz' next to MODEL_PATH."""
+    model_path = model_path or os.getenv("MODEL_PATH", "fraud_model.pkl")
+    return os.getenv("FEATURE_STORE_PATH") or os.path.splitext(model_path)[0] + "_features.npz"
+
+
+def history_columns(df) -> pl.DataFrame:
+    """
+    step, customer, merchant and cents (amount in integer cents) of a
+    pandas or polars frame, as the store and the backfill read them.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = pl.from_pandas(df[['step', 'customer', 'merchant', 'amount']].astype(
+            {'customer': str, 'merchant': str}))
+    return df.select(
+        pl.col('step').cast(pl.Float64, strict=False).fill_nan(0).fill_null(0).cast(pl.Int64),
+        pl.col('customer').cast(pl.Utf8).fill_null(''),
+        pl.col('merchant').cast(pl.Utf8).fill_null(''),
+        (pl.col('amount').cast(pl.Float64, strict=False).fill_nan(0).fill_null(0) * 100)
+        .round().cast(pl.Int64).alias('cents'),
+    )
+
+
+def moments(count: np.ndarray, cents: np.ndarray, cents_sq: np.ndarray):
+    """Amount mean and population std from window totals (0 for empty windows)."""
+    n = np.maximum(count, 1).astype(float)
+    mean = cents / n
+    var = np.maximum(cents_sq / n - mean * mean, 0.0)
+    empty = count == 0
+    return np.where(empty, 0.0, mean / 100), np.where(empty, 0.0, np.sqrt(var) / 100)
+
+
+def history_frame(cust: tuple, merch: tuple) -> pl.DataFrame:
+    """
+    The HISTORY_FEATURES frame from (count, cents, cents_sq, distinct)
+    customer totals and (count, cents, cents_sq) merchant totals.
+    """
+    cust_mean, cust_std = moments(*cust[:3])
+    merch_mean, merch_std = moments(*merch[:3])
+    return pl.DataFrame({
+        'cust_txn_count': cust[0], 'cust_amount_mean': cust_mean,
+        'cust_amount_std': cust_std, 'cust_distinct_merchants': cust[3],
+        'merch_txn_count': merch[0], 'merch_amount_mean': merch_mean,
+        'merch_amount_std': merch_std,
+    }, schema={c: pl.Int64 if c in COUNT_FEATURES else pl.Float64 for c in HISTORY_FEATURES})
+
+
+class _KeyIndex:
+    """Dense integer codes for keys (strings or ints), in first-seen order."""
+
+    def __init__(self, keys=()):
+        self.keys = list(keys)
+        self._codes = {k: i for i, k in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def codes(self, values: pl.Series) -> np.ndarray:
+        uniq = values.unique().to_list()
+        codes = []
+        for key in uniq:
+            code = self._codes.get(key)
+            if code is None:
+                code = self._codes[key] = len(self.keys)
+                self.keys.append(key)
+            codes.append(code)
+        return values.replace_strict(pl.Series(uniq, dtype=values.dtype),
+                                     pl.Series(codes, dtype=pl.Int64)).to_numpy()
+
+
+class _Rings:
+    """Per-entity step slots: steps, count, cents and cents² per slot."""
+
+    FIELDS = ('steps', 'count', 'cents', 'cents_sq')
+
+    def __init__(self, slots: int, capacity: int = 1024):
+        self.slots = slots
+        self.steps = np.full((capacity, slots), _EMPTY, dtype=np.int64)
+        self.count = np.zeros((capacity, slots), dtype=np.int64)
+        self.cents = np.zeros((capacity, slots), dtype=np.int64)
+        self.cents_sq = np.zeros((capacity, slots), dtype=np.int64)
+
+    def _arrays(self):
+        return [(name, getattr(self, name)) for name in self.FIELDS]
+
+    def grow(self, size: int):
+        capacity = len(self.steps)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name, arr in self._arrays():
+            bigger = np.full((capacity, self.slots), _EMPTY if name == 'steps' else 0, dtype=np.int64)
+            bigger[:len(arr)] = arr
+            setattr(self, name, bigger)
+
+    def window(self, rows: np.ndarray, step: int) -> tuple:
+        """Window totals (count, cents, cents_sq) for steps step-N..step-1."""
+        live = (self.steps[rows] >= step - self.slots + 1) & (self.steps[rows] < step)
+        return tuple(np.where(live, arr[rows], 0).sum(axis=1)
+                     for _, arr in self._arrays()[1:])
+
+    def claim(self, rows: np.ndarray, step: int, extra=()) -> np.ndarray:
+        """
+        Point the slot of step at step for rows, clearing it (and the same
+        slot of the extra arrays) if it held an older step. Returns a mask
+        of the rows that can be recorded: a slot already holding a later
+        step means the row arrived too late.
+        """
+        slot = step % self.slots
+        stale = rows[self.steps[rows, slot] < step]
+        for arr in [arr for _, arr in self._arrays()[1:]] + list(extra):
+            arr[stale, slot] = 0
+        self.steps[stale, slot] = step
+        return self.steps[rows, slot] == step
+
+    def add(self, rows: np.ndarray, step: int, cents: np.ndarray):
+        slot = step % self.slots
+        np.add.at(self.count[:, slot], rows, 1)
+        np.add.at(self.cents[:, slot], rows, cents)
+        np.add.at(self.cents_sq[:, slot], rows, cents * cents)
+
+
+class FeatureStore:
+    """
+    In-memory rolling aggregates keyed by customer and merchant.
+    Distinct merchants are tracked through the last step each
+    (customer, merchant) pair was seen, counted in that step's slot.
+    """
+
+    def __init__(self, window: int | None = None, capacity: int = 1024):
+        self.window = window or window_steps()
+        slots = self.window + 1
+        self.customers, self.merchants, self.pairs = _KeyIndex(), _KeyIndex(), _KeyIndex()
+        self.cust = _Rings(slots, capacity)
+        self.merch = _Rings(slots, capacity=min(capacity, 64))
+        # Per customer slot: pairs whose last step is that slot's step, and
+        # pairs that moved into it from a step still inside its window
+        self.distinct = np.zeros_like(self.cust.count)
+        self.carried = np.zeros_like(self.cust.count)
+        self.pair_last = np.full(capacity, _EMPTY, dtype=np.int64)
+        self._lock = threading.Lock()
+        self._saved_at = time.monotonic()
+
+    def _grow(self):
+        capacity = len(self.cust.steps)
+        self.cust.grow(len(self.customers))
+        if len(self.cust.steps) != capacity:
+            for name in ('distinct', 'carried'):
+                bigger = np.zeros_like(self.cust.count)
+                bigger[:capacity] = getattr(self, name)
+                setattr(self, name, bigger)
+        self.merch.grow(len(self.merchants))
+        if len(self.pairs) > len(self.pair_last):
+            bigger = np.full(max(len(self.pairs), 2 * len(self.pair_last)), _EMPTY, dtype=np.int64)
+            bigger[:len(self.pair_last)] = self.pair_last
+            self.pair_last = bigger
+
+    def _lookup(self, cust: np.ndarray, merch: np.ndarray, step: int):
+        # Rows of one entity in one step share their values, so each
+        # distinct entity is looked up once
+        ucust, cinv = np.unique(cust, return_inverse=True)
+        umerch, minv = np.unique(merch, return_inverse=True)
+        slot = step % self.cust.slots
+        live = (self.cust.steps[ucust] >= step - self.window) & (self.cust.steps[ucust] < step)
+        distinct = np.where(live, self.distinct[ucust], 0).sum(axis=1) + \
+            np.where(self.cust.steps[ucust, slot] == step, self.carried[ucust, slot], 0)
+        c = self.cust.window(ucust, step) + (distinct,)
+        m = self.merch.window(umerch, step)
+        return tuple(v[cinv] for v in c), tuple(v[minv] for v in m)
+
+    def _record(self, cust: np.ndarray, merch: np.ndarray, pairs: np.ndarray,
+                step: int, cents: np.ndarray):
+        ok = self.cust.claim(np.unique(cust), step, (self.distinct, self.carried))
+        if not ok.all():
+            known = np.isin(cust, np.unique(cust)[ok])
+            cust, pairs, cents_c = cust[known], pairs[known], cents[known]
+        else:
+            cents_c = cents
+        self.cust.add(cust, step, cents_c)
+        mok = self.merch.claim(np.unique(merch), step)
+        mrows = np.isin(merch, np.unique(merch)[mok]) if not mok.all() else slice(None)
+        self.merch.add(merch[mrows], step, cents[mrows])
+
+        # Move each pair's last step to this step
+        upairs, first = np.unique(pairs, return_index=True)
+        pcust = cust[first]
+        last = self.pair_last[upairs]
+        move = last < step
+        upairs, pcust, last = upairs[move], pcust[move], last[move]
+        seen = last != _EMPTY
+        old_slot = last % self.cust.slots
+        still = seen & (self.cust.steps[pcust, old_slot] == last)
+        np.subtract.at(self.distinct, (pcust[still], old_slot[still]), 1)
+        slot = step % self.cust.slots
+        np.add.at(self.carried[:, slot], pcust[seen & (last >= step - self.window)], 1)
+        np.add.at(self.distinct[:, slot], pcust, 1)
+        self.pair_last[upairs] = step
+
+    def observe(self, df, record: bool = True) -> pl.DataFrame:
+        """
+        HISTORY_FEATURES for every row of a pandas or polars frame (in row
+        order), each computed from the rows recorded before its step and
+        from the frame's own rows of earlier steps. The rows are then
+        recorded, one step at a time. With record=False the store is left
+        untouched: the frame is replayed in a copy of the entities it touches.
+        """
+        cols = history_columns(df)
+        with self._lock:
+            if record:
+                return self._observe(cols, True)
+            scratch = self._scratch(cols)
+        return scratch._observe(cols, cols['step'].n_unique() > 1)
+
+    def _scratch(self, cols: pl.DataFrame) -> "FeatureStore":
+        """A new store holding copies of the customers, merchants and pairs in cols."""
+        pairs = cols.select('customer', 'merchant').unique()
+        scratch = FeatureStore(self.window, capacity=max(pairs.height, 1))
+        cust_keys = [k for k in pairs['customer'].unique().to_list() if k in self.customers._codes]
+        merch_keys = [k for k in pairs['merchant'].unique().to_list() if k in self.merchants._codes]
+        src_c = np.array([self.customers._codes[k] for k in cust_keys], dtype=np.int64)
+        src_m = np.array([self.merchants._codes[k] for k in merch_keys], dtype=np.int64)
+        scratch.customers, scratch.merchants = _KeyIndex(cust_keys), _KeyIndex(merch_keys)
+
+        # Pairs are keyed by customer and merchant code, so they are re-keyed
+        new_c = {k: i for i, k in enumerate(cust_keys)}
+        new_m = {k: i for i, k in enumerate(merch_keys)}
+        pair_keys, src_p = [], []
+        for c, m in pairs.iter_rows():
+            if c in new_c and m in new_m:
+                code = self.pairs._codes.get(self.customers._codes[c] * (1 << 32) + self.merchants._codes[m])
+                if code is not None:
+                    pair_keys.append(new_c[c] * (1 << 32) + new_m[m])
+                    src_p.append(code)
+        scratch.pairs = _KeyIndex(pair_keys)
+        scratch._grow()
+
+        nc, nm, npairs = len(cust_keys), len(merch_keys), len(pair_keys)
+        for rings, src_rings, rows, n in ((scratch.cust, self.cust, src_c, nc),
+                                          (scratch.merch, self.merch, src_m, nm)):
+            for (_, arr), (_, src) in zip(rings._arrays(), src_rings._arrays()):
+                arr[:n] = src[rows]
+        scratch.distinct[:nc] = self.distinct[src_c]
+        scratch.carried[:nc] = self.carried[src_c]
+        scratch.pair_last[:npairs] = self.pair_last[np.array(src_p, dtype=np.int64)]
+        return scratch
+
+    def _observe(self, cols: pl.DataFrame, record: bool) -> pl.DataFrame:
+        """observe() on history_columns output, with the lock held."""
+        cust = self.customers.codes(cols['customer'])
+        merch = self.merchants.codes(cols['merchant'])
+        pairs = self.pairs.codes(pl.Series(cust * (1 << 32) + merch))
+        self._grow()
+        steps = cols['step'].to_numpy()
+        cents = cols['cents'].to_numpy()
+
+        n = len(steps)
+        out_c = [np.zeros(n, dtype=np.int64) for _ in range(4)]
+        out_m = [np.zeros(n, dtype=np.int64) for _ in range(3)]
+        order = np.argsort(steps, kind='stable')
+        bounds = np.flatnonzero(np.diff(steps[order])) + 1
+        for group in np.split(order, bounds) if n else []:
+            step = int(steps[group[0]])
+            c, m = self._lookup(cust[group], merch[group], step)
+            for out, values in zip(out_c + out_m, c + m):
+                out[group] = values
+            if record:
+                self._record(cust[group], merch[group], pairs[group], step, cents[group])
+        return history_frame(tuple(out_c), tuple(out_m))
+
+    # ——— Snapshots ———
+
+    def save(self, path: str):
+        """Write the store to path atomically (temp file, then os.replace)."""
+        with self._lock:
+            nc, nm, npairs = len(self.customers), len(self.merchants), len(self.pairs)
+            arrays = {
+                'window': np.array(self.window),
+                'customers': np.array(self.customers.keys, dtype=str),
+                'merchants': np.array(self.merchants.keys, dtype=str),
+                'pairs': np.array(self.pairs.keys, dtype=np.int64),
+                'pair_last': self.pair_last[:npairs],
+                'distinct': self.distinct[:nc],
+                'carried': self.carried[:nc],
+            }
+            for prefix, rings, size in (('cust', self.cust, nc), ('merch', self.merch, nm)):
+                for name, arr in rings._arrays():
+                    arrays[f"{prefix}_{name}"] = arr[:size]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+        self._saved_at = time.monotonic()
+
+    @classmethod
+    def from_history(cls, df, window: int | None = None) -> "FeatureStore":
+        """
+        A store that answers later lookups as if it had recorded all of df:
+        only the rows of df's last window+1 steps can still be seen, so only
+        those are replayed.
+        """
+        store = cls(window)
+        steps = history_columns(df)['step'].to_numpy()
+        if len(steps):
+            recent = steps >= steps.max() - store.window
+            store.observe(df[recent] if isinstance(df, pd.DataFrame) else df.filter(pl.Series(recent)))
+        return store
+
+    @classmethod
+    def load(cls, path: str) -> "FeatureStore | None":
+        """Read a snapshot, or return None if it is missing or unreadable."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                store = cls(int(data['window']))
+                store.customers = _KeyIndex(data['customers'].tolist())
+                store.merchants = _KeyIndex(data['merchants'].tolist())
+                store.pairs = _KeyIndex(data['pairs'].tolist())
+                store._grow()
+                nc, nm = len(store.customers), len(store.merchants)
+                store.pair_last[:len(store.pairs)] = data['pair_last']
+                store.distinct[:nc] = data['distinct']
+                store.carried[:nc] = data['carried']
+                for prefix, rings, size in (('cust', store.cust, nc), ('merch', store.merch, nm)):
+                    for name, arr in rings._arrays():
+                        arr[:size] = data[f"{prefix}_{name}"]
+            return store
+        except Exception as e:
+            print(f"[feature_store] Failed to load snapshot '{path}': {e}")
+            return None
+
+    def maybe_save(self, path: str, interval: float | None = None) -> bool:
+        """Save if FEATURE_STORE_SAVE_SECONDS (default 60) passed since the last save."""
+        if interval is None:
+            interval = float(os.getenv("FEATURE_STORE_SAVE_SECONDS", 60))
+        if time.monotonic() - self._saved_at < interval:
+            return False
+        try:
+            self.save(path)
+            return True
+        except Exception as e:
+            print(f"[feature_store] Failed to save snapshot: {e}")
+            return False
+
+
+# ——— Point-in-time backfill ———
+
+def _entity_codes(cols: pl.DataFrame, name: str) -> np.ndarray:
+    return cols[name].cast(pl.Categorical).to_physical().cast(pl.Int64).to_numpy()
+
+
+def _window_totals(entity: np.ndarray, steps: np.ndarray, cents: np.ndarray,
+                   window: int, span: int) -> tuple:
+    """
+    Per row, the entity's (count, cents, cents_sq) over steps step-N..step-1.
+    Rows are sorted once by the key entity*span + step and reduced to one
+    group per key; a window is then the difference of two exclusive prefix
+    sums, with its start found by a binary search on the group keys.
+    """
+    key = entity * span + steps
+    order = np.argsort(key)
+    sorted_key = key[order]
+    new = np.r_[True, sorted_key[1:] != sorted_key[:-1]]
+    first = np.flatnonzero(new)
+    keys = sorted_key[first]
+    row_group = np.empty(len(key), dtype=np.int64)
+    row_group[order] = np.cumsum(new) - 1
+
+    start = np.searchsorted(keys, keys - window, side='left')
+    stop = np.arange(len(keys))
+    values = cents[order]
+    totals = []
+    for per_group in (np.diff(np.r_[first, len(key)]),
+                      np.add.reduceat(values, first),
+                      np.add.reduceat(values * values, first)):
+        cum = np.concatenate([[0], np.cumsum(per_group)])
+        totals.append((cum[stop] - cum[start])[row_group])
+    return tuple(totals)
+
+
+def _distinct_merchants(cust: np.ndarray, merch: np.ndarray, steps: np.ndarray,
+                        window: int, span: int) -> np.ndarray:
+    """
+    Per row, the customer's distinct merchants over steps step-N..step-1.
+    An occurrence of a (customer, merchant) pair at step t covers steps
+    t+1..t+N, cut short where the pair's next occurrence takes over, so a
+    pair's intervals never overlap; a row's count is the number of its
+    customer's intervals containing its step.
+    """
+    n_merch = int(merch.max()) + 1
+    occurrences = np.sort((cust * n_merch + merch) * span + steps)
+    occurrences = occurrences[np.r_[True, occurrences[1:] != occurrences[:-1]]]
+    pair, t = np.divmod(occurrences, span)
+    c = pair // n_merch
+    end = t + window
+    same = pair[1:] == pair[:-1]
+    end[:-1] = np.where(same, np.minimum(end[:-1], t[1:]), end[:-1])
+    starts = np.sort(c * span + t + 1)
+    ends = np.sort(c * span + end + 1)
+    query = cust * span + steps
+    return np.searchsorted(starts, query, side='right') - np.searchsorted(ends, query, side='right')
+
+
+def backfill_history(df, window: int | None = None) -> pl.DataFrame:
+    """
+    HISTORY_FEATURES for every row of a pandas or polars frame (in row
+    order), each computed only from rows of earlier steps: the values a
+    FeatureStore replaying the frame in step order would return, without
+    a per-step loop.
+    """
+    window = window or window_steps()
+    cols = history_columns(df)
+    if cols.height == 0:
+        return history_frame((np.zeros(0, dtype=np.int64),) * 4, (np.zeros(0, dtype=np.int64),) * 3)
+    steps = cols['step'].to_numpy()
+    steps = steps - steps.min()
+    # Keys are entity*span + step; span leaves room past the last step's window
+    span = int(steps.max()) + window + 2
+    cust, merch = _entity_codes(cols, 'customer'), _entity_codes(cols, 'merchant')
+    cents = cols['cents'].to_numpy()
+    return history_frame(
+        _window_totals(cust, steps, cents, window, span)
+        + (_distinct_merchants(cust, merch, steps, window, span),),
+        _window_totals(merch, steps, cents, window, span),
+    )
+
+
+class WindowMismatch(ValueError):
+    """The store's window differs from the one a model was trained with."""
+
+
+def snapshot_window(path: str) -> int | None:
+    """The window of the snapshot at path, or None if there is none."""
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return int(data['window'])
+    except Exception:
+        return None
+
+
+def training_window(path: str | None = None) -> int:
+    """
+    The window to train with: the serving store's, if it has a snapshot, so
+    the model and the store agree; else FEATURE_WINDOW_STEPS.
+    """
+    path = path or default_store_path()
+    window = snapshot_window(path)
+    if window is None:
+        return window_steps()
+    if window != window_steps():
+        print(f"[feature_store] Training with the {window}-step window of '{path}' "
+              f"(FEATURE_WINDOW_STEPS={window_steps()} applies once it is removed).")
+    return window
+
+
+_store = None
+_store_mtime = None
+_checked_at = 0.0
+_store_lock = threading.Lock()
+# (snapshot path, open lock file or None) once this process has asked to record
+_writer = None
+
+
+def _save_interval() -> float:
+    return float(os.getenv("FEATURE_STORE_SAVE_SECONDS", 60))
+
+
+def _snapshot_mtime(path: str) -> float | None:
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return None
+
+
+def _try_lock(f) -> bool:
+    """Take an exclusive, non-blocking lock on an open file."""
+    try:
+        import fcntl
+    except ImportError:  # Windows
+        import msvcrt
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def is_writer() -> bool:
+    """
+    Whether this process records into the snapshot. The first process to
+    ask takes the lock on '<snapshot>.lock' and keeps it while it runs;
+    every other process is a reader.
+    """
+    global _writer
+    path = default_store_path()
+    with _store_lock:
+        if _writer is None or _writer[0] != path:
+            if _writer is not None and _writer[1] is not None:
+                _writer[1].close()
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            f = open(path + ".lock", "a")
+            if not _try_lock(f):
+                f.close()
+                f = None
+                print(f"[feature_store] Another process records into '{path}'; "
+                      f"this one only reads it.")
+            _writer = (path, f)
+        return _writer[1] is not None
+
+
+def _records() -> bool:
+    return _writer is not None and _writer[1] is not None and _writer[0] == default_store_path()
+
+
+def get_feature_store() -> FeatureStore:
+    """
+    The process-wide store, loaded from its snapshot on first use. Readers
+    reload the snapshot when the writer has saved a newer one, checking at
+    most every FEATURE_STORE_SAVE_SECONDS.
+    """
+    global _store, _store_mtime, _checked_at
+    if _store is not None and (_records() or time.monotonic() - _checked_at < _save_interval()):
+        return _store
+    with _store_lock:
+        path = default_store_path()
+        mtime = _snapshot_mtime(path)
+        if _store is None or (mtime != _store_mtime and not _records()):
+            loaded = FeatureStore.load(path) if mtime is not None else None
+            if loaded is not None or _store is None:
+                first = _store is None
+                _store, _store_mtime = loaded or FeatureStore(), mtime
+                if first:
+                    print(f"[feature_store] Feature store ready ({len(_store.customers)} customers, "
+                          f"window {_store.window} steps).")
+        _checked_at = time.monotonic()
+    return _store
+
+
+def check_window(window: int):
+    """
+    Make sure the process-wide store uses a window of `window` steps. An
+    empty store is replaced by one that does; a store holding history over
+    another window raises WindowMismatch, as its features would not be on
+    the scale the model was trained on.
+    """
+    global _store
+    store = get_feature_store()
+    if store.window == window:
+        return
+    with _store_lock:
+        if not len(_store.customers):
+            _store = FeatureStore(window)
+            return
+    raise WindowMismatch(f"The feature store at '{default_store_path()}' uses a {store.window}-step "
+                         f"window but the model was trained with {window} steps.")
+
+
+def flush():
+    """Save the process-wide store now, if this process records into it."""
+    if _store is not None and _records():
+        try:
+            _store.save(default_store_path())
+        except Exception as e:
+            print(f"[feature_store] Failed to save snapshot: {e}")
+
+
+def lookup(df) -> pl.DataFrame:
+    """History features for df from the process-wide store, which is left unchanged."""
+    return get_feature_store().observe(df, record=False)
+
+
+def record(df):
+    """
+    Record df in the process-wide store and save it periodically. Only the
+    writer process records (see is_writer()); elsewhere this does nothing.
+    """
+    if not is_writer():
+        return
+    store = get_feature_store()
+    store.observe(df)
+    store.maybe_save(default_store_path())
@@ -0,0 +1,210 @@
+# inference.py
+"""
+Inference backends for a trained XGBoost model. INFERENCE_BACKEND picks one:
+
+- 'booster' (default): the native Booster, scored with inplace_predict on a
+  float32 matrix, without the sklearn wrapper or a DMatrix copy.
+- 'sklearn': the XGBClassifier wrapper's predict_proba, as before.
+- 'treelite': trees compiled to a shared library with Treelite/TL2cgen.
+- 'onnx': the model converted with onnxmltools and run by ONNX Runtime (CPU).
+
+The compiled backends are optional; if their packages are not installed
+the booster backend is used instead. Every backend exposes predict_proba
+(an (n, 2) array) and predict (0/1 labels), like the sklearn wrapper.
+"""
+
+import hashlib
+import os
+
+import numpy as np
+
+BACKENDS = ('booster', 'sklearn', 'treelite', 'onnx')
+
+NATIVE_MODEL_FILE = "model.ubj"
+
+
+def backend_name() -> str:
+    name = os.getenv("INFERENCE_BACKEND", "booster")
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown INFERENCE_BACKEND '{name}'")
+    return name
+
+
+def _matrix(X) -> np.ndarray:
+    return np.ascontiguousarray(X, dtype=np.float32)
+
+
+class _ProbabilityBackend:
+    """predict_proba/predict on top of a positive-class probability function."""
+
+    name = None
+
+    def positive_proba(self, X) -> np.ndarray:
+        raise NotImplementedError
+
+    def predict_proba(self, X) -> np.ndarray:
+        p = self.positive_proba(X)
+        return np.column_stack([1 - p, p])
+
+    def predict(self, X) -> np.ndarray:
+        return (self.positive_proba(X) >= 0.5).astype(int)
+
+
+class BoosterBackend(_ProbabilityBackend):
+    name = 'booster'
+
+    def __init__(self, booster):
+        self.booster = booster
+
+    def positive_proba(self, X) -> np.ndarray:
+        # A numpy input skips the feature-name check, so columns must already
+        # be in training order (ml_model.feature_matrix guarantees that)
+        return np.asarray(self.booster.inplace_predict(_matrix(X)), dtype=np.float64).reshape(-1)
+
+
+class SklearnBackend:
+    """The model object as loaded (XGBClassifier or any predict_proba model)."""
+
+    name = 'sklearn'
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+
+class TreeliteBackend(_ProbabilityBackend):
+    name = 'treelite'
+
+    def __init__(self, booster, lib_dir: str):
+        import treelite
+        import tl2cgen
+
+        self.booster = booster
+        self.lib_dir = lib_dir
+        # The library is named after the model bytes, so a retrained model
+        # never picks up a stale build
+        digest = hashlib.sha256(booster.save_raw("ubj")).hexdigest()[:16]
+        os.makedirs(lib_dir, exist_ok=True)
+        libpath = os.path.join(lib_dir, f"model_treelite_{digest}.so")
+        if not os.path.exists(libpath):
+            model = treelite.frontend.from_xgboost(booster)
+            tmp = f"{libpath}.{os.getpid()}.tmp"
+            tl2cgen.export_lib(model, toolchain="gcc", libpath=tmp,
+                               params={"parallel_comp": os.cpu_count() or 1})
+            os.replace(tmp, libpath)
+        self._tl2cgen = tl2cgen
+        self.predictor = tl2cgen.Predictor(libpath)
+
+    def positive_proba(self, X) -> np.ndarray:
+        X = _matrix(X)
+        out = self.predictor.predict(self._tl2cgen.DMatrix(X, dtype="float32"))
+        return np.asarray(out, dtype=np.float64).reshape(len(X), -1)[:, -1]
+
+
+class OnnxBackend(_ProbabilityBackend):
+    name = 'onnx'
+
+    def __init__(self, booster):
+        import onnxruntime as ort
+        from onnxmltools.convert import convert_xgboost
+        from onnxmltools.convert.common.data_types import FloatTensorType
+
+        self.booster = booster
+        n_features = booster.num_features()
+        # The converter only understands f0..fN feature names
+        booster = booster.copy()
+        booster.feature_names = None
+        booster.feature_types = None
+        onx = convert_xgboost(booster, initial_types=[("input", FloatTensorType([None, n_features]))])
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(onx.SerializeToString(), options,
+                                            providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def positive_proba(self, X) -> np.ndarray:
+        _, probs = self.session.run(None, {self.input_name: _matrix(X)})
+        return np.asarray(probs, dtype=np.float64)[:, 1]
+
+
+def _booster_of(model):
+    """The native Booster behind model or a backend, or None for non-XGBoost models."""
+    try:
+        import xgboost as xgb
+    except ImportError:
+        return None
+    if isinstance(model, xgb.Booster):
+        return model
+    if isinstance(model, SklearnBackend):
+        return _booster_of(model.model)
+    if isinstance(getattr(model, "booster", None), xgb.Booster):
+        return model.booster
+    get_booster = getattr(model, "get_booster", None)
+    if get_booster is None:
+        return None
+    try:
+        return get_booster()
+    except Exception:
+        # An XGBClassifier that was never fitted has no booster
+        return None
+
+
+def load_native(path: str):
+    """Load a Booster saved with save_native (JSON or UBJ, no pickle)."""
+    import xgboost as xgb
+    booster = xgb.Booster()
+    booster.load_model(path)
+    return booster
+
+
+def save_native(model, path: str) -> bool:
+    """Save model's Booster in XGBoost's own format; False if it has none."""
+    booster = _booster_of(model)
+    if booster is None:
+        return False
+    booster.save_model(path)
+    return True
+
+
+def booster_bytes(model) -> bytes | None:
+    """The model's Booster serialized as UBJ (for handing to other processes)."""
+    booster = _booster_of(model)
+    return bytes(booster.save_raw("ubj")) if booster is not None else None
+
+
+def make_backend(model, name: str | None = None, lib_dir: str | None = None):
+    """
+    Wrap a loaded model (XGBClassifier, Booster or anything with
+    predict_proba) in the named backend, defaulting to INFERENCE_BACKEND.
+    Models without a Booster are served as they are. lib_dir is where the
+    Treelite backend keeps its compiled library.
+    """
+    name = name or backend_name()
+    if name == 'sklearn' and not _is_booster(model):
+        return SklearnBackend(model)
+    booster = _booster_of(model)
+    if booster is None:
+        return SklearnBackend(model)
+    try:
+        if name == 'treelite':
+            return TreeliteBackend(booster, lib_dir or os.path.join(os.getcwd(), "treelite_cache"))
+        if name == 'onnx':
+            return OnnxBackend(booster)
+    except ImportError as e:
+        print(f"[inference] {name} backend unavailable ({e}); using booster.")
+    except Exception as e:
+        print(f"[inference] Failed to build {name} backend: {e}; using booster.")
+    return BoosterBackend(booster)
+
+
+def _is_booster(model) -> bool:
+    try:
+        import xgboost as xgb
+    except ImportError:
+        return False
+    return isinstance(model, xgb.Booster)
@@ -0,0 +1,123 @@
+# ingest.py
+
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+import feature_store
+import ml_model
+import utils
+from aggregates import UploadSummary
+from rollups import merge_rollup_rows, record_rollups, rollup_rows
+
+
+def _write_chunks(chunks: queue.Queue, table_name: str, uploaded_at: datetime, state: dict):
+    """Writer thread: append each chunk to table_name and collect its FraudSummary and rollup rows."""
+    first = True
+    while (df := chunks.get()) is not None:
+        if state['error'] is not None:
+            continue  # keep draining so the producer never blocks
+        try:
+            subset = utils.write_transactions(df, table_name, append=not first)
+            first = False
+            state['written'] += len(subset)
+            state['rollups'].append(rollup_rows(subset, table_name, uploaded_at))
+            if 'fraud' in subset.columns:
+                state['summary'].extend(utils.summarize_fraud(subset, table_name, uploaded_at))
+        except Exception as e:
+            print(f"[ingest] Error writing {table_name}: {e}")
+            state['error'] = e
+
+
+def stream_upload(contents: str, file_name: str = "", chunk_rows: int | None = None,
+                  score_fn=None, preview_rows: int = 1000, progress=None) -> dict:
+    """
+    Decode, parse, score and store an upload chunk by chunk, so peak memory
+    depends on the chunk size rather than the file size. Chunks stay in
+    polars from parsing to scoring; only the writer converts for to_sql. Chunks are written
+    by a background thread through a queue of at most two chunks, which
+    overlaps scoring with the database writes; the chart aggregates of a
+    chunk are updated on another thread while it is being scored. Each
+    chunk is recorded in the feature store once scored; an upload that
+    fails part-way leaves the chunks scored so far recorded.
+
+    Returns a dict with table_name (None if nothing was stored), rows,
+    fraud_count, max_prob, suspicious (the highest-scoring row), preview
+    (the first preview_rows rows) and summary (an UploadSummary).
+    Raises ValueError if the file is empty, lacks model features or cannot
+    be parsed; chunks already stored are then dropped again.
+    """
+    score_fn = score_fn or ml_model.score_transactions
+    uploaded_at = datetime.now()
+    table_name = utils.new_table_name(uploaded_at)
+
+    result = {
+        'table_name': None, 'rows': 0, 'fraud_count': 0, 'max_prob': 0.0,
+        'suspicious': None, 'preview': None, 'summary': UploadSummary(),
+    }
+    state = {'error': None, 'written': 0, 'summary': [], 'rollups': []}
+    chunks = queue.Queue(maxsize=2)
+    writer = threading.Thread(
+        target=_write_chunks, args=(chunks, table_name, uploaded_at, state), daemon=True
+    )
+    writer.start()
+    # One thread, so chunks reach the summary in order
+    summarizer = ThreadPoolExecutor(max_workers=1)
+    summary_updates = []
+
+    completed = False
+    try:
+        for df in utils.iter_uploaded_file(contents, chunk_rows, as_polars=True):
+            missing = [c for c in ml_model.FEATURE_COLUMNS if c not in df.columns]
+            if missing:
+                raise ValueError(f"Missing columns: {', '.join(missing)}")
+            if df.is_empty():
+                continue
+
+            summary_updates.append(summarizer.submit(result['summary'].update, df))
+            probs = np.asarray(score_fn(df))
+            idx = int(probs.argmax())
+            if result['suspicious'] is None or probs[idx] > result['max_prob']:
+                result['max_prob'] = float(probs[idx])
+                result['suspicious'] = df.slice(idx, 1).to_pandas()
+            result['fraud_count'] += int((probs >= 0.5).sum())
+            result['rows'] += df.height
+            # Scoring only reads the feature store; the upload's own rows
+            # become history here, so later chunks see this one
+            feature_store.record(df)
+            if result['preview'] is None:
+                result['preview'] = df.head(preview_rows).to_pandas()
+
+            chunks.put(df)
+            if progress is not None:
+                progress(result['rows'])
+        completed = True
+    finally:
+        chunks.put(None)
+        writer.join()
+        summarizer.shutdown(wait=True)
+        # Don't leave an unregistered, partial table behind
+        if result['rows'] and (not completed or state['error'] is not None):
+            utils.drop_upload(table_name)
+    for update in summary_updates:
+        update.result()
+
+    if result['rows'] == 0:
+        raise ValueError("Empty file")
+
+    if state['error'] is None and state['written']:
+        result['table_name'] = table_name
+        record_rollups(merge_rollup_rows(state['rollups']))
+        # record only training tables
+        if state['summary']:
+            try:
+                utils.register_table(table_name, file_name, uploaded_at,
+                                     utils.merge_summary_rows(state['summary']))
+            except Exception as e:
+                print(f"[ingest] Error registering {table_name}: {e}")
+                result['table_name'] = None
+
+    return result
@@ -25,9 +25,19 @@ upload_section = dbc.Card(
 data_table_card = dbc.Card(
     dbc.CardBody([
         html.H5("Transaction Data Table", className="card-title"),
+        # Paged, sorted and filtered on the server (callbacks.update_table_page);
+        # the store only holds the key of the cached upload
+        dcc.Store(id='upload-key'),
         dash_table.DataTable(
             id='transaction-table',
             page_size=10,
+            page_current=0,
+            page_action='custom',
+            sort_action='custom',
+            sort_mode='multi',
+            sort_by=[],
+            filter_action='custom',
+            filter_query='',
             style_table={'overflowX':'auto'},
             style_header={'backgroundColor':'#333','color':'#FFF','border':'1px solid #444'},
             style_data={'backgroundColor':'#222','color':'#FFF','border':'1px solid #444'}
@@ -72,6 +82,16 @@ graph_fraud_cust_card = dbc.Card(
     className="mb-4"
 )
 
+# Charts over every stored upload, read from the rollup table (rollups.py)
+history_card = dbc.Card(
+    dbc.CardBody([
+        html.H5("Upload History", className="card-title"),
+        dcc.DatePickerRange(id='history-range', clearable=True, display_format='YYYY-MM-DD'),
+        html.Div(id='history-status', className="mt-2")
+    ]),
+    className="mb-4"
+)
+
 tabs = dcc.Tabs(
     id="tabs",
     value="data_tab",
@@ -89,6 +109,21 @@ tabs = dcc.Tabs(
                 data_table_card
             ]
         ),
+        dcc.Tab(
+            label="History",
+            value="history_tab",
+            children=[
+                history_card,
+                dbc.Row([
+                    dbc.Col(dcc.Graph(id='history-hour-chart'), md=6),
+                    dbc.Col(dcc.Graph(id='history-category-chart'), md=6)
+                ]),
+                dbc.Row([
+                    dbc.Col(dcc.Graph(id='history-merchant-chart'), md=6),
+                    dbc.Col(dcc.Graph(id='history-customer-chart'), md=6)
+                ])
+            ]
+        ),
         dcc.Tab(
             label="Model Performance",
             value="model_tab",
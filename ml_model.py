@@ -1,99 +1,312 @@
 # ml_model.py
 
 import os
+import threading
+import time
+import numpy as np
 import pandas as pd
+import polars as pl
 import pickle
-import xgboost as xgb
-from sklearn.preprocessing import LabelEncoder
-from imblearn.over_sampling import SMOTE
-from sqlalchemy import text
-from utils import engine
+# xgboost, imblearn and sklearn are imported where they are used: together
+# they cost about a second, which serving-only imports should not pay
+from database import get_engine
+from training_data import TrainingSnapshot, default_snapshot_dir
+from model_registry import ModelRegistry, ModelWatcher, ServingModel, save_encoders, load_encoders
+from inference import backend_name, load_native, make_backend, save_native
+import feature_store
+from feature_store import HISTORY_FEATURES, FeatureStore
 
+# The serving model: a ServingModel swapped as a whole, never mutated
 fraud_model = None
 
-def train_fraud_model():
+# Initial load: 'idle' until ensure_model_loaded() or start_warmup() runs,
+# then 'loading', and finally 'ready' or 'failed' (retried, see ensure_model_loaded)
+_load_state = 'idle'
+_load_error = None
+_load_failed_at = 0.0
+_load_lock = threading.Lock()
+
+FEATURE_COLUMNS = [
+    'step', 'customer', 'age', 'gender',
+    'zipcodeOri', 'merchant', 'zipMerchant',
+    'category', 'amount'
+]
+NUMERIC_FEATURES = ['step', 'amount']
+CATEGORICAL_FEATURES = [c for c in FEATURE_COLUMNS if c not in NUMERIC_FEATURES]
+
+# Code assigned to categorical values never seen during training
+UNKNOWN_CODE = -1
+
+# Bundle entry listing the model's input columns; bundles without it
+# belong to models trained on FEATURE_COLUMNS alone
+FEATURES_KEY = '_features'
+
+
+def encoders_path(model_path: str) -> str:
+    """Return the path of the encoder bundle stored next to the model file."""
+    return os.path.splitext(model_path)[0] + "_encoders.npz"
+
+
+def native_model_path(model_path: str) -> str:
+    """Return the path of the native-format (UBJ) copy of the model file."""
+    return os.path.splitext(model_path)[0] + ".ubj"
+
+
+def _column_strings(df, col: str) -> np.ndarray:
+    """A column of a pandas or polars frame as a NumPy string array."""
+    if isinstance(df, pl.DataFrame):
+        return df[col].cast(pl.Utf8).to_numpy().astype(str)
+    return df[col].to_numpy().astype(str)
+
+
+def fit_encoders(df) -> dict:
     """
-    Train the XGBoost fraud detection model only if the MODEL_PATH file does not exist.
-    MODEL_PATH is read from the environment each time to allow overrides (e.g., in tests).
-    If no training data is found, a default untrained model is still saved.
+    Build the encoder bundle: one sorted vocabulary array per categorical
+    column. A value's code is its position in the vocabulary, which matches
+    what LabelEncoder would assign on the same data.
     """
-    model_path = os.getenv("MODEL_PATH", "fraud_model.pkl")
-    if os.path.exists(model_path):
-        print(f"[ml_model] Model file '{model_path}' exists; skipping retrain.")
-        return
+    return {
+        col: np.unique(_column_strings(df, col))
+        for col in CATEGORICAL_FEATURES if col in df.columns
+    }
+
+
+def model_features(bundle: dict | None) -> list[str]:
+    """The model's input columns: FEATURE_COLUMNS, then HISTORY_FEATURES if it was trained with them."""
+    if bundle is not None and FEATURES_KEY in bundle:
+        return [str(c) for c in bundle[FEATURES_KEY]]
+    return FEATURE_COLUMNS
+
+
+def add_history_features(df, bundle: dict | None):
+    """
+    df with the history columns the model needs. Rows that lack them are
+    looked up in the feature store, without being recorded in it.
+    """
+    if not any(c in HISTORY_FEATURES and c not in df.columns for c in model_features(bundle)):
+        return df
+    history = feature_store.lookup(df)
+    if isinstance(df, pl.DataFrame):
+        return df.with_columns(history)
+    return df.assign(**{c: history[c].to_numpy() for c in history.columns})
+
+
+def _lookup_codes(vocab: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Vectorized vocabulary lookup; unseen values map to UNKNOWN_CODE."""
+    if len(vocab) == 0:
+        return np.full(len(values), UNKNOWN_CODE, dtype=np.int32)
+    pos = np.searchsorted(vocab, values)
+    pos = np.minimum(pos, len(vocab) - 1)
+    return np.where(vocab[pos] == values, pos, UNKNOWN_CODE).astype(np.int32)
+
+
+def _serving_bundle(bundle: dict | None) -> dict:
+    """
+    bundle, else the serving model's. A model without one is given a bundle
+    fitted once when it is loaded (see _fallback_encoders); anything else
+    gets an empty bundle, so categorical codes never depend on the batch.
+    """
+    if bundle is None:
+        bundle = getattr(fraud_model, 'encoders', None)
+    return {} if bundle is None else bundle
+
+
+def encode_features(df: pd.DataFrame, bundle: dict | None = None) -> pd.DataFrame:
+    """
+    Turn raw transaction columns into the model's feature frame.
+    Numeric features are cast to float; categorical features are looked up
+    in the encoder bundle (the serving model's by default, see _serving_bundle).
+    """
+    bundle = _serving_bundle(bundle)
+    df = add_history_features(df, bundle)
+
+    # Build every column as an array first; assigning into a frame one
+    # column at a time dominates the cost for small request batches.
+    columns = {}
+    for col in model_features(bundle):
+        if col in NUMERIC_FEATURES or col in HISTORY_FEATURES:
+            values = pd.to_numeric(df[col], errors='coerce')
+            columns[col] = np.nan_to_num(np.asarray(values, dtype=float))
+        else:
+            values = _column_strings(df, col)
+            columns[col] = _lookup_codes(bundle.get(col, np.array([], dtype=str)), values)
+    return pd.DataFrame(columns, index=df.index)
+
+def _polars_feature_matrix(df: pl.DataFrame, bundle: dict) -> np.ndarray:
+    """
+    Polars-native encoding: numeric casts and vocabulary lookups run as one
+    select, and the result is exported once as a C-ordered float32 matrix.
+    """
+    exprs = []
+    for col in model_features(bundle):
+        if col in NUMERIC_FEATURES or col in HISTORY_FEATURES:
+            exprs.append(pl.col(col).cast(pl.Float32, strict=False).fill_nan(0).fill_null(0))
+        else:
+            vocab = bundle.get(col, np.array([], dtype=str))
+            exprs.append(pl.col(col).cast(pl.Utf8).replace_strict(
+                pl.Series(vocab, dtype=pl.Utf8), pl.Series(np.arange(len(vocab))),
+                default=UNKNOWN_CODE, return_dtype=pl.Float32
+            ))
+    return df.select(exprs).to_numpy(order='c')
+
+
+def feature_matrix(df, bundle: dict | None = None) -> np.ndarray:
+    """
+    Model input for a pandas or polars frame as a contiguous float32
+    matrix in model_features(bundle) order. Polars frames never go through
+    pandas. Missing history features come from the feature store.
+    """
+    bundle = _serving_bundle(bundle)
+    df = add_history_features(df, bundle)
+    if isinstance(df, pl.DataFrame):
+        return _polars_feature_matrix(df, bundle)
+    return np.ascontiguousarray(encode_features(df, bundle).to_numpy(dtype=np.float32))
+
+
+def get_registry(model_path: str | None = None) -> ModelRegistry:
+    """
+    Return the model registry. MODEL_REGISTRY_DIR overrides the default,
+    a 'models' directory next to MODEL_PATH.
+    """
+    model_path = model_path or os.getenv("MODEL_PATH", "fraud_model.pkl")
+    root = os.getenv("MODEL_REGISTRY_DIR") or \
+        os.path.join(os.path.dirname(model_path) or ".", "models")
+    return ModelRegistry(root)
+
 
-    # 1) Identify tables with a 'fraud' column
-    schema_sql = """
-    SELECT m.table_name
-      FROM dbo.MasterTable AS m
-      JOIN INFORMATION_SCHEMA.COLUMNS AS c
-        ON c.TABLE_SCHEMA = 'dbo'
-       AND c.TABLE_NAME = m.table_name
-       AND c.COLUMN_NAME = 'fraud'
-     WHERE m.table_name LIKE 'transactions_%'
+def _save_model(model, bundle: dict, model_path: str, metadata: dict | None = None) -> str:
     """
+    Publish the model and its encoder bundle as a new registry version, and
+    mirror them to model_path (plus its native .ubj copy) via temp files and
+    os.replace so a reader never sees a half-written artifact. Returns the
+    registry version.
+    """
+    import xgboost as xgb
+
+    meta = {
+        "features": model_features(bundle),
+        "categorical_features": CATEGORICAL_FEATURES,
+        "vocabulary_sizes": {col: int(len(v)) for col, v in bundle.items() if col != FEATURES_KEY},
+        "xgboost_version": xgb.__version__,
+    }
+    meta.update(metadata or {})
+    version = get_registry(model_path).publish(model, bundle, meta)
+
+    enc_path = encoders_path(model_path)
+    native_path = native_model_path(model_path)
+    # XGBoost picks the format from the extension, so the temp name keeps it
+    native_tmp = os.path.splitext(native_path)[0] + ".tmp.ubj"
+    with open(model_path + ".tmp", "wb") as f:
+        pickle.dump(model, f)
+    save_encoders(bundle, enc_path + ".tmp")
+    has_native = save_native(model, native_tmp)
+    os.replace(enc_path + ".tmp", enc_path)
+    os.replace(model_path + ".tmp", model_path)
+    if has_native:
+        os.replace(native_tmp, native_path)
+    return version
+
+
+def _training_metrics(model, X, y) -> dict:
+    """Metrics on the original (pre-SMOTE) training rows."""
+    from sklearn.metrics import accuracy_score, precision_score, recall_score, roc_auc_score
+
     try:
-        master_df = pd.read_sql(schema_sql, engine)
+        probs = model.predict_proba(X)[:, 1]
+        preds = (probs >= 0.5).astype(int)
+        metrics = {
+            "accuracy": accuracy_score(y, preds),
+            "precision": precision_score(y, preds, zero_division=0),
+            "recall": recall_score(y, preds, zero_division=0),
+        }
+        if y.nunique() > 1:
+            metrics["roc_auc"] = roc_auc_score(y, probs)
+        return {k: round(float(v), 4) for k, v in metrics.items()}
     except Exception as e:
-        print(f"[ml_model] Error fetching table list: {e}")
-        master_df = pd.DataFrame()
-
-    # If no tables found, save a default model
-    if master_df.empty:
-        print("[ml_model] No training tables found; saving default model.")
-        default_model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
-        with open(model_path, "wb") as f:
-            pickle.dump(default_model, f)
-        return
+        print(f"[ml_model] Could not compute training metrics: {e}")
+        return {}
 
-    # 2) Load each table’s data
-    training_dfs = []
-    for tbl in master_df['table_name']:
-        qry = text(f"""
-            SELECT step, customer, age, gender,
-                   zipcodeOri, merchant, zipMerchant,
-                   category, amount, fraud
-              FROM dbo.{tbl}
-             WHERE fraud IN (0,1)
-        """)
+
+def _default_model():
+    import xgboost as xgb
+    return xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
+
+
+def training_mode() -> str:
+    """
+    TRAINING_MODE: 'streaming' (default) feeds the snapshot to XGBoost batch
+    by batch through external memory and weights the minority class;
+    'in_memory' is the original path that loads everything and runs SMOTE.
+    With history features (USE_HISTORY_FEATURES), streaming is no longer
+    bounded by TRAIN_BATCH_ROWS alone: their backfill briefly holds step,
+    customer, merchant and amount of every snapshot row in memory (see
+    _spill_history).
+    """
+    mode = os.getenv("TRAINING_MODE", "streaming")
+    if mode not in ('streaming', 'in_memory'):
+        raise ValueError(f"Unknown TRAINING_MODE '{mode}'")
+    return mode
+
+
+def _training_history(df, store_path: str | None, window: int) -> pl.DataFrame:
+    """
+    Point-in-time history features for training rows over `window` steps,
+    as scoring would have seen them (see feature_store.backfill_history).
+    If there is no serving feature store yet, one seeded with df is saved
+    at store_path.
+    """
+    history = feature_store.backfill_history(df, window)
+    if store_path and not os.path.exists(store_path):
         try:
-            df_part = pd.read_sql(qry, engine)
-            if not df_part.empty:
-                training_dfs.append(df_part)
+            FeatureStore.from_history(df, window).save(store_path)
         except Exception as e:
-            print(f"[ml_model] Skipping table {tbl}: {e}")
+            print(f"[ml_model] Could not save feature store: {e}")
+    return history
 
-    # If no valid data loaded, save a default model
-    if not training_dfs:
-        print("[ml_model] No valid training data found; saving default model.")
-        default_model = xgb.XGBClassifier(use_label_encoder=False, eval_metric='logloss')
-        with open(model_path, "wb") as f:
-            pickle.dump(default_model, f)
-        return
 
-    # 3) Concatenate and preprocess
-    df_all = pd.concat(training_dfs, ignore_index=True)
-    X = df_all.drop('fraud', axis=1)
+def _history_bundle(bundle: dict) -> dict:
+    return {**bundle, FEATURES_KEY: np.array(FEATURE_COLUMNS + HISTORY_FEATURES)}
+
+
+def _train_in_memory(snapshot: TrainingSnapshot, report, store_path: str | None = None):
+    """Load the whole snapshot, balance it with SMOTE and fit in memory."""
+    import xgboost as xgb
+    from imblearn.over_sampling import SMOTE
+
+    try:
+        df_all = snapshot.load()
+    except Exception as e:
+        print(f"[ml_model] Error reading training snapshot: {e}")
+        df_all = None
+    if df_all is None or df_all.empty:
+        return None
+
     y = df_all['fraud'].astype(int)
+    report("encoding", len(df_all))
 
-    # Label‐encode categorical features
-    for col in X.select_dtypes(include=['object']).columns:
-        X[col] = LabelEncoder().fit_transform(X[col].astype(str))
+    # Fit the encoder bundle and encode through the shared scoring path
+    bundle = fit_encoders(df_all)
+    extra = {}
+    if feature_store.history_enabled():
+        window = feature_store.training_window(store_path)
+        history = _training_history(df_all, store_path, window)
+        df_all = df_all.assign(**{c: history[c].to_numpy() for c in history.columns})
+        bundle = _history_bundle(bundle)
+        extra["history_window"] = window
+    X = encode_features(df_all, bundle)
 
-    # 4) Balance classes with SMOTE
+    report("SMOTE", len(X))
     try:
         sm = SMOTE(random_state=42)
         X_res, y_res = sm.fit_resample(X, y)
     except Exception as e:
-        print(f"[ml_model] SMOTE failed: {e}")
-        return
+        raise RuntimeError(f"SMOTE failed: {e}") from e
 
-    # 5) Compute scale_pos_weight
     pos = (y_res == 1).sum()
     neg = (y_res == 0).sum()
     scale_pw = neg / pos if pos else 1
 
-    # 6) Train XGBoost
+    report("fitting", len(X_res))
     model = xgb.XGBClassifier(
         use_label_encoder=False,
         eval_metric='logloss',
@@ -101,51 +314,475 @@ def train_fraud_model():
         scale_pos_weight=scale_pw
     )
     model.fit(X_res, y_res)
+    return model, bundle, {
+        "training_mode": "in_memory",
+        "training_rows": int(len(df_all)),
+        "resampled_rows": int(len(X_res)),
+        "metrics": _training_metrics(model, X, y),
+        **extra,
+    }
 
-    # 7) Save the model
-    with open(model_path, "wb") as f:
-        pickle.dump(model, f)
-    print(f"[ml_model] Model trained and saved to '{model_path}'.")
 
+def _sample_negatives(batch: pl.DataFrame, rate: float, seed: int) -> pl.DataFrame:
+    """Keep every fraud row and each other row with probability rate."""
+    if rate >= 1.0:
+        return batch
+    keep = np.random.default_rng(seed).random(batch.height) < rate
+    return batch.filter(pl.Series(keep) | (pl.col('fraud') == 1))
+
+
+def _scan_snapshot(snapshot: TrainingSnapshot) -> tuple[int, int, dict]:
+    """One streaming pass: row count, fraud count and the encoder bundle."""
+    rows = positives = 0
+    vocab = {col: np.array([], dtype=str) for col in CATEGORICAL_FEATURES}
+    for batch in snapshot.iter_batches():
+        batch = batch.with_columns(pl.col('fraud').cast(pl.Int32, strict=False))
+        rows += batch.height
+        positives += int((batch['fraud'] == 1).sum())
+        for col, known in fit_encoders(batch).items():
+            vocab[col] = np.union1d(vocab[col], known)
+    return rows, positives, vocab
+
+
+def _spill_history(snapshot: TrainingSnapshot, store_path: str | None, window: int,
+                   cache_dir: str) -> str:
+    """
+    Backfill the history features of every snapshot row and write them to
+    Parquet in cache_dir; returns the file's path. The backfill needs the
+    four columns it reads for the whole history at once, so this is the
+    one step of streaming training whose memory grows with history size.
+    Fitting then reads the features back one batch at a time.
+    """
+    columns = ['step', 'customer', 'merchant', 'amount']
+    history = _training_history(pl.concat(list(snapshot.iter_batches(columns=columns))),
+                                store_path, window)
+    path = os.path.join(cache_dir, "history.parquet")
+    history.write_parquet(path)
+    return path
+
+
+def _training_batches(snapshot: TrainingSnapshot, history_path: str | None):
+    """Snapshot batches with their rows' history features (from history_path) alongside."""
+    history = pl.scan_parquet(history_path) if history_path else None
+    offset = 0
+    for batch in snapshot.iter_batches():
+        if history is not None:
+            batch = batch.hstack(history.slice(offset, batch.height).collect())
+        offset += batch.height
+        yield batch
+
+
+def _snapshot_iter(snapshot: TrainingSnapshot, bundle: dict, history_path: str | None,
+                   neg_rate: float, cache_prefix: str, seed: int = 42):
+    """An xgboost DataIter over the snapshot, one encoded batch per call."""
+    import xgboost as xgb
+
+    class SnapshotIter(xgb.DataIter):
+        # XGBoost may walk the data more than once; sampling is seeded per
+        # batch so every pass sees the same rows
+        def __init__(self):
+            super().__init__(cache_prefix=cache_prefix, release_data=True)
+            self._batches = None
+            self._index = 0
 
-def load_fraud_model():
+        def reset(self):
+            self._batches = None
+            self._index = 0
+
+        def next(self, input_data):
+            if self._batches is None:
+                self._batches = _training_batches(snapshot, history_path)
+            for batch in self._batches:
+                batch = batch.with_columns(pl.col('fraud').cast(pl.Int32, strict=False))
+                batch = _sample_negatives(batch, neg_rate, seed + self._index)
+                self._index += 1
+                if batch.height:
+                    input_data(data=feature_matrix(batch, bundle),
+                               label=batch['fraud'].fill_null(0).to_numpy())
+                    return True
+            return False
+
+    return SnapshotIter()
+
+
+def _metrics_sample(snapshot: TrainingSnapshot, bundle: dict, history_path: str | None,
+                    rows: int, max_rows: int):
+    """A uniform sample of at most about max_rows encoded rows and their labels."""
+    rate = min(1.0, max_rows / rows) if rows else 1.0
+    rng = np.random.default_rng(7)
+    xs, ys = [], []
+    for batch in _training_batches(snapshot, history_path):
+        if rate < 1.0:
+            batch = batch.filter(pl.Series(rng.random(batch.height) < rate))
+        xs.append(feature_matrix(batch, bundle))
+        ys.append(batch['fraud'].cast(pl.Int32, strict=False).fill_null(0).to_numpy())
+    return np.concatenate(xs), pd.Series(np.concatenate(ys))
+
+
+def _train_streaming(snapshot: TrainingSnapshot, report, store_path: str | None = None):
     """
-    Load the fraud detection model from MODEL_PATH, training it first if needed.
+    Out-of-core training: batches from the snapshot are quantized into an
+    ExtMemQuantileDMatrix whose pages live on disk, so peak memory depends
+    on TRAIN_BATCH_ROWS rather than on the history size. Imbalance is
+    handled with scale_pos_weight instead of synthetic rows; optionally
+    TRAIN_NEG_SAMPLE_RATE < 1 also drops that share of non-fraud rows.
+    History features are the exception: they are backfilled once for the
+    whole snapshot, which holds four columns of every row in memory, and
+    spilled to disk before fitting (see _spill_history).
     """
+    import tempfile
+
+    report("encoding")
+    rows, positives, bundle = _scan_snapshot(snapshot)
+    if rows == 0:
+        return None
+    os.makedirs(snapshot.root, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".xgb_cache_", dir=snapshot.root) as cache_dir:
+        history_path, window = None, None
+        if feature_store.history_enabled():
+            window = feature_store.training_window(store_path)
+            history_path = _spill_history(snapshot, store_path, window, cache_dir)
+            bundle = _history_bundle(bundle)
+        model, bundle, metadata = _fit_streaming(snapshot, report, rows, positives, bundle,
+                                                 history_path, cache_dir)
+    if window is not None:
+        metadata["history_window"] = window
+    return model, bundle, metadata
+
+
+def _fit_streaming(snapshot: TrainingSnapshot, report, rows: int, positives: int, bundle: dict,
+                   history_path: str | None, cache_dir: str):
+    """The external-memory fit of _train_streaming, with its cache in cache_dir."""
+    import xgboost as xgb
+
+    neg_rate = float(os.getenv("TRAIN_NEG_SAMPLE_RATE", 1.0))
+    negatives = (rows - positives) * neg_rate
+    nthread = int(os.getenv("TRAIN_NTHREAD", os.cpu_count() or 1))
+    max_bin = int(os.getenv("TRAIN_MAX_BIN", 256))
+    params = {
+        "objective": "binary:logistic",
+        "eval_metric": "logloss",
+        "tree_method": "hist",
+        "max_bin": max_bin,
+        "nthread": nthread,
+        "seed": 42,
+        "scale_pos_weight": negatives / positives if positives else 1.0,
+    }
+    rounds = int(os.getenv("TRAIN_ROUNDS", 100))
+
+    report("building matrix", rows)
+    data = _snapshot_iter(snapshot, bundle, history_path, neg_rate, os.path.join(cache_dir, "train"))
+    dmatrix = xgb.ExtMemQuantileDMatrix(data, max_bin=max_bin, nthread=nthread)
+    report("fitting", rows)
+    booster = xgb.train(params, dmatrix, num_boost_round=rounds)
+    del dmatrix, data
+
+    # Keep the sklearn wrapper as the saved type so every loader handles it
+    model = xgb.XGBClassifier()
+    model.load_model(bytearray(booster.save_raw("ubj")))
+    X_eval, y_eval = _metrics_sample(snapshot, bundle, history_path, rows,
+                                     int(os.getenv("TRAIN_METRICS_ROWS", 200_000)))
+    return model, bundle, {
+        "training_mode": "streaming",
+        "training_rows": rows,
+        "fraud_rows": positives,
+        "negative_sample_rate": neg_rate,
+        "params": params,
+        "num_boost_round": rounds,
+        "metrics": _training_metrics(model, X_eval, y_eval),
+    }
+
+
+def train_fraud_model(force: bool = False, progress=None, model_path: str | None = None):
+    """
+    Train the XGBoost fraud detection model only if the MODEL_PATH file does not exist.
+    MODEL_PATH is read from the environment each time to allow overrides (e.g., in tests).
+    If no training data is found, a default untrained model is still saved.
+    TRAINING_MODE picks streaming (default) or in-memory training. Unless
+    USE_HISTORY_FEATURES=0, the model also learns from point-in-time
+    customer/merchant history (see feature_store.py), and a store seeded
+    from the training rows becomes the serving feature store if none
+    exists yet.
+
+    force retrains even when the file exists. progress, if given, is called as
+    progress(phase, rows) when each phase starts. Returns the saved model path,
+    or None if nothing was saved.
+    """
+    model_path = model_path or os.getenv("MODEL_PATH", "fraud_model.pkl")
+    if os.path.exists(model_path) and not force:
+        print(f"[ml_model] Model file '{model_path}' exists; skipping retrain.")
+        return None
+
+    def report(phase, rows=0):
+        if progress is not None:
+            progress(phase, rows)
+
+    report("loading tables")
+
+    # 1) Bring the local snapshot up to date with tables uploaded since the
+    #    last sync; previously copied tables are not read from SQL again
+    snapshot = TrainingSnapshot(default_snapshot_dir(model_path))
+    try:
+        snapshot.sync(get_engine(), progress=lambda rows: report("loading tables", rows))
+    except Exception as e:
+        print(f"[ml_model] Error syncing training snapshot: {e}")
+
+    # 2) Fit on the full training history
+    store_path = feature_store.default_store_path(model_path)
+    try:
+        if training_mode() == 'in_memory':
+            trained = _train_in_memory(snapshot, report, store_path)
+        else:
+            trained = _train_streaming(snapshot, report, store_path)
+    except Exception as e:
+        print(f"[ml_model] Training failed: {e}")
+        return None
+
+    # If no valid data loaded, save a default model
+    if trained is None:
+        print("[ml_model] No valid training data found; saving default model.")
+        report("saving")
+        _save_model(_default_model(), {}, model_path, {"training_rows": 0})
+        return model_path
+
+    # 3) Save the model and its encoder bundle
+    model, bundle, metadata = trained
+    report("saving", metadata["training_rows"])
+    version = _save_model(model, bundle, model_path, metadata)
+    print(f"[ml_model] Model {version} trained and saved to '{model_path}'.")
+    return model_path
+
+
+def _warm_up(serving: ServingModel):
+    """Run one prediction so the first real request doesn't pay setup costs."""
+    try:
+        serving.predict_proba(np.zeros((1, len(model_features(serving.encoders))), dtype=np.float32))
+    except Exception:
+        pass
+
+
+def swap_model(serving: ServingModel | None):
+    """Atomically replace the serving model with a single reference swap."""
     global fraud_model
-    model_path = os.getenv("MODEL_PATH", "fraud_model.pkl")
+    fraud_model = serving
+
+
+def _check_history_window(serving: ServingModel):
+    """
+    Refuse a model whose history features were computed over another
+    window than the feature store's (raises feature_store.WindowMismatch).
+    """
+    window = serving.metadata.get("history_window")
+    if window is None or not any(c in HISTORY_FEATURES for c in model_features(serving.encoders)):
+        return
+    try:
+        feature_store.check_window(int(window))
+    except feature_store.WindowMismatch as e:
+        print(f"[ml_model] Refusing to serve model {serving.version}: {e} Retrain the model or "
+              f"remove the feature store snapshot.")
+        raise
+
+
+def activate_version(version: str, registry: ModelRegistry | None = None):
+    """Load a registry version, check it, warm it up, then make it the serving model."""
+    serving = (registry or get_registry()).load(version)
+    _check_history_window(serving)
+    _warm_up(serving)
+    swap_model(serving)
+    print(f"[ml_model] Serving model version {version}.")
+
+
+def _fallback_encoders(model_path: str) -> dict:
+    """
+    Encoder bundle for a model saved before bundles were persisted. It is
+    fitted once, from the training snapshot the model would have been
+    trained on, and saved next to the model so later loads reuse it.
+    Without training data every categorical value encodes as UNKNOWN_CODE.
+    """
+    print(f"[ml_model] WARNING: '{model_path}' has no encoder bundle; categorical codes "
+          f"may not match training. Retrain the model to fix this.")
+    bundle, rows = {}, 0
+    snapshot = TrainingSnapshot(default_snapshot_dir(model_path))
+    try:
+        snapshot.sync(get_engine())
+    except Exception as e:
+        print(f"[ml_model] Error syncing training snapshot: {e}")
+    try:
+        rows, _, vocab = _scan_snapshot(snapshot)
+        if rows:
+            bundle = vocab
+    except Exception as e:
+        print(f"[ml_model] Could not fit encoders from training data: {e}")
+    if not bundle:
+        print("[ml_model] WARNING: no training data; every categorical value is scored as unknown.")
+        return bundle
+    try:
+        save_encoders(bundle, encoders_path(model_path))
+    except OSError as e:
+        print(f"[ml_model] Could not save encoders: {e}")
+    print(f"[ml_model] Fitted encoders for '{model_path}' from {rows} training rows.")
+    return bundle
+
+
+def load_fraud_model(model_path: str | None = None):
+    """
+    Load the latest registry version, falling back to the single-file model
+    and its encoder bundle at model_path (MODEL_PATH by default), training
+    it first if needed.
+    """
+    model_path = model_path or os.getenv("MODEL_PATH", "fraud_model.pkl")
+    registry = get_registry(model_path)
+    latest = registry.latest_version()
+    if latest is not None:
+        try:
+            activate_version(latest, registry)
+            return
+        except feature_store.WindowMismatch:
+            # The single-file copy is the same model; don't serve it either
+            raise
+        except Exception as e:
+            print(f"[ml_model] Failed to load registry version {latest}: {e}")
+
     if not os.path.exists(model_path):
-        train_fraud_model()
+        train_fraud_model(model_path=model_path)
     try:
-        with open(model_path, "rb") as f:
-            fraud_model = pickle.load(f)
-        print(f"[ml_model] Model loaded from '{model_path}'.")
+        backend = backend_name()
+        native_path = native_model_path(model_path)
+        # The native copy is only trusted if it is not older than the pickle
+        if backend != 'sklearn' and os.path.exists(native_path) \
+                and os.path.getmtime(native_path) >= os.path.getmtime(model_path):
+            model, source = load_native(native_path), native_path
+        else:
+            with open(model_path, "rb") as f:
+                model, source = pickle.load(f), model_path
+        encoders = load_encoders(encoders_path(model_path))
+        if encoders is None:
+            encoders = _fallback_encoders(model_path)
+        serving = ServingModel(make_backend(model, backend, lib_dir=os.path.dirname(model_path) or "."),
+                               encoders, "legacy")
+        _warm_up(serving)
+        swap_model(serving)
+        print(f"[ml_model] Model loaded from '{source}' ({type(serving.model).__name__}).")
     except Exception as e:
         print(f"[ml_model] Failed to load model: {e}")
-        fraud_model = None
+        swap_model(None)
+
+
+def ensure_model_loaded(wait: bool = True):
+    """
+    Run the initial load_fraud_model() once and return the serving model,
+    waiting for a load already running in another thread. A failed load
+    is tried again.
+
+    wait=False never blocks: it starts the load in the background if none
+    is running (after a failure, once MODEL_RETRY_SECONDS have passed) and
+    returns the serving model, None until the load has finished.
+    """
+    global _load_state, _load_error, _load_failed_at
+    if _load_state == 'ready':
+        return fraud_model
+    if not wait:
+        retry_after = float(os.getenv("MODEL_RETRY_SECONDS", 30))
+        if _load_state == 'idle' or \
+                (_load_state == 'failed' and time.monotonic() - _load_failed_at >= retry_after):
+            start_warmup(watch=False)
+        return fraud_model
+    with _load_lock:
+        if _load_state != 'ready':
+            _load_state = 'loading'
+            try:
+                load_fraud_model()
+            except Exception as e:
+                _load_error = str(e)
+                print(f"[ml_model] Model warmup failed: {e}")
+            if fraud_model is not None:
+                _load_state = 'ready'
+            else:
+                _load_state, _load_failed_at = 'failed', time.monotonic()
+    return fraud_model
+
+
+def start_warmup(watch: bool = True) -> threading.Thread:
+    """
+    Load the model in a background thread so startup does not wait for
+    unpickling (or for training, when no model exists yet). With watch, the
+    registry watcher is started once the initial load has finished.
+    """
+    global _load_state
+    if _load_state in ('idle', 'failed'):
+        _load_state = 'loading'
+
+    def _run():
+        ensure_model_loaded()
+        if watch:
+            start_model_watcher()
+
+    thread = threading.Thread(target=_run, name="model-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def model_status() -> dict:
+    """Whether scoring is available, for readiness checks."""
+    model = fraud_model
+    status = {
+        'ready': model is not None,
+        'state': 'ready' if model is not None else _load_state,
+        'version': getattr(model, 'version', None),
+    }
+    if model is None and _load_error:
+        status['error'] = _load_error
+    return status
+
+
+def start_model_watcher(interval: float | None = None) -> ModelWatcher:
+    """Hot-reload new registry versions in the background as they appear."""
+    registry = get_registry()
+    current = getattr(fraud_model, 'version', None)
+    watcher = ModelWatcher(
+        registry,
+        lambda version: activate_version(version, registry),
+        current=current if current != "legacy" else None,
+        interval=interval
+    )
+    return watcher.start()
+
+
+def score_transactions(df) -> np.ndarray:
+    """
+    Return the fraud probability for every row of a pandas or polars frame
+    with a single predict_proba call. Raises RuntimeError if no model is
+    loaded. The model is fed a float32 matrix, which skips the wrapper's
+    DataFrame handling.
+    """
+    model = fraud_model
+    if model is None:
+        model = ensure_model_loaded(wait=False)
+    if model is None:
+        if _load_state == 'loading':
+            raise RuntimeError("Fraud detection model is still loading.")
+        raise RuntimeError("Fraud detection model is unavailable.")
+    X = feature_matrix(df, getattr(model, 'encoders', None))
+    return np.asarray(model.predict_proba(X))[:, 1]
 
 
 def detect_fraud(df):
     """
     Predict fraud on the given DataFrame and return a summary string.
     """
-    if fraud_model is None:
+    model = fraud_model
+    if model is None:
+        model = ensure_model_loaded(wait=False)
+    if model is None:
         return "Fraud detection model is unavailable."
 
-    required = [
-        'step', 'customer', 'age', 'gender',
-        'zipcodeOri', 'merchant', 'zipMerchant',
-        'category', 'amount'
-    ]
-    missing = [c for c in required if c not in df.columns]
+    missing = [c for c in FEATURE_COLUMNS if c not in df.columns]
     if missing:
         return f"Missing required features: {', '.join(missing)}."
 
-    Xp = df[required].copy()
-    for col in Xp.select_dtypes(include=['object']).columns:
-        Xp[col] = LabelEncoder().fit_transform(Xp[col].astype(str))
+    Xp = encode_features(df, getattr(model, 'encoders', None))
 
-    preds = fraud_model.predict(Xp)
+    preds = model.predict(Xp)
     # Handle both numpy arrays and lists
     try:
         n_fraud = int((preds == 1).sum())
@@ -157,6 +794,3 @@ def detect_fraud(df):
         if n_fraud > 0 else "No fraud detected."
     )
 
-
-# Initialize the model on import
-load_fraud_model()
@@ -0,0 +1,207 @@
+# model_registry.py
+
+import errno
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from inference import NATIVE_MODEL_FILE, backend_name, load_native, make_backend, save_native
+
+
+def save_encoders(bundle: dict, path: str):
+    """Write the encoder bundle as plain string arrays (no pickle)."""
+    with open(path, "wb") as f:
+        np.savez(f, **bundle)
+
+
+def load_encoders(path: str) -> dict | None:
+    """Load an encoder bundle, or return None if it is missing or unreadable."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            return {col: data[col] for col in data.files}
+    except Exception as e:
+        print(f"[model_registry] Failed to load encoders: {e}")
+        return None
+
+
+def version_number(version: str) -> int:
+    """The number of a version name: 'v0012' -> 12."""
+    return int(version[1:])
+
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ServingModel:
+    """
+    A model together with the encoder bundle it was trained with.
+    Instances are never mutated: serving code swaps the whole object, so a
+    request that grabbed one keeps a consistent model/encoder pair.
+    """
+
+    __slots__ = ("model", "encoders", "version", "metadata")
+
+    def __init__(self, model, encoders: dict | None, version: str, metadata: dict | None = None):
+        self.model = model
+        self.encoders = encoders
+        self.version = version
+        self.metadata = metadata or {}
+
+    def predict(self, X):
+        return self.model.predict(X)
+
+    def predict_proba(self, X):
+        return self.model.predict_proba(X)
+
+
+class ModelRegistry:
+    """
+    Versioned model artifacts under a root directory, one sub-directory per
+    version (v0001, v0002, ...) holding model.pkl, encoders.npz and
+    metadata.json, plus model.ubj (the Booster in XGBoost's native format)
+    for XGBoost models. A version is built in a temp directory and renamed
+    into place, so a visible version is always complete.
+    """
+
+    MODEL_FILE = "model.pkl"
+    ENCODERS_FILE = "encoders.npz"
+    METADATA_FILE = "metadata.json"
+    # Versions taken by concurrent writers before publish() gives up
+    PUBLISH_ATTEMPTS = 100
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def versions(self) -> list[str]:
+        """All published versions, oldest first."""
+        if not os.path.isdir(self.root):
+            return []
+        return sorted((
+            name for name in os.listdir(self.root)
+            if name.startswith("v") and name[1:].isdigit()
+            and os.path.exists(os.path.join(self.root, name, self.METADATA_FILE))
+        ), key=version_number)
+
+    def latest_version(self) -> str | None:
+        versions = self.versions()
+        return versions[-1] if versions else None
+
+    def metadata(self, version: str) -> dict:
+        with open(os.path.join(self.root, version, self.METADATA_FILE)) as f:
+            return json.load(f)
+
+    def publish(self, model, bundle: dict, metadata: dict | None = None) -> str:
+        """Write a new version and return its name."""
+        os.makedirs(self.root, exist_ok=True)
+        tmp_dir = os.path.join(self.root, f".tmp_{os.getpid()}_{time.time_ns()}")
+        os.makedirs(tmp_dir)
+
+        model_file = os.path.join(tmp_dir, self.MODEL_FILE)
+        with open(model_file, "wb") as f:
+            pickle.dump(model, f)
+        save_encoders(bundle, os.path.join(tmp_dir, self.ENCODERS_FILE))
+
+        meta = dict(metadata or {})
+        meta["created_at"] = datetime.now().isoformat(timespec="seconds")
+        meta["sha256"] = file_sha256(model_file)
+        native_file = os.path.join(tmp_dir, NATIVE_MODEL_FILE)
+        if save_native(model, native_file):
+            meta["native_sha256"] = file_sha256(native_file)
+
+        # Rename into the next free slot; retry if another writer took it
+        for _ in range(self.PUBLISH_ATTEMPTS):
+            latest = self.latest_version()
+            number = version_number(latest) + 1 if latest else 1
+            version = f"v{number:04d}"
+            meta["version"] = version
+            with open(os.path.join(tmp_dir, self.METADATA_FILE), "w") as f:
+                json.dump(meta, f, indent=2)
+            try:
+                os.rename(tmp_dir, os.path.join(self.root, version))
+                return version
+            except OSError as e:
+                if e.errno not in (errno.EEXIST, errno.ENOTEMPTY):
+                    shutil.rmtree(tmp_dir, ignore_errors=True)
+                    raise
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise RuntimeError(f"Could not publish a model version after {self.PUBLISH_ATTEMPTS} attempts.")
+
+    def load(self, version: str, backend: str | None = None) -> ServingModel:
+        """
+        Load a version behind the given inference backend (INFERENCE_BACKEND
+        by default), checking the model file against its recorded hash. The
+        native model file is used when present, so only the 'sklearn'
+        backend and older versions need to unpickle.
+        """
+        backend = backend or backend_name()
+        vdir = os.path.join(self.root, version)
+        meta = self.metadata(version)
+        native_file = os.path.join(vdir, NATIVE_MODEL_FILE)
+        if backend != 'sklearn' and meta.get("native_sha256") and os.path.exists(native_file):
+            if file_sha256(native_file) != meta["native_sha256"]:
+                raise ValueError(f"Model hash mismatch for version {version}.")
+            model = load_native(native_file)
+        else:
+            model_file = os.path.join(vdir, self.MODEL_FILE)
+            if meta.get("sha256") and file_sha256(model_file) != meta["sha256"]:
+                raise ValueError(f"Model hash mismatch for version {version}.")
+            with open(model_file, "rb") as f:
+                model = pickle.load(f)
+        encoders = load_encoders(os.path.join(vdir, self.ENCODERS_FILE))
+        return ServingModel(make_backend(model, backend, lib_dir=vdir), encoders, version, meta)
+
+
+class ModelWatcher:
+    """
+    Poll a registry in a background thread and call on_new(version) when a
+    newer version than the last one seen appears.
+    """
+
+    def __init__(self, registry: ModelRegistry, on_new, current: str | None = None,
+                 interval: float | None = None):
+        self.registry = registry
+        self.on_new = on_new
+        self.current = current
+        self.interval = interval or float(os.getenv("MODEL_WATCH_INTERVAL", 5))
+        self._stop = threading.Event()
+        self._thread = None
+
+    def poll_once(self) -> bool:
+        latest = self.registry.latest_version()
+        if latest is None or (self.current is not None
+                              and version_number(latest) <= version_number(self.current)):
+            return False
+        # Versions are immutable, so one that fails to load is not retried
+        self.current = latest
+        try:
+            self.on_new(latest)
+        except Exception as e:
+            print(f"[model_registry] Failed to activate {latest}: {e}")
+            return False
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll_once()
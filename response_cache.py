@@ -0,0 +1,62 @@
+# response_cache.py
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU of rendered API responses with a TTL. Entries are
+    (body, mimetype, etag) tuples. clear() bumps a generation counter, and
+    put() ignores results computed under an older generation, so a query
+    that raced an upload cannot repopulate the cache with stale rows.
+    """
+
+    def __init__(self, max_entries: int | None = None, ttl: float | None = None):
+        self.max_entries = max_entries or int(os.getenv("API_CACHE_ENTRIES", 256))
+        self.ttl = ttl if ttl is not None else float(os.getenv("API_CACHE_TTL", 60))
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            stored_at, entry = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic(), entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def make_etag(body: bytes) -> str:
+    """A strong validator (unquoted) for an exact response body."""
+    return hashlib.sha256(body).hexdigest()[:32]
+
+
+# Rendered /api/v1/transactions pages; utils clears it whenever rows or
+# MasterTable entries are written
+transactions_cache = ResponseCache()
@@ -0,0 +1,215 @@
+# rollups.py
+"""
+Pre-aggregated history for the dashboard. Every stored upload adds rows
+to dbo.TransactionRollup: per upload date and per value of each
+dimension (hour of day, category, merchant, customer), the row count,
+amount sum and fraud count. History charts query these small rows for a
+date range and never touch the raw transactions.
+
+Run `python rollups.py backfill` once to add uploads registered in
+MasterTable before the rollups existed.
+"""
+
+import argparse
+from datetime import date, datetime
+
+import pandas as pd
+import polars as pl
+from sqlalchemy import (
+    MetaData, Table, Column, Index, BigInteger, DateTime, Float, String,
+    func, select
+)
+
+from database import get_engine
+from storage import batch_query
+
+ROLLUP_DIMENSIONS = ['hour', 'category', 'merchant', 'customer']
+
+_rollup_meta = MetaData(schema='dbo')
+rollup_table = Table(
+    'TransactionRollup', _rollup_meta,
+    Column('table_name', String(128), nullable=False),
+    Column('upload_date', String(10), nullable=False),
+    Column('uploaded_at', DateTime, nullable=False),
+    Column('dimension', String(32), nullable=False),
+    Column('dim_value', String(256), nullable=False),
+    Column('row_count', BigInteger, nullable=False),
+    Column('amount_sum', Float, nullable=False),
+    # Only rows with a 0/1 label count towards the fraud rate
+    Column('labelled_rows', BigInteger, nullable=False),
+    Column('fraud_sum', BigInteger, nullable=False),
+    Index('ix_TransactionRollup_dimension_date', 'dimension', 'upload_date'),
+)
+_ready = False
+
+_SUMS = ['row_count', 'amount_sum', 'labelled_rows', 'fraud_sum']
+
+
+def ensure_rollup_table():
+    global _ready
+    if not _ready:
+        _rollup_meta.create_all(get_engine(), checkfirst=True)
+        _ready = True
+
+
+def _dimension_key(dimension: str) -> pl.Expr:
+    if dimension == 'hour':
+        # NaN/inf steps (read from CSV as floats) have no hour
+        return ((pl.col('step').cast(pl.Float64, strict=False) - 1) % 24).fill_nan(None)\
+                 .cast(pl.Int64).cast(pl.Utf8).alias('dim_value')
+    return pl.col(dimension).cast(pl.Utf8).alias('dim_value')
+
+
+def rollup_rows(df: pd.DataFrame | pl.DataFrame, table_name: str, uploaded_at: datetime) -> pl.DataFrame:
+    """
+    Aggregate one upload (or one chunk of it) into rollup rows. All
+    dimensions are collected together in a single pass over the frame.
+    """
+    if isinstance(df, pd.DataFrame):
+        df = pl.from_pandas(df)
+    source = {'hour': 'step'}
+    fraud = pl.col('fraud').cast(pl.Int64, strict=False) if 'fraud' in df.columns \
+        else pl.lit(None, dtype=pl.Int64)
+    labelled = fraud.is_in([0, 1])
+    amount = pl.col('amount').cast(pl.Float64, strict=False) if 'amount' in df.columns \
+        else pl.lit(0.0)
+
+    lf = df.lazy()
+    queries = []
+    for dimension in ROLLUP_DIMENSIONS:
+        if source.get(dimension, dimension) not in df.columns:
+            continue
+        queries.append(
+            lf.group_by(_dimension_key(dimension)).agg(
+                pl.len().cast(pl.Int64).alias('row_count'),
+                amount.fill_null(0.0).sum().alias('amount_sum'),
+                labelled.sum().cast(pl.Int64).alias('labelled_rows'),
+                pl.when(labelled).then(fraud).otherwise(0).sum().cast(pl.Int64).alias('fraud_sum'),
+            ).drop_nulls('dim_value').with_columns(pl.lit(dimension).alias('dimension'))
+        )
+    if not queries:
+        return pl.DataFrame()
+    return pl.concat(pl.collect_all(queries)).with_columns(
+        pl.lit(table_name).alias('table_name'),
+        pl.lit(uploaded_at.strftime('%Y-%m-%d')).alias('upload_date'),
+        pl.lit(uploaded_at).alias('uploaded_at'),
+    )
+
+
+def merge_rollup_rows(parts: list[pl.DataFrame]) -> pl.DataFrame:
+    """Combine the rollup rows of several chunks of the same upload."""
+    parts = [p for p in parts if p.height]
+    if not parts:
+        return pl.DataFrame()
+    keys = ['table_name', 'upload_date', 'uploaded_at', 'dimension', 'dim_value']
+    return pl.concat(parts).group_by(keys, maintain_order=True).agg(pl.col(_SUMS).sum())
+
+
+def record_rollups(rows: pl.DataFrame) -> bool:
+    """Insert an upload's rollup rows. Returns False (and prints) on failure."""
+    if not rows.height:
+        return True
+    try:
+        ensure_rollup_table()
+        with get_engine().begin() as conn:
+            conn.execute(rollup_table.insert(), rows.to_dicts())
+        return True
+    except Exception as e:
+        print(f"[rollups] Error recording rollups: {e}")
+        return False
+
+
+def backfill_rollups(progress=None) -> int:
+    """
+    Add rollups for MasterTable uploads that have none yet. Returns the
+    number of uploads added.
+    """
+    ensure_rollup_table()
+    missing = pl.read_database(
+        "SELECT m.table_name, m.uploaded_at FROM dbo.MasterTable AS m "
+        "WHERE m.table_name LIKE 'transactions_%' AND NOT EXISTS "
+        "(SELECT 1 FROM dbo.TransactionRollup AS r WHERE r.table_name = m.table_name) "
+        "ORDER BY m.uploaded_at",
+        connection=get_engine()
+    )
+    added = 0
+    for tbl, uploaded_at in missing.iter_rows():
+        try:
+            df = pl.read_database(batch_query(tbl), connection=get_engine())
+            uploaded_at = pd.Timestamp(uploaded_at).to_pydatetime()
+            if record_rollups(rollup_rows(df, tbl, uploaded_at)):
+                added += 1
+        except Exception as e:
+            print(f"[rollups] Skipping backfill of {tbl}: {e}")
+        if progress is not None:
+            progress(tbl, added)
+    return added
+
+
+def _as_date(value) -> str | None:
+    if value is None or value == '':
+        return None
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m-%d')
+    return str(value)[:10]
+
+
+def query_rollup(dimension: str, start_date=None, end_date=None,
+                 order_by: str | None = None, limit: int | None = None) -> pd.DataFrame | None:
+    """
+    Totals per value of dimension over uploads dated start_date..end_date
+    (inclusive, either may be None): row_count, amount_sum, labelled_rows,
+    fraud_sum and fraud_rate (%). Ordered by value, or by order_by
+    descending with at most limit rows. Returns None on error.
+    """
+    if dimension not in ROLLUP_DIMENSIONS:
+        raise ValueError(f"Unknown dimension '{dimension}'")
+    t = rollup_table.c
+    sums = [func.sum(getattr(t, c)).label(c) for c in _SUMS]
+    qry = select(t.dim_value.label('value'), *sums).where(t.dimension == dimension)
+    if _as_date(start_date):
+        qry = qry.where(t.upload_date >= _as_date(start_date))
+    if _as_date(end_date):
+        qry = qry.where(t.upload_date <= _as_date(end_date))
+    qry = qry.group_by(t.dim_value)
+    if order_by in _SUMS:
+        qry = qry.order_by(func.sum(getattr(t, order_by)).desc(), t.dim_value)
+    else:
+        qry = qry.order_by(t.dim_value)
+    if limit:
+        qry = qry.limit(limit)
+    try:
+        ensure_rollup_table()
+        with get_engine().connect() as conn:
+            df = pd.DataFrame(conn.execute(qry).mappings().all(), columns=['value', *_SUMS])
+    except Exception as e:
+        print(f"[rollups] Error querying {dimension} rollup: {e}")
+        return None
+    df['fraud_rate'] = df['fraud_sum'] / df['labelled_rows'].where(df['labelled_rows'] > 0) * 100
+    if dimension == 'hour':
+        df['value'] = df['value'].astype(int)
+        df = df.sort_values('value', kind='stable') if order_by is None else df
+    return df.reset_index(drop=True)
+
+
+def rollup_date_range() -> tuple[str | None, str | None]:
+    """The first and last upload dates covered by the rollups."""
+    try:
+        ensure_rollup_table()
+        with get_engine().connect() as conn:
+            first, last = conn.execute(
+                select(func.min(rollup_table.c.upload_date), func.max(rollup_table.c.upload_date))
+            ).one()
+        return first, last
+    except Exception as e:
+        print(f"[rollups] Error reading rollup dates: {e}")
+        return None, None
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Maintain the dashboard rollup table.")
+    parser.add_argument("command", choices=["backfill"])
+    args = parser.parse_args()
+
+    total = backfill_rollups(progress=lambda name, n: print(f"[rollups] {name} done"))
+    print(f"[rollups] Backfill finished: {total} uploads added.")
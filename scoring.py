@@ -0,0 +1,215 @@
+# scoring.py
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+
+class MicroBatcher:
+    """
+    Gather concurrent scoring requests into micro-batches so that each batch
+    costs a single model call. A batch is flushed once it holds
+    max_batch_size rows or the oldest request has waited max_wait_ms.
+    If a batch fails, its requests are retried one by one.
+    """
+
+    def __init__(self, score_fn, max_batch_size: int | None = None,
+                 max_wait_ms: float | None = None):
+        self.score_fn = score_fn
+        self.max_batch_size = max_batch_size or int(os.getenv("PREDICT_BATCH_SIZE", 256))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("PREDICT_MAX_WAIT_MS", 2))
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, records: list[dict]) -> Future:
+        """Queue records for scoring; the future resolves to their probabilities."""
+        self._ensure_worker()
+        fut = Future()
+        self._queue.put((records, fut))
+        return fut
+
+    def score(self, records: list[dict], timeout: float | None = None) -> np.ndarray:
+        """Blocking helper around submit()."""
+        return self.submit(records).result(timeout=timeout)
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            n_rows = len(batch[0][0])
+            deadline = time.perf_counter() + self.max_wait
+            while n_rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                n_rows += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        records = [r for recs, _ in batch for r in recs]
+        try:
+            probs = self.score_fn(pd.DataFrame.from_records(records))
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][1].set_exception(e)
+                return
+            # Score each request on its own, so an error only reaches the
+            # caller whose records caused it
+            for item in batch:
+                self._flush([item])
+            return
+
+        start = 0
+        for recs, fut in batch:
+            fut.set_result(probs[start:start + len(recs)])
+            start += len(recs)
+
+
+# ——— Process-pool scoring for large frames ———
+
+# The model held by each pool worker (set by _init_worker)
+_worker_model = None
+
+
+def _init_worker(raw: bytes, backend: str, lib_dir: str | None = None):
+    """
+    Pool initializer: rebuild the parent's Booster from its UBJ bytes. With
+    the parent's lib_dir, the Treelite backend loads the library the parent
+    already compiled instead of building its own.
+    """
+    global _worker_model
+    import xgboost as xgb
+    from inference import make_backend
+
+    booster = xgb.Booster()
+    booster.load_model(bytearray(raw))
+    _worker_model = make_backend(booster, backend, lib_dir=lib_dir)
+    # One thread per worker; the pool provides the parallelism
+    booster.set_param({"nthread": 1})
+
+
+def _score_shard(x_name: str, out_name: str, shape: tuple, start: int, stop: int) -> int:
+    """Score rows [start, stop) of the shared feature matrix into the shared output."""
+    x_shm = SharedMemory(name=x_name)
+    out_shm = SharedMemory(name=out_name)
+    try:
+        X = np.ndarray(shape, dtype=np.float32, buffer=x_shm.buf)
+        out = np.ndarray((shape[0],), dtype=np.float64, buffer=out_shm.buf)
+        out[start:stop] = _worker_model.predict_proba(X[start:stop])[:, 1]
+        del X, out  # views must go before the segments are closed
+    finally:
+        x_shm.close()
+        out_shm.close()
+    return stop - start
+
+
+class ParallelScorer:
+    """
+    Score large frames on a process pool. The parent encodes the frame
+    into a float32 matrix in shared memory; each worker, holding its own
+    copy of the serving model, scores a contiguous shard and writes the
+    probabilities into a shared output buffer, so neither the rows nor the
+    results are pickled. Frames under min_rows, single-worker setups and
+    models without an XGBoost Booster are scored in-process instead.
+
+    The pool is rebuilt when the serving model changes.
+    """
+
+    def __init__(self, workers: int | None = None, min_rows: int | None = None):
+        self.workers = workers or int(os.getenv("PARALLEL_SCORE_WORKERS", os.cpu_count() or 1))
+        self.min_rows = min_rows or int(os.getenv("PARALLEL_SCORE_MIN_ROWS", 50_000))
+        self._pool = None
+        self._pool_model = None
+        self._lock = threading.Lock()
+
+    def _pool_for(self, serving):
+        with self._lock:
+            if self._pool is None or self._pool_model is not serving:
+                from inference import booster_bytes
+
+                raw = booster_bytes(serving.model)
+                if raw is None:
+                    return None
+                if self._pool is not None:
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=mp.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(raw, getattr(serving.model, "name", None) or "booster",
+                              getattr(serving.model, "lib_dir", None))
+                )
+                self._pool_model = serving
+            return self._pool
+
+    def score(self, df) -> np.ndarray:
+        """Fraud probability per row of a pandas or polars frame."""
+        # Imported here so pool workers, which import this module, skip it
+        import ml_model
+
+        serving = ml_model.fraud_model
+        if len(df) < self.min_rows or self.workers < 2 or serving is None:
+            return ml_model.score_transactions(df)
+        pool = self._pool_for(serving)
+        if pool is None:
+            return ml_model.score_transactions(df)
+
+        X = ml_model.feature_matrix(df, getattr(serving, 'encoders', None))
+        x_shm = SharedMemory(create=True, size=max(X.nbytes, 1))
+        out_shm = SharedMemory(create=True, size=max(len(X) * 8, 1))
+        try:
+            np.ndarray(X.shape, dtype=np.float32, buffer=x_shm.buf)[:] = X
+            bounds = np.linspace(0, len(X), self.workers + 1, dtype=int)
+            futures = [
+                pool.submit(_score_shard, x_shm.name, out_shm.name, X.shape, int(a), int(b))
+                for a, b in zip(bounds[:-1], bounds[1:]) if b > a
+            ]
+            wait(futures)
+            for fut in futures:
+                fut.result()
+            probs = np.ndarray((len(X),), dtype=np.float64, buffer=out_shm.buf).copy()
+        finally:
+            x_shm.close()
+            x_shm.unlink()
+            out_shm.close()
+            out_shm.unlink()
+        return probs
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+            self._pool = None
+            self._pool_model = None
+
+
+_parallel_scorer = None
+
+
+def get_parallel_scorer() -> ParallelScorer:
+    """The process-wide ParallelScorer, created on first use."""
+    global _parallel_scorer
+    if _parallel_scorer is None:
+        _parallel_scorer = ParallelScorer()
+    return _parallel_scorer
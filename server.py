@@ -1,23 +1,210 @@
 # server.py
 
-from flask import Flask, jsonify
+import json
+import os
+from datetime import datetime
+from flask import Flask, Response, jsonify, request, stream_with_context
+from sqlalchemy import text
+import numpy as np
 import pandas as pd
-from utils import engine
+import ml_model
+from aggregates import UploadSummary
+from response_cache import make_etag, transactions_cache
+from scoring import MicroBatcher
+from training_jobs import TrainingJobManager
+from storage import QUERY_COLUMNS, transactions_select
+from database import get_engine, metrics, pool_status
+
+# Rows fetched from the DB cursor per network chunk, and the largest page
+STREAM_CHUNK_ROWS = int(os.getenv("API_STREAM_CHUNK_ROWS", 1000))
+MAX_PAGE_ROWS = int(os.getenv("API_MAX_PAGE_ROWS", 1_000_000))
+# Pages up to this many rows are rendered whole, cached and given an ETag;
+# bigger ones are streamed without either
+CACHE_MAX_ROWS = int(os.getenv("API_CACHE_MAX_ROWS", 1000))
+
+def _reload_model(model_path):
+    ml_model.load_fraud_model(model_path)
+
+def _transactions_args(args) -> dict:
+    """Validate the /api/v1/transactions query string; raises ValueError."""
+    columns = None
+    if args.get('fields'):
+        columns = [c.strip() for c in args['fields'].split(',') if c.strip()]
+        unknown = [c for c in columns if c not in QUERY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}.")
+
+    filters = {
+        'category': args.get('category'),
+        'merchant': args.get('merchant'),
+    }
+    if args.get('fraud') is not None:
+        if args['fraud'] not in ('0', '1'):
+            raise ValueError("fraud must be 0 or 1.")
+        filters['fraud'] = int(args['fraud'])
+    for name in ('step_from', 'step_to'):
+        if args.get(name) is not None:
+            filters[name] = int(args[name])
+    for name in ('since', 'until'):
+        if args.get(name) is not None:
+            filters[name] = datetime.fromisoformat(args[name])
+
+    limit = int(args.get('limit', 100))
+    if not 0 < limit <= MAX_PAGE_ROWS:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_ROWS}.")
+    after = int(args['after']) if args.get('after') is not None else None
+    return {'columns': columns, 'filters': filters, 'after': after, 'limit': limit}
+
+
+def _stream_rows(conn, result, ndjson: bool):
+    """Encode rows as they come off the cursor, one chunk at a time."""
+    try:
+        if not ndjson:
+            yield '['
+        first = True
+        for rows in result.mappings().partitions(STREAM_CHUNK_ROWS):
+            lines = [json.dumps(dict(row), default=str) for row in rows]
+            if ndjson:
+                yield '\n'.join(lines) + '\n'
+            else:
+                yield ('' if first else ',') + ','.join(lines)
+                first = False
+        if not ndjson:
+            yield ']'
+    finally:
+        result.close()
+        conn.close()
+
+
+def _cached_response(entry):
+    body, mimetype, etag = entry
+    if request.if_none_match.contains(etag):
+        resp = Response(status=304)
+    else:
+        resp = Response(body, mimetype=mimetype)
+    resp.set_etag(etag)
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp
+
 
 def register_api_routes(server: Flask):
+    batcher = MicroBatcher(ml_model.score_transactions)
+    training_jobs = TrainingJobManager(on_success=_reload_model)
+
     @server.route('/api/v1/transactions', methods=['GET'])
     def get_transactions():
+        """
+        Stored transactions, streamed from the DB cursor as a JSON array or,
+        with format=ndjson (or Accept: application/x-ndjson), one object per
+        line. Filters: fraud, category, merchant, step_from/step_to and
+        since/until (upload time, ISO 8601); fields selects columns. Rows
+        come in id order, so pass after=<last id> to fetch the next page.
+        Pages of up to API_CACHE_MAX_ROWS rows are served from a response
+        cache with strong ETags, so a repeat poll with If-None-Match gets a
+        304 without touching the database.
+        """
+        try:
+            query = _transactions_args(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        ndjson = request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == 'application/x-ndjson'
+        mimetype = 'application/x-ndjson' if ndjson else 'application/json'
+
+        cacheable = query['limit'] <= CACHE_MAX_ROWS
+        key = (tuple(sorted(request.args.items(multi=True))), ndjson)
+        if cacheable:
+            entry = transactions_cache.get(key)
+            if entry is not None:
+                return _cached_response(entry)
+        generation = transactions_cache.generation
+
         try:
-            master_q = (
-                "SELECT TOP 1 table_name FROM dbo.MasterTable "
-                "WHERE table_name LIKE 'transactions_%' "
-                "ORDER BY uploaded_at DESC"
-            )
-            mdf = pd.read_sql(master_q, engine)
-            if mdf.empty:
-                return jsonify([])
-            tbl = mdf.loc[0, 'table_name']
-            df = pd.read_sql(f"SELECT TOP 100 * FROM dbo.{tbl}", engine)
-            return jsonify(df.to_dict(orient='records'))
+            stmt = transactions_select(get_engine(), **query)
+            if stmt is None:
+                rows = iter(['' if ndjson else '[]'])
+            else:
+                conn = get_engine().connect().execution_options(yield_per=STREAM_CHUNK_ROWS)
+                try:
+                    result = conn.execute(stmt)
+                except Exception:
+                    conn.close()
+                    raise
+                rows = _stream_rows(conn, result, ndjson)
+            if cacheable:
+                body = ''.join(rows).encode()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         except Exception as e:
             return jsonify({'error': str(e)}), 500
+
+        if not cacheable:
+            return Response(stream_with_context(rows), mimetype=mimetype)
+        entry = (body, mimetype, make_etag(body))
+        transactions_cache.put(key, entry, generation)
+        return _cached_response(entry)
+
+    @server.route('/api/v1/ready', methods=['GET'])
+    def readiness():
+        """200 once a model is loaded and scoring is available, else 503."""
+        status = ml_model.model_status()
+        return jsonify(status), (200 if status['ready'] else 503)
+
+    @server.route('/api/v1/health/db', methods=['GET'])
+    def db_health():
+        """Pool occupancy, checkout waits and per-call-site query latency."""
+        try:
+            with get_engine().connect() as conn:
+                conn.execute(text("SELECT 1"))
+            body = {'status': 'ok'}
+        except Exception as e:
+            body = {'status': 'unavailable', 'error': str(e)}
+        body.update(pool=pool_status(), **metrics.snapshot())
+        return jsonify(body), (200 if body['status'] == 'ok' else 503)
+
+    @server.route('/api/v1/predict', methods=['POST'])
+    def predict():
+        payload = request.get_json(silent=True)
+        if isinstance(payload, dict):
+            records = payload.get('transactions', [payload])
+        else:
+            records = payload
+        if not records or not isinstance(records, list) \
+                or not all(isinstance(r, dict) for r in records):
+            return jsonify({'error': 'Expected a transaction object or a list of them.'}), 400
+
+        missing = sorted({c for r in records for c in ml_model.FEATURE_COLUMNS if c not in r})
+        if missing:
+            return jsonify({'error': f"Missing required features: {', '.join(missing)}."}), 400
+
+        try:
+            probs = batcher.score(records)
+        except RuntimeError as e:
+            return jsonify({'error': str(e)}), 503
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+        body = {'predictions': [
+            {'fraud_probability': float(p), 'fraud': int(p >= 0.5)} for p in probs
+        ]}
+        # Optionally the dashboard aggregates of the batch, with the
+        # predicted labels standing in for 'fraud'
+        if isinstance(payload, dict) and payload.get('summary'):
+            frame = pd.DataFrame(records).assign(fraud=(np.asarray(probs) >= 0.5).astype(int))
+            body['summary'] = UploadSummary().update(frame).to_dict()
+        return jsonify(body)
+
+    @server.route('/api/v1/train', methods=['POST'])
+    def start_training():
+        model_path = os.getenv("MODEL_PATH", "fraud_model.pkl")
+        job, created = training_jobs.start(model_path)
+        job['status_url'] = f"/api/v1/train/{job['job_id']}"
+        return jsonify(job), (202 if created else 409)
+
+    @server.route('/api/v1/train/<job_id>', methods=['GET'])
+    def training_status(job_id):
+        job = training_jobs.get(job_id)
+        if job is None:
+            return jsonify({'error': f"Unknown training job '{job_id}'."}), 404
+        return jsonify(job)
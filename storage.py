@@ -0,0 +1,228 @@
+# storage.py
+"""
+Where upload rows live. STORAGE_MODE selects the layout:
+
+- 'per_upload' (default): one transactions_<timestamp> table per upload.
+- 'fact': every upload is appended to the single typed dbo.Transactions
+  table, tagged with its batch name (the name a per-upload table would
+  have had) and indexed on it.
+
+Either way MasterTable and FraudSummary refer to uploads by that name, so
+callers only need batch_query() to read one upload's rows.
+
+Run `python storage.py migrate [--drop]` to copy existing per-upload tables
+into the fact table.
+"""
+
+import argparse
+import os
+
+import polars as pl
+from sqlalchemy import (
+    MetaData, Table, Column, Index, BigInteger, Integer, String,
+    column, false, inspect, literal, select, table, text
+)
+
+from bulk_load import TRANSACTION_SCHEMA, get_loader, typed_frame
+
+FACT_TABLE = 'Transactions'
+
+_fact_meta = MetaData(schema='dbo')
+fact_table = Table(
+    FACT_TABLE, _fact_meta,
+    Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True),
+    Column('batch_name', String(64), nullable=False),
+    *[Column(name, sql_type) for name, (sql_type, _) in TRANSACTION_SCHEMA.items()],
+    Index('ix_Transactions_batch_name', 'batch_name'),
+)
+
+master_table = table('MasterTable', column('table_name'), column('uploaded_at'), schema='dbo')
+
+# Columns the transactions API may project; 'id' only exists in fact mode
+QUERY_COLUMNS = ['id', 'batch_name', *TRANSACTION_SCHEMA]
+
+
+def storage_mode() -> str:
+    mode = os.getenv("STORAGE_MODE", "per_upload")
+    if mode not in ('per_upload', 'fact'):
+        raise ValueError(f"Unknown STORAGE_MODE '{mode}'")
+    return mode
+
+
+def ensure_fact_table(engine):
+    """Create dbo.Transactions, adding any columns an older fact table lacks."""
+    _fact_meta.create_all(engine, checkfirst=True)
+    present = {c['name'] for c in inspect(engine).get_columns(FACT_TABLE, schema='dbo')}
+    missing = [c for c in fact_table.columns if c.name not in present]
+    if missing:
+        preparer = engine.dialect.identifier_preparer
+        with engine.begin() as conn:
+            for col in missing:
+                conn.execute(text(f"ALTER TABLE dbo.{FACT_TABLE} ADD {preparer.quote(col.name)} "
+                                  f"{col.type.compile(engine.dialect)} NULL"))
+
+
+def write_batch(engine, df: pl.DataFrame, batch_name: str, append: bool = False, progress=None):
+    """
+    Store an upload's typed rows. In fact mode the rows are appended to
+    dbo.Transactions with batch_name; otherwise they go to their own table.
+    """
+    if storage_mode() == 'fact':
+        ensure_fact_table(engine)
+        tagged = df.with_columns(pl.lit(batch_name).alias('batch_name'))
+        get_loader(engine).load(tagged, FACT_TABLE, progress=progress, table=fact_table)
+    else:
+        get_loader(engine).load(df, batch_name, append=append, progress=progress)
+
+
+def drop_batch(engine, batch_name: str):
+    """Remove an upload's rows: its own table, or its rows of the fact table."""
+    with engine.begin() as conn:
+        if storage_mode() == 'fact':
+            ensure_fact_table(engine)
+            conn.execute(text(f"DELETE FROM dbo.{FACT_TABLE} WHERE batch_name = :b"), {"b": batch_name})
+        else:
+            conn.execute(text(f"DROP TABLE IF EXISTS dbo.{batch_name}"))
+
+
+def batch_query(batch_name: str, columns: str = "*", where: str | None = None):
+    """
+    A SELECT over one upload's rows. `columns` and `where` are trusted SQL
+    fragments; the batch name is bound as a parameter in fact mode.
+    Returns a text() clause with its parameters bound.
+    """
+    if storage_mode() == 'fact':
+        conditions = "batch_name = :batch" + (f" AND {where}" if where else "")
+        return text(f"SELECT {columns} FROM dbo.{FACT_TABLE} WHERE {conditions}")\
+            .bindparams(batch=batch_name)
+    return text(f"SELECT {columns} FROM dbo.{batch_name}" + (f" WHERE {where}" if where else ""))
+
+
+def transactions_select(engine, columns: list[str] | None = None, filters: dict | None = None,
+                        after: int | None = None, limit: int = 100):
+    """
+    A SELECT over stored transactions, for streaming to API clients.
+
+    filters may hold fraud, category, merchant, step_from / step_to and
+    since / until (upload time). In fact mode the query spans all uploads,
+    ordered by id, and `after` is the keyset cursor: the id of the last row
+    of the previous page. Per-upload tables have no stable key, so in that
+    mode only the latest matching upload is read and `after` is rejected.
+    Uploads that predate a column don't have it: it is left out of the
+    rows, and a filter on it matches nothing.
+    Returns None when there is nothing to read.
+    """
+    filters = filters or {}
+    columns = columns or list(QUERY_COLUMNS)
+
+    uploads = select(master_table.c.table_name)\
+        .where(master_table.c.table_name.like('transactions_%'))
+    if filters.get('since') is not None:
+        uploads = uploads.where(master_table.c.uploaded_at >= filters['since'])
+    if filters.get('until') is not None:
+        uploads = uploads.where(master_table.c.uploaded_at < filters['until'])
+
+    if storage_mode() == 'fact':
+        if 'id' not in columns:
+            columns = ['id', *columns]
+        inspector = inspect(engine)
+        # Nothing has been stored yet
+        if not inspector.has_table(FACT_TABLE, schema='dbo'):
+            return None
+        present = {c['name'] for c in inspector.get_columns(FACT_TABLE, schema='dbo')}
+        columns = [c for c in columns if c in present]
+        source = fact_table
+        stmt = select(*[source.c[c] for c in columns])
+        if filters.get('since') is not None or filters.get('until') is not None:
+            stmt = stmt.where(source.c.batch_name.in_(uploads))
+        if after is not None:
+            stmt = stmt.where(source.c.id > after)
+        stmt = stmt.order_by(source.c.id)
+    else:
+        if after is not None:
+            raise ValueError("Cursor paging needs STORAGE_MODE=fact.")
+        with engine.connect() as conn:
+            latest = conn.execute(
+                uploads.order_by(master_table.c.uploaded_at.desc()).limit(1)
+            ).scalar()
+        inspector = inspect(engine)
+        if latest is None or not inspector.has_table(latest, schema='dbo'):
+            return None
+        present = {c['name'] for c in inspector.get_columns(latest, schema='dbo')}
+        columns = [c for c in columns if c in present or c == 'batch_name']
+        if not columns:
+            return None
+        source = table(latest, *[column(c) for c in TRANSACTION_SCHEMA if c in present],
+                       schema='dbo')
+        stmt = select(*[source.c[c] if c != 'batch_name' else literal(latest).label('batch_name')
+                        for c in columns])
+
+    def where(name, condition):
+        nonlocal stmt
+        stmt = stmt.where(condition(source.c[name]) if name in source.c else false())
+
+    if filters.get('fraud') is not None:
+        where('fraud', lambda c: c == filters['fraud'])
+    for name in ('category', 'merchant'):
+        if filters.get(name) is not None:
+            where(name, lambda c: c == filters[name])
+    if filters.get('step_from') is not None:
+        where('step', lambda c: c >= filters['step_from'])
+    if filters.get('step_to') is not None:
+        where('step', lambda c: c <= filters['step_to'])
+    return stmt.limit(limit)
+
+
+def list_upload_tables(engine) -> list[str]:
+    """Per-upload tables registered in MasterTable, oldest first."""
+    rows = pl.read_database(
+        "SELECT table_name FROM dbo.MasterTable "
+        "WHERE table_name LIKE 'transactions_%' ORDER BY uploaded_at",
+        connection=engine
+    )
+    return rows['table_name'].to_list()
+
+
+def migrate_per_upload_tables(engine, drop: bool = False, progress=None) -> int:
+    """
+    Copy every registered per-upload table into dbo.Transactions. Batches
+    already present are skipped, so the migration can be re-run after an
+    interruption. With drop, each source table is dropped once copied.
+    Returns the number of rows copied.
+    """
+    ensure_fact_table(engine)
+    copied = 0
+    for name in list_upload_tables(engine):
+        with engine.connect() as conn:
+            done = conn.execute(
+                text(f"SELECT COUNT(*) FROM dbo.{FACT_TABLE} WHERE batch_name = :b"), {"b": name}
+            ).scalar()
+        if not done:
+            try:
+                rows = pl.read_database(f"SELECT * FROM dbo.{name}", connection=engine)
+            except Exception as e:
+                print(f"[storage] Skipping {name}: {e}")
+                continue
+            tagged = typed_frame(rows).with_columns(pl.lit(name).alias('batch_name'))
+            get_loader(engine).load(tagged, FACT_TABLE, table=fact_table)
+            copied += tagged.height
+        if drop:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP TABLE dbo.{name}"))
+        if progress is not None:
+            progress(name, copied)
+    return copied
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Move per-upload tables into dbo.Transactions.")
+    parser.add_argument("command", choices=["migrate"])
+    parser.add_argument("--drop", action="store_true", help="drop each source table after copying")
+    args = parser.parse_args()
+
+    from database import get_engine
+    total = migrate_per_upload_tables(
+        get_engine(), drop=args.drop,
+        progress=lambda name, rows: print(f"[storage] {name} done ({rows} rows copied so far)")
+    )
+    print(f"[storage] Migration finished: {total} rows copied.")
@@ -0,0 +1,610 @@
+# stream_consumer.py
+"""
+Headless, long-running scoring of a transaction stream. Transactions
+arrive as NDJSON (one JSON object per line) either from a file that
+another process appends to, tailed like `tail -F`, or from producers
+connected to a local TCP socket. They are scored in micro-batches through
+ml_model, written back in bulk, and alerts go out the way an upload's do.
+
+    python stream_consumer.py --file transactions.ndjson [--from-start] [--output scored.ndjson]
+    python stream_consumer.py --listen 127.0.0.1:9099
+
+A micro-batch is flushed once it holds STREAM_BATCH_ROWS lines or its
+oldest line has waited STREAM_MAX_WAIT_MS. Lines that are not JSON, lack
+a model feature, carry an amount or fraud label that does not parse, or
+fail to score on their own are counted invalid; the rest of their batch
+is kept. Each batch is written on a writer thread:
+- the rows and their fraud_probability go into one upload table per run,
+  registered in MasterTable (file name 'stream:<source>') with its first
+  batch, together with their FraudSummary rows and rollups;
+- the scored rows are appended to --output;
+- a file source's checkpoint is advanced (at-least-once: a restart
+  resumes after the last written batch).
+A failed write is retried, waiting up to STREAM_RETRY_MAX_SECONDS between
+attempts, and nothing after it is checkpointed until it succeeds. If the
+consumer is stopped first, the batch is read again on the next run.
+
+Backpressure: readers put lines on a queue of STREAM_QUEUE_LINES and the
+writer takes at most two batches, so when scoring or the database falls
+behind, the file tail stops reading and socket producers stop being read
+(TCP flow control then slows them down). Nothing is dropped and memory
+stays bounded. Throughput, lag and queue depth are printed every
+STREAM_REPORT_SECONDS.
+"""
+
+import argparse
+import json
+import os
+import queue
+import signal
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import numpy as np
+import polars as pl
+
+import feature_store
+import ml_model
+import utils
+from bulk_load import TRANSACTION_SCHEMA
+from notifications import send_email_notification, send_slack_notification
+from rollups import record_rollups, rollup_rows
+
+
+_LEVELS = ["Medium", "Severe"]
+
+
+class _Stopped(Exception):
+    """The consumer was stopped before a batch could be scored."""
+
+
+class FileSource:
+    """
+    Tail an NDJSON file, following rotation and truncation. The position of
+    the last written batch is checkpointed to '<path>.offset'; a new run
+    resumes there, or starts at the end of the file (the beginning with
+    from_start).
+    """
+
+    def __init__(self, path: str, from_start: bool = False, poll_interval: float = 0.2):
+        self.path = path
+        self.from_start = from_start
+        self.poll_interval = poll_interval
+        self.checkpoint_path = path + ".offset"
+        self.name = path
+        self._committed = None
+
+    def _checkpoint(self) -> dict | None:
+        try:
+            with open(self.checkpoint_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _start_offset(self, st: os.stat_result) -> int:
+        saved = self._checkpoint()
+        if saved and saved.get('inode') == st.st_ino and saved.get('offset', 0) <= st.st_size:
+            return saved['offset']
+        return 0 if self.from_start else st.st_size
+
+    def read(self, emit, stop: threading.Event):
+        """Reader thread body: emit(line, position) for each complete line until stop is set."""
+        f, inode, pending, resumed = None, None, b"", False
+        try:
+            while not stop.is_set():
+                if f is None:
+                    try:
+                        f = open(self.path, "rb")
+                    except FileNotFoundError:
+                        stop.wait(self.poll_interval)
+                        continue
+                    st = os.fstat(f.fileno())
+                    inode = st.st_ino
+                    # Only the first file honours the checkpoint; rotated-in files start at 0
+                    f.seek(0 if resumed else self._start_offset(st))
+                    resumed = True
+
+                line = f.readline()
+                if line.endswith(b"\n"):
+                    line, pending = pending + line, b""
+                    if line.strip():
+                        emit(line, (inode, f.tell()))
+                    continue
+                pending += line
+
+                # At the end of the file: wait for more, unless it was rotated or truncated
+                try:
+                    st = os.stat(self.path)
+                except FileNotFoundError:
+                    st = None
+                if st is not None and st.st_ino != inode:
+                    f.close()
+                    f, pending = None, b""
+                elif st is not None and st.st_size < f.tell():
+                    f.seek(0)
+                    pending = b""
+                else:
+                    stop.wait(self.poll_interval)
+        finally:
+            if f is not None:
+                f.close()
+
+    def commit(self, position):
+        """Record that everything up to position has been written."""
+        if position is None:
+            return
+        inode, offset = position
+        with open(self.checkpoint_path + ".tmp", "w") as f:
+            json.dump({'inode': inode, 'offset': offset}, f)
+        os.replace(self.checkpoint_path + ".tmp", self.checkpoint_path)
+        self._committed = position
+
+    def backlog(self) -> int | None:
+        """Bytes of the file not yet written back."""
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        if self._committed is None or self._committed[0] != st.st_ino:
+            return None
+        return max(st.st_size - self._committed[1], 0)
+
+
+class SocketSource:
+    """NDJSON lines from any number of producers connected to a local TCP port."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 9099):
+        self.server = socket.create_server((host, port))
+        self.address = self.server.getsockname()
+        self.name = f"{self.address[0]}:{self.address[1]}"
+        self._conns = set()
+        self._lock = threading.Lock()
+
+    def _read_conn(self, conn: socket.socket, emit):
+        try:
+            with conn.makefile("rb") as f:
+                for line in f:
+                    if line.strip():
+                        emit(line, None)
+        except OSError:
+            pass
+        finally:
+            with self._lock:
+                self._conns.discard(conn)
+            conn.close()
+
+    def read(self, emit, stop: threading.Event):
+        self.server.settimeout(0.2)
+        try:
+            while not stop.is_set():
+                try:
+                    conn, _ = self.server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                with self._lock:
+                    self._conns.add(conn)
+                threading.Thread(target=self._read_conn, args=(conn, emit), daemon=True).start()
+        finally:
+            self.server.close()
+            with self._lock:
+                for conn in list(self._conns):
+                    try:
+                        conn.shutdown(socket.SHUT_RDWR)
+                    except OSError:
+                        pass
+
+    def commit(self, position):
+        pass
+
+    def backlog(self) -> int | None:
+        return None
+
+
+def parse_lines(lines: list[bytes], transaction_id: str) -> tuple[pl.DataFrame, int]:
+    """
+    Turn NDJSON lines into a frame of text columns (as uploads are read)
+    with amount as Float64 and fraud, if given, as Int64. Lines that are not
+    JSON objects with every model feature are dropped, and so are records
+    whose amount is not a number or whose fraud is not 0 or 1 ("1.0" is).
+    Missing features are filled with 0 as in uploads; a missing label stays
+    null. Returns the frame and the number of lines dropped.
+    """
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(record, dict) and all(c in record for c in ml_model.FEATURE_COLUMNS):
+            records.append(record)
+    invalid = len(lines) - len(records)
+    if not records:
+        return pl.DataFrame(), invalid
+
+    columns = list(dict.fromkeys(c for record in records for c in record))
+    df = pl.DataFrame(
+        {c: [None if (v := r.get(c)) is None else str(v) for r in records] for c in columns},
+        schema={c: pl.Utf8 for c in columns}
+    )
+    # Cast record by record: a bad value only drops its own line
+    amount = pl.col('amount').cast(pl.Float64, strict=False)
+    valid = amount.is_not_null()
+    casts = [amount]
+    if 'fraud' in df.columns:
+        fraud = pl.col('fraud').cast(pl.Float64, strict=False)
+        valid = valid & (pl.col('fraud').is_null() | fraud.is_in([0.0, 1.0]))
+        casts.append(fraud.cast(pl.Int64))
+    df = df.filter(valid).with_columns(casts).with_columns(
+        pl.exclude('fraud').fill_null(0),
+        pl.lit(transaction_id).alias('transaction_id')
+    )
+    return df, len(lines) - df.height
+
+
+class StreamStats:
+    """Counters for the current report window and for the whole run."""
+
+    COUNTERS = ('lines', 'rows', 'invalid', 'flagged', 'batches',
+                'parse_s', 'score_s', 'write_s', 'blocked_s', 'write_errors')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals = dict.fromkeys(self.COUNTERS, 0)
+        self._reset()
+
+    def _reset(self):
+        self.window = dict.fromkeys(self.COUNTERS, 0)
+        self.lags = []
+        self.started = time.monotonic()
+
+    def add(self, lag: float | None = None, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                self.window[name] += value
+                self.totals[name] += value
+            if lag is not None:
+                self.lags.append(lag)
+
+    def take(self) -> dict:
+        """The window's rates and lag; starts a new window."""
+        with self._lock:
+            window, lags = dict(self.window), self.lags
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            self._reset()
+        window['seconds'] = elapsed
+        window['rows_per_s'] = window['rows'] / elapsed
+        window['lag_p50_s'] = float(np.median(lags)) if lags else None
+        window['lag_max_s'] = max(lags) if lags else None
+        return window
+
+
+class StreamConsumer:
+    """
+    Read lines from source, score them in micro-batches and write the
+    results back. run() blocks until stop is set, then drains what was
+    already read and returns the run's totals.
+    """
+
+    def __init__(self, source, output_path: str | None = None, store: bool = True,
+                 notify: bool = True, batch_rows: int | None = None,
+                 max_wait_ms: float | None = None, queue_lines: int | None = None,
+                 report_seconds: float | None = None, score_fn=None):
+        self.source = source
+        self.output_path = output_path
+        self.store = store
+        self.notify = notify
+        self.batch_rows = batch_rows or int(os.getenv("STREAM_BATCH_ROWS", 5000))
+        if max_wait_ms is None:
+            max_wait_ms = float(os.getenv("STREAM_MAX_WAIT_MS", 500))
+        self.max_wait = max_wait_ms / 1000.0
+        self.lines = queue.Queue(maxsize=queue_lines or int(os.getenv("STREAM_QUEUE_LINES", 50_000)))
+        self.writes = queue.Queue(maxsize=2)
+        if report_seconds is None:
+            report_seconds = float(os.getenv("STREAM_REPORT_SECONDS", 10))
+        self.report_seconds = report_seconds
+        self.alert_cooldown = float(os.getenv("STREAM_ALERT_COOLDOWN", 60))
+        self.score_fn = score_fn or ml_model.score_transactions
+        self.stats = StreamStats()
+        self.table_name = utils.new_table_name(datetime.now())
+        self.run_id = str(uuid.uuid4())
+        self.retry_max = float(os.getenv("STREAM_RETRY_MAX_SECONDS", 30))
+        self._table_created = False
+        self._registered = False
+        self._stop = threading.Event()
+        self._last_alert = (-float('inf'), "Medium")
+        self._flagged_since_alert = 0
+
+    # ——— Reading ———
+
+    def _emit(self, line: bytes, position):
+        """Queue a line for scoring, blocking while the queue is full."""
+        item = (line, position, time.monotonic())
+        try:
+            self.lines.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        start = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.lines.put(item, timeout=0.2)
+                break
+            except queue.Full:
+                continue
+        self.stats.add(blocked_s=time.monotonic() - start)
+
+    def _next_batch(self) -> list:
+        try:
+            batch = [self.lines.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.lines.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    # ——— Scoring ———
+
+    def _score_split(self, df: pl.DataFrame, errors: list) -> np.ndarray:
+        """
+        Score df; if that fails, score each half on its own, down to single
+        rows. Rows that still fail get NaN and their error is added to errors.
+        RuntimeError (model unavailable) is passed on.
+        """
+        try:
+            return np.asarray(self.score_fn(df), dtype=np.float64)
+        except RuntimeError:
+            raise
+        except Exception as e:
+            if df.height == 1:
+                errors.append(e)
+                return np.array([np.nan])
+            mid = df.height // 2
+            return np.concatenate([self._score_split(df[:mid], errors),
+                                   self._score_split(df[mid:], errors)])
+
+    def _score(self, df: pl.DataFrame) -> np.ndarray:
+        """
+        Score df, retrying while the model is unavailable (RuntimeError).
+        Rows that cannot be scored get NaN. Raises _Stopped if the consumer
+        is stopped first, so the batch is not committed.
+        """
+        while True:
+            errors = []
+            try:
+                probs = self._score_split(df, errors)
+            except RuntimeError as e:
+                if self._stop.is_set():
+                    raise _Stopped from e
+                print(f"[stream_consumer] {e} Retrying.")
+                self._stop.wait(1.0)
+                continue
+            if errors:
+                print(f"[stream_consumer] Dropping {len(errors)} rows that could not be scored "
+                      f"(first error: {errors[0]}).")
+            return probs
+
+    def _process(self, batch: list):
+        start = time.perf_counter()
+        df, invalid = parse_lines([line for line, _, _ in batch], self.run_id)
+        parsed = time.perf_counter()
+        flagged = 0
+        if df.height:
+            probs = self._score(df)
+            scored_rows = ~np.isnan(probs)
+            if not scored_rows.all():
+                df, probs = df.filter(pl.Series(scored_rows)), probs[scored_rows]
+                invalid += int((~scored_rows).sum())
+        if df.height:
+            df = df.with_columns(pl.Series('fraud_probability', probs))
+            flagged = int((probs >= 0.5).sum())
+            self._alert(df, probs, flagged)
+        scored = time.perf_counter()
+        self.stats.add(lag=time.monotonic() - batch[0][2], lines=len(batch), rows=df.height,
+                       invalid=invalid, flagged=flagged, batches=1,
+                       parse_s=parsed - start, score_s=scored - parsed)
+        # Blocks while two batches are already waiting: backpressure from the writer
+        self.writes.put((df, batch[-1][1]))
+
+    def _alert(self, df: pl.DataFrame, probs: np.ndarray, flagged: int):
+        """
+        Notify like an upload would. Within STREAM_ALERT_COOLDOWN seconds of
+        an alert, only a higher level is sent again.
+        """
+        if not self.notify:
+            return
+        self._flagged_since_alert += flagged
+        severity = float(probs.max())
+        if severity > 0.7:
+            level = "Severe"
+        elif severity > 0.3:
+            level = "Medium"
+        else:
+            return
+        now = time.monotonic()
+        last_time, last_level = self._last_alert
+        if now - last_time < self.alert_cooldown and _LEVELS.index(level) <= _LEVELS.index(last_level):
+            return
+        self._last_alert = (now, level)
+        top = df.row(int(probs.argmax()), named=True)
+        message = (f"Severity: {severity:.2f} ({level}) in stream {self.table_name}; "
+                   f"{self._flagged_since_alert} transactions flagged since the last alert. "
+                   f"Top: customer {top.get('customer')}, merchant {top.get('merchant')}, "
+                   f"amount {top.get('amount')}.")
+        self._flagged_since_alert = 0
+        threading.Thread(target=send_slack_notification, args=(level, message), daemon=True).start()
+        if level == "Severe":
+            threading.Thread(target=send_email_notification,
+                             args=("Severe Fraud Alert", message), daemon=True).start()
+
+    # ——— Writing ———
+
+    def _write(self, df: pl.DataFrame, done: dict):
+        """
+        Write one scored batch back: upload table, its registration or
+        FraudSummary rows, rollups and the output file, then record it in
+        the feature store. Raises on failure;
+        the steps already recorded in `done` are skipped when it is retried.
+        """
+        if self.store:
+            if 'table' not in done:
+                # Every stored column, so the first batch creates the table whole
+                df_all = df.with_columns([pl.lit(None, dtype=pl.Utf8).alias(c)
+                                          for c in TRANSACTION_SCHEMA if c not in df.columns])
+                done['table'] = utils.write_transactions(df_all, self.table_name,
+                                                         append=self._table_created)
+                self._table_created = True
+            subset, now = done['table'], datetime.now()
+            if 'summary' not in done:
+                summary = utils.summarize_fraud(subset, self.table_name, now)
+                if not self._registered:
+                    utils.register_table(self.table_name, f"stream:{self.source.name}", now, summary)
+                    self._registered = True
+                elif summary[0]['row_count']:
+                    utils.add_fraud_summary(summary)
+                done['summary'] = True
+            if 'rollups' not in done:
+                if not record_rollups(rollup_rows(subset, self.table_name, now)):
+                    raise RuntimeError("rollups were not recorded")
+                done['rollups'] = True
+        if self.output_path and 'output' not in done:
+            with open(self.output_path, "ab") as f:
+                df.write_ndjson(f)
+            done['output'] = True
+        # Written rows become history for the batches after them
+        feature_store.record(df)
+
+    def _write_with_retry(self, df: pl.DataFrame) -> bool:
+        """
+        Write df, retrying with a doubling wait of up to retry_max seconds.
+        Returns False if the consumer is stopped before the write succeeds.
+        """
+        done, delay = {}, min(1.0, self.retry_max)
+        while True:
+            try:
+                self._write(df, done)
+                return True
+            except Exception as e:
+                self.stats.add(write_errors=1)
+                if self._stop.is_set():
+                    print(f"[stream_consumer] Error writing batch to {self.table_name}: {e} "
+                          f"Stopping; it will be read again on the next run.")
+                    return False
+                print(f"[stream_consumer] Error writing batch to {self.table_name}: {e} "
+                      f"Retrying in {delay:.0f}s.")
+                self._stop.wait(delay)
+                delay = min(delay * 2, self.retry_max)
+
+    def _write_loop(self):
+        failed = False
+        while (item := self.writes.get()) is not None:
+            df, position = item
+            # After an unwritten batch nothing may be checkpointed; keep
+            # draining so the scoring loop is not blocked
+            if failed:
+                continue
+            start = time.perf_counter()
+            if df.height and not self._write_with_retry(df):
+                failed = True
+                continue
+            self.source.commit(position)
+            self.stats.add(write_s=time.perf_counter() - start)
+
+    # ——— Running ———
+
+    def report(self):
+        w = self.stats.take()
+        lag = (f"lag p50 {w['lag_p50_s']:.2f}s max {w['lag_max_s']:.2f}s"
+               if w['lag_p50_s'] is not None else "lag -")
+        backlog = self.source.backlog()
+        print(f"[stream_consumer] {w['rows']:,} rows in {w['seconds']:.1f}s "
+              f"({w['rows_per_s']:,.0f} rows/s), {w['invalid']} invalid, {w['flagged']} flagged; "
+              f"{lag}; queue {self.lines.qsize()}/{self.lines.maxsize}, "
+              f"blocked {w['blocked_s']:.1f}s; parse {w['parse_s']:.2f}s score {w['score_s']:.2f}s "
+              f"write {w['write_s']:.2f}s"
+              + (f"; backlog {backlog:,} bytes" if backlog is not None else ""))
+        return w
+
+    def stop(self):
+        self._stop.set()
+
+    def run(self, stop: threading.Event | None = None) -> dict:
+        if stop is not None:
+            self._stop = stop
+        reader = threading.Thread(target=self.source.read, args=(self._emit, self._stop),
+                                  name="stream-reader", daemon=True)
+        writer = threading.Thread(target=self._write_loop, name="stream-writer", daemon=True)
+        reader.start()
+        writer.start()
+        print(f"[stream_consumer] Consuming into {self.table_name if self.store else 'no table'}.")
+        next_report = time.monotonic() + self.report_seconds
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    try:
+                        self._process(batch)
+                    except _Stopped:
+                        break
+                elif self._stop.is_set():
+                    break
+                if time.monotonic() >= next_report:
+                    self.report()
+                    next_report = time.monotonic() + self.report_seconds
+        finally:
+            self._stop.set()
+            reader.join(5)
+            self.writes.put(None)
+            writer.join()
+            feature_store.flush()
+            self.report()
+        return dict(self.stats.totals)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score an NDJSON transaction stream continuously.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--file", help="NDJSON file to tail")
+    source.add_argument("--listen", metavar="HOST:PORT", help="accept NDJSON producers on a TCP port")
+    parser.add_argument("--from-start", action="store_true",
+                        help="read the file from the beginning when there is no checkpoint")
+    parser.add_argument("--output", help="append scored rows to this NDJSON file")
+    parser.add_argument("--no-store", action="store_true", help="do not write rows to the database")
+    parser.add_argument("--no-notify", action="store_true", help="do not send Slack/email alerts")
+    parser.add_argument("--batch-rows", type=int, default=None)
+    parser.add_argument("--max-wait-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    if args.file:
+        src = FileSource(args.file, from_start=args.from_start)
+    else:
+        host, _, port = args.listen.rpartition(":")
+        src = SocketSource(host or "127.0.0.1", int(port))
+        print(f"[stream_consumer] Listening on {src.address[0]}:{src.address[1]}.")
+
+    if ml_model.ensure_model_loaded() is None:
+        print("[stream_consumer] No model could be loaded; waiting for one to be published.")
+    ml_model.start_model_watcher()
+
+    consumer = StreamConsumer(src, output_path=args.output, store=not args.no_store,
+                              notify=not args.no_notify, batch_rows=args.batch_rows,
+                              max_wait_ms=args.max_wait_ms)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: consumer.stop())
+    totals = consumer.run()
+    print(f"[stream_consumer] Stopped after {totals['rows']:,} rows "
+          f"({totals['invalid']} invalid, {totals['flagged']} flagged).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# table_pages.py
+"""
+Server-side paging for the transaction DataTable. An upload's frame is
+kept here under a random key (held by the browser in a dcc.Store), and
+the table asks for one page at a time, sorted and filtered on the server
+with DataTable's custom filter syntax, so only the visible rows are sent.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import polars as pl
+
+
+class FrameCache:
+    """
+    Thread-safe LRU of upload frames with a TTL, bounded by entry count and
+    by the frames' estimated size in bytes. A frame larger than the whole
+    budget is still kept, alone, so the upload that made it can be paged.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> pl.DataFrame | None:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            stored_at, df, size = item
+            if time.monotonic() - stored_at > self.ttl:
+                del self._entries[key]
+                self.nbytes -= size
+                return None
+            self._entries.move_to_end(key)
+            return df
+
+    def put(self, key, df: pl.DataFrame):
+        size = int(df.estimated_size())
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[2]
+            self._entries[key] = (time.monotonic(), df, size)
+            self.nbytes += size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries
+                                              or self.nbytes > self.max_bytes):
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.nbytes -= evicted
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Recent uploads' frames, one per browser session that uploaded
+upload_frames = FrameCache(
+    max_entries=int(os.getenv("UPLOAD_CACHE_ENTRIES", 8)),
+    max_bytes=int(float(os.getenv("UPLOAD_CACHE_MB", 512)) * 1024 * 1024),
+    ttl=float(os.getenv("UPLOAD_CACHE_TTL", 3600))
+)
+
+# One '{column} operator value' term of a DataTable filter_query. Operators
+# may carry an 's' (case-sensitive) or 'i' (case-insensitive) prefix.
+_FILTER_TERM = re.compile(
+    r"^\{(?P<column>[^}]+)\}\s*(?P<case>[si]?)"
+    r"(?P<op>>=|<=|!=|<|>|=|eq|ne|lt|le|gt|ge|contains|datestartswith)(?:\s+|(?=[^a-z]))"
+    r"(?P<value>.*)$"
+)
+_SYMBOLS = {'>=': 'ge', '<=': 'le', '!=': 'ne', '<': 'lt', '>': 'gt', '=': 'eq'}
+
+
+def cache_upload(df: pl.DataFrame) -> str:
+    """Keep df for paging and return its key."""
+    key = uuid.uuid4().hex
+    upload_frames.put(key, df)
+    return key
+
+
+def table_columns(df: pl.DataFrame) -> list[dict]:
+    return [
+        {'name': c, 'id': c, 'type': 'numeric' if df.schema[c].is_numeric() else 'text'}
+        for c in df.columns
+    ]
+
+
+def _split_filter_part(part: str):
+    """'{amount} >= 10' -> ('amount', 'ge', '10', False), or None if not understood."""
+    m = _FILTER_TERM.match(part.strip())
+    if m is None:
+        return None
+    value = m['value'].strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"`":
+        value = value[1:-1]
+    return m['column'], _SYMBOLS.get(m['op'], m['op']), value, m['case'] == 'i'
+
+
+def filter_expression(filter_query: str | None, schema) -> pl.Expr | None:
+    """
+    A polars predicate for a DataTable filter_query ('{col} op value'
+    terms joined by ' && '). Terms on unknown columns are ignored; a value
+    that does not parse for a numeric column matches nothing.
+    """
+    if not filter_query:
+        return None
+    expr = None
+    for part in filter_query.split(' && '):
+        parsed = _split_filter_part(part)
+        if parsed is None or parsed[0] not in schema:
+            continue
+        column, op, value, ignore_case = parsed
+        col = pl.col(column)
+        numeric = schema[column].is_numeric() and op not in ('contains', 'datestartswith')
+        if numeric:
+            try:
+                value = float(value)
+            except ValueError:
+                value = None
+        else:
+            col = col.cast(pl.Utf8)
+            if ignore_case:
+                col, value = col.str.to_lowercase(), value.lower()
+        if value is None:
+            term = pl.lit(False)
+        elif op == 'contains':
+            term = col.str.contains(value, literal=True)
+        elif op == 'datestartswith':
+            term = col.str.starts_with(value)
+        else:
+            term = {
+                'eq': col == value, 'ne': col != value, 'lt': col < value,
+                'le': col <= value, 'gt': col > value, 'ge': col >= value,
+            }[op]
+        expr = term if expr is None else expr & term
+    return expr
+
+
+def table_page(df: pl.DataFrame, page_current: int = 0, page_size: int = 10,
+               sort_by: list[dict] | None = None, filter_query: str | None = None):
+    """
+    One page of df as records, after filtering and sorting, with the page
+    count of the filtered rows: (records, page_count).
+    """
+    lf = df.lazy()
+    predicate = filter_expression(filter_query, df.schema)
+    if predicate is not None:
+        lf = lf.filter(predicate)
+    sort_by = [s for s in sort_by or [] if s.get('column_id') in df.schema]
+    if sort_by:
+        lf = lf.sort([s['column_id'] for s in sort_by],
+                     descending=[s.get('direction') == 'desc' for s in sort_by],
+                     nulls_last=True, maintain_order=True)
+    page_size = max(int(page_size or 10), 1)
+    page_current = max(int(page_current or 0), 0)
+    rows, page = pl.collect_all([
+        lf.select(pl.len()),
+        lf.slice(page_current * page_size, page_size),
+    ])
+    total = rows.item()
+    return page.to_dicts(), max(-(-total // page_size), 1)
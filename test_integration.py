@@ -10,27 +10,72 @@ def client():
     return server.test_client()
 
 
-def test_api_empty(client, monkeypatch):
-    # Simulate no transaction tables
-    monkeypatch.setattr(pd, 'read_sql', lambda *args, **kwargs: pd.DataFrame())
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    # SQLite stand-in for SQL Server, with 'dbo' attached as a second database
+    from sqlalchemy import create_engine, event, text
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setenv("STORAGE_MODE", "per_upload")
+    monkeypatch.setattr("database._engine", engine)
+    from response_cache import transactions_cache
+    transactions_cache.clear()
+    return engine
+
+
+def test_api_empty(client, db):
+    # No transaction tables yet
     resp = client.get('/api/v1/transactions')
     assert resp.status_code == 200
     assert resp.json == []
 
 
-def test_api_success(client, monkeypatch):
-    # Simulate one master table and one data row
-    master_df = pd.DataFrame({'table_name': ['transactions_1']})
-    data_df = pd.DataFrame([{'a': 1, 'b': 2}])
-    call_count = {'n': 0}
-    def fake_read_sql(query, conn, *args, **kwargs):
-        call_count['n'] += 1
-        return master_df if call_count['n'] == 1 else data_df
-    monkeypatch.setattr(pd, 'read_sql', fake_read_sql)
+def test_api_success(client, db):
+    # One registered upload table with one row
+    from sqlalchemy import text
+    pd.DataFrame([{'step': 1, 'amount': 2.5, 'fraud': 0}]).to_sql(
+        'transactions_1', db, schema='dbo', index=False)
+    with db.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_1', 'a.csv', '2025-01-01 00:00:00')"))
+
+    resp = client.get('/api/v1/transactions')
+    assert resp.status_code == 200
+    assert resp.json == [{'batch_name': 'transactions_1', 'step': 1, 'amount': 2.5, 'fraud': 0}]
+
+    resp = client.get('/api/v1/transactions?fields=step,amount')
+    assert resp.json == [{'step': 1, 'amount': 2.5}]
+
+
+def test_api_legacy_table(client, db):
+    # An upload stored before step/age/gender were kept
+    from sqlalchemy import text
+    row = {'customer': 'C1', 'zipcodeOri': '28007', 'merchant': 'M1', 'zipMerchant': '28007',
+           'category': 'food', 'amount': 2.5, 'fraud': 1}
+    pd.DataFrame([row]).to_sql('transactions_old', db, schema='dbo', index=False)
+    with db.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_old', 'old.csv', '2025-01-01 00:00:00')"))
 
     resp = client.get('/api/v1/transactions')
     assert resp.status_code == 200
-    assert resp.json == [{'a': 1, 'b': 2}]
+    assert resp.json == [dict(row, batch_name='transactions_old')]
+
+
+def test_ready_reports_model(client):
+    import ml_model
+    ml_model.ensure_model_loaded()
+    resp = client.get('/api/v1/ready')
+    assert resp.status_code == (200 if ml_model.fraud_model is not None else 503)
+    assert resp.json['ready'] == (ml_model.fraud_model is not None)
 
 
 def test_dash_index(client):
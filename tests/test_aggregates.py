@@ -0,0 +1,58 @@
+# tests/test_aggregates.py
+
+import pandas as pd
+import polars as pl
+
+from aggregates import UploadSummary
+from charts import create_category_chart, create_summary_charts
+
+
+def make_df():
+    return pd.DataFrame({
+        'step': [1, 2, 25, 26, 3],
+        'customer': ['C1', 'C2', 'C1', 'C1', 'C3'],
+        'category': ['food', 'bar', 'food', 'bar', 'food'],
+        'amount': [10.0, 5.0, 2.5, 1.0, 4.0],
+        'fraud': [1, 0, 1, 0, 1],
+    })
+
+
+def test_single_pass_matches_group_bys():
+    df = make_df()
+    summary = UploadSummary().update(pl.from_pandas(df))
+
+    expected = df.groupby('category')['amount'].sum()
+    assert summary.category_amount.sort_index().to_dict() == expected.sort_index().to_dict()
+    assert summary.hour_counts.to_dict() == {0: 2, 1: 2, 2: 1}
+    assert summary.top_fraud_customers().to_dict() == {'C1': 2, 'C3': 1}
+
+
+def test_chunked_pandas_and_polars_agree():
+    df = make_df()
+    chunked = UploadSummary().update(df.iloc[:2]).update(pl.from_pandas(df.iloc[2:]))
+    whole = UploadSummary().update(df)
+    assert chunked.to_dict() == whole.to_dict()
+    assert whole.to_dict()['rows'] == 5
+
+
+def test_charts_read_the_summary():
+    df = make_df()
+    fig = create_category_chart(df)
+    assert sorted(fig.data[0].x) == ['bar', 'food']
+    category, pie, hours, customers = create_summary_charts(UploadSummary().update(df))
+    assert list(customers.data[0].x) == ['C1', 'C3']
+    # Missing columns give the empty chart rather than failing
+    assert create_summary_charts(df[['amount']])[2].layout.title.text == 'No data'
+
+
+def test_nan_and_inf_steps_have_no_hour():
+    import base64
+    from utils import parse_uploaded_file
+
+    csv = "step,customer,category,amount,fraud\n1,C1,food,1.0,1\nNaN,C2,food,2.0,0\ninf,C3,bar,3.0,0\n"
+    df = parse_uploaded_file("data:text/csv;base64," + base64.b64encode(csv.encode()).decode())
+    assert df['step'].dtype == pl.Float64
+    summary = UploadSummary().update(df)
+    assert summary.hour_counts.to_dict() == {0: 1}
+    assert summary.rows == 3
+    create_summary_charts(summary)
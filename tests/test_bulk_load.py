@@ -0,0 +1,82 @@
+# tests/test_bulk_load.py
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, inspect, text
+
+from bulk_load import ExecutemanyLoader, get_loader, typed_frame
+
+
+def make_df(n):
+    return pd.DataFrame({
+        'step': list(range(n)), 'customer': [f"C{i}" for i in range(n)],
+        'zipcodeOri': ['28007'] * n, 'merchant': ['M1'] * n, 'zipMerchant': ['28007'] * n,
+        'category': ['food'] * n, 'amount': [i + 0.5 for i in range(n)],
+        'fraud': [i % 2 for i in range(n)], 'transaction_id': ['x'] * n,
+    })
+
+
+def test_executemany_loader_types_batches_and_progress():
+    engine = create_engine("sqlite://")
+    progress = []
+    loader = ExecutemanyLoader(engine, batch_size=40)
+
+    written = loader.load(typed_frame(make_df(100)), 'transactions_t',
+                          progress=lambda done, total: progress.append((done, total)))
+
+    assert written == 100
+    assert progress == [(40, 100), (80, 100), (100, 100)]
+    types = {c['name']: str(c['type']) for c in inspect(engine).get_columns('transactions_t')}
+    assert types['amount'] == 'FLOAT'
+    assert types['fraud'] == 'SMALLINT'
+    assert types['customer'] == 'VARCHAR(64)'
+    assert 'transaction_id' not in types
+
+    stored = pd.read_sql(text("SELECT SUM(amount) AS s, SUM(fraud) AS f FROM transactions_t"), engine)
+    assert stored.loc[0, 's'] == sum(i + 0.5 for i in range(100))
+    assert stored.loc[0, 'f'] == 50
+
+
+def test_append_and_replace():
+    engine = create_engine("sqlite://")
+    loader = get_loader(engine, 'executemany')
+    loader.load(typed_frame(make_df(10)), 'transactions_t')
+    loader.load(typed_frame(make_df(5)), 'transactions_t', append=True)
+    count = lambda: pd.read_sql(text("SELECT COUNT(*) AS n FROM transactions_t"), engine).loc[0, 'n']
+    assert count() == 15
+    loader.load(typed_frame(make_df(3)), 'transactions_t')
+    assert count() == 3
+
+
+def test_typed_frame_parses_float_text_and_reports_nulls(capsys):
+    df = pd.DataFrame({'step': ['1.0', '2', 'x'], 'amount': ['1.5', 'n/a', '3'],
+                       'fraud': ['1.0', '0', None]})
+    typed = typed_frame(df)
+    assert typed['step'].to_list() == [1, 2, None]
+    assert typed['fraud'].to_list() == [1, 0, None]
+    assert typed['amount'].to_list() == [1.5, None, 3.0]
+    assert "step: 1, amount: 1" in capsys.readouterr().out
+
+
+def test_failed_replace_keeps_the_old_table():
+    engine = create_engine("sqlite://")
+
+    # Let pysqlite run DDL inside the transaction, as SQL Server does
+    @event.listens_for(engine, "connect")
+    def no_autobegin(conn, _):
+        conn.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    loader = ExecutemanyLoader(engine, batch_size=2)
+    loader.load(typed_frame(make_df(3)), 'transactions_t')
+
+    def fail(done, total):
+        raise RuntimeError("connection lost")
+
+    with pytest.raises(RuntimeError):
+        loader.load(typed_frame(make_df(10)), 'transactions_t', progress=fail)
+    stored = pd.read_sql(text("SELECT COUNT(*) AS n FROM transactions_t"), engine)
+    assert stored.loc[0, 'n'] == 3
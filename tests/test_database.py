@@ -0,0 +1,38 @@
+# tests/test_database.py
+
+import sys
+
+from sqlalchemy import text
+
+import database
+
+
+def test_importing_utils_does_not_build_engine(monkeypatch):
+    monkeypatch.setattr(database, "_engine", None)
+    monkeypatch.delitem(sys.modules, "pyodbc", raising=False)
+    import utils
+    assert database._engine is None
+    assert database.pool_status() == {'created': False}
+    assert callable(utils.get_engine)
+
+
+def test_pool_settings_and_metrics(tmp_path, monkeypatch):
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path / 'metrics.db'}")
+    monkeypatch.setenv("DB_POOL_SIZE", "3")
+    monkeypatch.setenv("DB_MAX_OVERFLOW", "1")
+    monkeypatch.setattr(database, "_engine", None)
+    database.metrics.reset()
+
+    engine = database.get_engine()
+    assert database.get_engine() is engine
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+        assert database.metrics.snapshot()['active_connections'] == 1
+
+    status = database.pool_status()
+    assert status['pool'] == 'TimedQueuePool' and status['size'] == 3
+    snap = database.metrics.snapshot()
+    assert snap['active_connections'] == 0
+    assert snap['checkout_wait']['count'] == 1
+    site = 'tests.test_database:test_pool_settings_and_metrics'
+    assert snap['queries'][site]['count'] == 1
@@ -0,0 +1,156 @@
+# tests/test_feature_store.py
+
+import numpy as np
+import pandas as pd
+import polars as pl
+import pytest
+
+import feature_store
+from feature_store import HISTORY_FEATURES, FeatureStore
+
+
+def make_df(n=600, seed=1):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'step': np.sort(rng.integers(0, 40, n)),
+        'customer': rng.choice(['C1', 'C2', 'C3', 'C4', 'C5'], n),
+        'merchant': rng.choice(['M1', 'M2', 'M3', 'M4'], n),
+        'amount': rng.uniform(0, 100, n).round(2),
+    })
+
+
+def brute_force(df, window):
+    """Each row's features from the rows of the previous `window` steps."""
+    out = []
+    for row in df.itertuples():
+        past = df[(df['step'] >= row.step - window) & (df['step'] < row.step)]
+        cust = past[past['customer'] == row.customer]
+        merch = past[past['merchant'] == row.merchant]
+        out.append([
+            len(cust), cust['amount'].mean() if len(cust) else 0.0,
+            cust['amount'].std(ddof=0) if len(cust) else 0.0, cust['merchant'].nunique(),
+            len(merch), merch['amount'].mean() if len(merch) else 0.0,
+            merch['amount'].std(ddof=0) if len(merch) else 0.0,
+        ])
+    return np.array(out)
+
+
+def test_rolling_windows_match_brute_force_across_batches():
+    df = make_df()
+    expected = brute_force(df, 5)
+
+    # Batch boundaries fall in the middle of steps
+    store = FeatureStore(window=5)
+    cuts = [0, 7, 90, 91, 250, 400, len(df)]
+    got = pl.concat([store.observe(df.iloc[a:b]) for a, b in zip(cuts[:-1], cuts[1:])])
+    assert got.columns == HISTORY_FEATURES
+    np.testing.assert_allclose(got.to_numpy(), expected, atol=1e-9)
+
+    # One shuffled batch gives the same values per row
+    shuffled = df.sample(frac=1, random_state=0)
+    got = FeatureStore(window=5).observe(pl.from_pandas(shuffled, include_index=False))
+    np.testing.assert_allclose(got.to_numpy(), expected[shuffled.index], atol=1e-9)
+
+
+def test_backfill_matches_online_store():
+    df = make_df(n=2000, seed=3)
+    df['step'] -= 10   # negative steps are fine too
+    shuffled = df.sample(frac=1, random_state=1).reset_index(drop=True)
+    expected = FeatureStore(window=4).observe(shuffled)
+    # Identical, not just close: both paths sum integer cents
+    assert feature_store.backfill_history(shuffled, window=4).equals(expected)
+    assert feature_store.backfill_history(pl.from_pandas(shuffled), window=4).equals(expected)
+    assert feature_store.backfill_history(shuffled.iloc[:0], window=4).height == 0
+
+    # A store seeded from the recent steps answers later lookups like a full replay
+    full = FeatureStore(window=4)
+    full.observe(shuffled)
+    later = df.assign(step=df['step'] + 3).tail(50)
+    assert FeatureStore.from_history(shuffled, window=4).observe(later).equals(full.observe(later))
+
+
+def test_snapshot_round_trip_and_late_rows(tmp_path):
+    store = FeatureStore(window=5)
+    store.observe(make_df())
+    path = str(tmp_path / 'store.npz')
+    store.save(path)
+    loaded = FeatureStore.load(path)
+    assert loaded.window == 5
+
+    batch = pd.DataFrame({'step': [40, 41, 3], 'customer': ['C1', 'C2', 'C1'],
+                          'merchant': ['M1', 'NEW', 'M2'], 'amount': [1.0, 2.0, 3.0]})
+    assert loaded.observe(batch).equals(store.observe(batch))
+    # The row for step 3 came too late to be recorded: step 4 still sees nothing new
+    late = pd.DataFrame({'step': [4], 'customer': ['C1'], 'merchant': ['M1'], 'amount': [1.0]})
+    assert store.observe(late, record=False).equals(
+        FeatureStore.load(path).observe(late, record=False))
+    assert FeatureStore.load(str(tmp_path / 'missing.npz')) is None
+
+
+def test_scoring_reads_and_ingest_records(tmp_path, monkeypatch):
+    import ml_model
+
+    monkeypatch.setenv('FEATURE_STORE_PATH', str(tmp_path / 'store.npz'))
+    monkeypatch.setattr(feature_store, '_store', None)
+    monkeypatch.setattr(feature_store, '_writer', None)
+    df = pd.DataFrame({
+        'step': [1, 2], 'customer': ['X', 'X'], 'age': [20, 20], 'gender': ['M', 'M'],
+        'zipcodeOri': ['0', '0'], 'merchant': ['A', 'B'], 'zipMerchant': ['9', '9'],
+        'category': ['c', 'c'], 'amount': [10.0, 30.0],
+    })
+    bundle = ml_model._history_bundle(ml_model.fit_encoders(df))
+
+    X = ml_model.feature_matrix(pl.from_pandas(df), bundle)
+    assert X.shape == (2, len(ml_model.FEATURE_COLUMNS) + len(HISTORY_FEATURES))
+    count = len(ml_model.FEATURE_COLUMNS)
+    assert X[:, count].tolist() == [0, 1]   # cust_txn_count
+    assert X[1, count + 1] == 10.0          # cust_amount_mean
+    # Scoring leaves the store alone: the same batch scores the same twice
+    np.testing.assert_array_equal(ml_model.feature_matrix(df, bundle), X)
+    assert not len(feature_store.get_feature_store().customers)
+
+    # Recorded rows are history for the next batch
+    feature_store.record(df)
+    X = ml_model.encode_features(df.assign(step=3), bundle)
+    assert X['cust_txn_count'].tolist() == [2, 2]
+    assert X['cust_distinct_merchants'].tolist() == [2, 2]
+
+
+def test_single_writer(tmp_path, monkeypatch):
+    monkeypatch.setenv('FEATURE_STORE_PATH', str(tmp_path / 'store.npz'))
+    monkeypatch.setattr(feature_store, '_store', None)
+    monkeypatch.setattr(feature_store, '_writer', None)
+    assert feature_store.is_writer()
+
+    # Another process holding the lock makes this one a reader
+    other = tmp_path / 'other.npz'
+    holder = open(str(other) + '.lock', 'a')
+    try:
+        if not feature_store._try_lock(holder):
+            pytest.skip("the lock is not exclusive on this platform")
+        monkeypatch.setenv('FEATURE_STORE_PATH', str(other))
+        monkeypatch.setattr(feature_store, '_store', None)
+        assert not feature_store.is_writer()
+        feature_store.record(make_df())
+        assert not len(feature_store.get_feature_store().customers)
+    finally:
+        holder.close()
+
+
+def test_model_window_must_match_the_store(tmp_path, monkeypatch):
+    import ml_model
+    from model_registry import ServingModel
+
+    monkeypatch.setenv('FEATURE_STORE_PATH', str(tmp_path / 'store.npz'))
+    monkeypatch.setattr(feature_store, '_store', None)
+    bundle = ml_model._history_bundle(ml_model.fit_encoders(make_df()))
+    serving = ServingModel(object(), bundle, "v0001", {'history_window': 4})
+
+    # An empty store adopts the model's window
+    ml_model._check_history_window(serving)
+    assert feature_store.get_feature_store().window == 4
+
+    # One holding history over another window refuses the model
+    feature_store.get_feature_store().observe(make_df())
+    with pytest.raises(feature_store.WindowMismatch):
+        ml_model._check_history_window(ServingModel(object(), bundle, "v0002", {'history_window': 6}))
@@ -0,0 +1,46 @@
+# tests/test_inference.py
+
+import numpy as np
+import pytest
+import xgboost as xgb
+
+from inference import BoosterBackend, SklearnBackend, make_backend
+from model_registry import ModelRegistry
+
+
+@pytest.fixture(scope="module")
+def classifier():
+    rng = np.random.default_rng(0)
+    X = rng.random((200, 9)).astype(np.float32)
+    y = (X[:, 8] > 0.7).astype(int)
+    model = xgb.XGBClassifier(n_estimators=10, max_depth=3)
+    model.fit(X, y)
+    return model, X
+
+
+def test_booster_backend_matches_wrapper(classifier):
+    model, X = classifier
+    backend = make_backend(model, 'booster')
+    assert isinstance(backend, BoosterBackend)
+    np.testing.assert_allclose(backend.predict_proba(X), model.predict_proba(X), rtol=1e-6)
+    assert backend.predict(X).tolist() == model.predict(X).tolist()
+    assert isinstance(make_backend(model, 'sklearn'), SklearnBackend)
+
+
+@pytest.mark.parametrize("name", ["treelite", "onnx"])
+def test_compiled_backends_match_or_fall_back(classifier, tmp_path, name):
+    model, X = classifier
+    backend = make_backend(model, name, lib_dir=str(tmp_path))
+    assert backend.name in (name, 'booster')
+    np.testing.assert_allclose(backend.predict_proba(X)[:, 1], model.predict_proba(X)[:, 1], atol=1e-5)
+
+
+def test_registry_serves_native_format(classifier, tmp_path):
+    model, X = classifier
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    version = registry.publish(model, {})
+    assert (tmp_path / 'models' / version / 'model.ubj').exists()
+
+    serving = registry.load(version, backend='booster')
+    assert isinstance(serving.model, BoosterBackend)
+    np.testing.assert_allclose(serving.predict_proba(X), model.predict_proba(X), rtol=1e-6)
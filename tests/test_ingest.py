@@ -0,0 +1,109 @@
+# tests/test_ingest.py
+
+import base64
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import utils
+from ingest import stream_upload
+
+HEADER = "step,customer,age,gender,zipcodeOri,merchant,zipMerchant,category,amount,fraud"
+
+
+def make_csv(n_rows: int) -> str:
+    lines = [HEADER] + [
+        f"{i},C{i % 7},3,F,28007,M{i % 3},28007,{'food' if i % 2 else 'tech'},{i}.5,{int(i % 10 == 0)}"
+        for i in range(n_rows)
+    ]
+    b64 = base64.b64encode("\n".join(lines).encode()).decode()
+    return f"data:text/csv;base64,{b64}"
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setattr("database._engine", engine)
+    monkeypatch.setattr(utils, "_summary_ready", False)
+    monkeypatch.setattr("rollups._ready", False)
+    return engine
+
+
+def test_chunks_match_whole_file_parse():
+    contents = make_csv(250)
+    whole = utils.process_uploaded_file(contents)
+    chunks = list(utils.iter_uploaded_file(contents, chunk_rows=100))
+    assert [len(c) for c in chunks] == [100, 100, 50]
+
+    streamed = pd.concat(chunks, ignore_index=True)
+    assert streamed['amount'].tolist() == whole['amount'].tolist()
+    assert streamed['fraud'].tolist() == whole['fraud'].tolist()
+    assert streamed['transaction_id'].nunique() == 1
+
+
+def test_stream_upload_scores_and_stores_every_chunk(sqlite_engine):
+    def fake_score(df):
+        return np.where(df['fraud'] == 1, 0.9, 0.1)
+
+    result = stream_upload(make_csv(250), "big.csv", chunk_rows=100,
+                           score_fn=fake_score, preview_rows=20)
+
+    assert result['rows'] == 250
+    assert result['fraud_count'] == 25
+    assert result['max_prob'] == 0.9
+    assert len(result['preview']) == 20
+    assert result['summary'].category_amount.sum() == pytest.approx(sum(i + 0.5 for i in range(250)))
+
+    tbl = result['table_name']
+    stored = pd.read_sql(text(f"SELECT COUNT(*) AS n FROM {tbl}"), sqlite_engine)
+    assert stored.loc[0, 'n'] == 250
+    totals = pd.read_sql(text("SELECT fraud_sum, row_count FROM dbo.FraudSummary "
+                              "WHERE dimension = 'total'"), sqlite_engine)
+    assert totals.loc[0, 'fraud_sum'] == 25
+    assert totals.loc[0, 'row_count'] == 250
+
+    # Per-chunk rollups are merged into one set of rows for the upload
+    from rollups import query_rollup
+    categories = query_rollup('category')
+    assert categories['row_count'].sum() == 250
+    assert categories['fraud_sum'].sum() == 25
+
+
+def test_stream_upload_rejects_missing_columns(sqlite_engine):
+    b64 = base64.b64encode(b"amount,fraud\n1.0,0\n").decode()
+    with pytest.raises(ValueError, match="Missing columns"):
+        stream_upload(f"data:text/csv;base64,{b64}", score_fn=lambda df: np.zeros(len(df)))
+
+
+def test_bad_chunk_raises_value_error_and_drops_partial_table(sqlite_engine):
+    lines = [HEADER] + [f"{i},C1,3,F,28007,M1,28007,food,{i}.5,0" for i in range(250)]
+    lines[200] = "199,C1,3,F,28007,M1,28007,food,n/a,0"
+    contents = "data:text/csv;base64," + base64.b64encode("\n".join(lines).encode()).decode()
+
+    with pytest.raises(ValueError, match="Invalid file format"):
+        stream_upload(contents, chunk_rows=100, score_fn=lambda df: np.zeros(df.height))
+    with sqlite_engine.connect() as conn:
+        left = conn.execute(text("SELECT COUNT(*) FROM dbo.sqlite_master "
+                                 "WHERE name LIKE 'transactions_%'")).scalar()
+    assert left == 0
+
+    no_amount = base64.b64encode(b"step,customer\n1,C1\n").decode()
+    with pytest.raises(ValueError):
+        list(utils.iter_uploaded_file(f"data:text/csv;base64,{no_amount}"))
+
+
+def test_float_fraud_labels_parse_on_both_paths():
+    lines = [HEADER] + [f"{i},C1,3,F,28007,M1,28007,food,1.5,{float(i % 2)}" for i in range(4)]
+    contents = "data:text/csv;base64," + base64.b64encode("\n".join(lines).encode()).decode()
+    assert utils.process_uploaded_file(contents)['fraud'].tolist() == [0, 1, 0, 1]
+    streamed = pd.concat(utils.iter_uploaded_file(contents, chunk_rows=2))
+    assert streamed['fraud'].tolist() == [0, 1, 0, 1]
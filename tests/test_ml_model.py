@@ -1,6 +1,7 @@
 # tests/test_ml_model.py
 
 import importlib
+import time
 import pandas as pd
 
 # Helper to create a minimal DataFrame
@@ -20,6 +21,13 @@ def make_fake_df():
     })
 
 
+class EchoModel:
+    """Returns its input, so tests can read the encoded features back."""
+
+    def predict_proba(self, X):
+        return X
+
+
 def test_model_file_creation(tmp_path, monkeypatch):
     # Override MODEL_PATH via environment variable
     mp = tmp_path / 'fraud_model.pkl'
@@ -54,3 +62,163 @@ def test_detect_fraud_with_fraud(monkeypatch):
     df = make_fake_df()
     result = ml_model.detect_fraud(df)
     assert '1 fraudulent transactions detected' in result
+
+
+def test_encoders_stable_across_batches(tmp_path):
+    import ml_model
+
+    bundle = ml_model.fit_encoders(make_fake_df())
+    path = tmp_path / 'enc.npz'
+    ml_model.save_encoders(bundle, str(path))
+    loaded = ml_model.load_encoders(str(path))
+
+    # Same merchant gets the same code in a different batch; unseen values are UNKNOWN_CODE
+    batch = make_fake_df().iloc[::-1].reset_index(drop=True)
+    batch.loc[0, 'merchant'] = 'NEW'
+    X = ml_model.encode_features(batch, loaded)
+    assert list(X.columns) == ml_model.FEATURE_COLUMNS
+    assert X.loc[0, 'merchant'] == ml_model.UNKNOWN_CODE
+    assert X.loc[1, 'merchant'] == 0
+    assert X.loc[1, 'customer'] == 0
+    assert X['amount'].tolist() == [20.0, 10.0]
+
+
+def test_polars_feature_matrix_matches_pandas():
+    import numpy as np
+    import polars as pl
+    import ml_model
+
+    df = make_fake_df()
+    bundle = ml_model.fit_encoders(df.iloc[:1])
+    X_pd = ml_model.feature_matrix(df, bundle)
+    X_pl = ml_model.feature_matrix(pl.from_pandas(df), bundle)
+    assert X_pl.dtype == np.float32 and X_pl.flags['C_CONTIGUOUS']
+    np.testing.assert_array_equal(X_pd, X_pl)
+
+
+def test_background_warmup_and_readiness(monkeypatch):
+    import threading
+    import pytest
+    import ml_model
+    monkeypatch.setattr(ml_model, 'fraud_model', None)
+    monkeypatch.setattr(ml_model, '_load_state', 'idle')
+    monkeypatch.setattr(ml_model, '_load_error', None)
+    assert ml_model.model_status()['state'] == 'idle'
+
+    release = threading.Event()
+
+    def slow_load():
+        release.wait(5)
+        ml_model.swap_model(ml_model.ServingModel(object(), None, "v0001"))
+
+    monkeypatch.setattr(ml_model, 'load_fraud_model', slow_load)
+    thread = ml_model.start_warmup(watch=False)
+    assert ml_model.model_status() == {'ready': False, 'state': 'loading', 'version': None}
+    with pytest.raises(RuntimeError, match="still loading"):
+        ml_model.score_transactions(make_fake_df())
+
+    release.set()
+    thread.join(5)
+    assert ml_model.model_status() == {'ready': True, 'state': 'ready', 'version': 'v0001'}
+
+
+def test_non_blocking_load_starts_warmup_and_retries_failures(monkeypatch):
+    import threading
+    import ml_model
+    monkeypatch.setattr(ml_model, 'fraud_model', None)
+    monkeypatch.setattr(ml_model, '_load_state', 'idle')
+    monkeypatch.setattr(ml_model, '_load_error', None)
+    monkeypatch.setenv('MODEL_RETRY_SECONDS', '0')
+
+    release = threading.Event()
+    loads = []
+
+    def load():
+        loads.append(threading.current_thread().name)
+        release.wait(5)
+        if len(loads) > 1:
+            ml_model.swap_model(ml_model.ServingModel(object(), None, "v0002"))
+
+    monkeypatch.setattr(ml_model, 'load_fraud_model', load)
+    # The request thread doesn't load: it starts the warmup and returns
+    assert ml_model.ensure_model_loaded(wait=False) is None
+    assert ml_model.model_status()['state'] == 'loading'
+    release.set()
+    for _ in range(50):
+        if ml_model.model_status()['state'] == 'failed':
+            break
+        time.sleep(0.1)
+    assert loads == ['model-warmup']
+    assert ml_model.model_status()['state'] == 'failed'
+
+    # A failed load is not final: the next request retries it
+    ml_model.ensure_model_loaded(wait=False)
+    for _ in range(50):
+        if ml_model.model_status()['ready']:
+            break
+        time.sleep(0.1)
+    assert ml_model.model_status()['version'] == 'v0002'
+
+
+def test_streaming_training_from_snapshot(tmp_path, monkeypatch):
+    import numpy as np
+    import ml_model
+    from training_data import TrainingSnapshot
+
+    rng = np.random.default_rng(0)
+    n = 400
+    df = pd.concat([make_fake_df()] * (n // 2), ignore_index=True)
+    df['amount'] = rng.uniform(1, 100, n)
+    df['fraud'] = (df['amount'] > 90).astype(int)
+    snap = tmp_path / 'snap'
+    snap.mkdir()
+    df.iloc[:250].to_parquet(snap / 'a.parquet', index=False)
+    df.iloc[250:].to_parquet(snap / 'b.parquet', index=False)
+
+    monkeypatch.setenv('TRAIN_BATCH_ROWS', '64')
+    monkeypatch.setenv('TRAIN_ROUNDS', '5')
+    monkeypatch.setenv('FEATURE_STORE_PATH', str(tmp_path / 'store.npz'))
+    monkeypatch.setattr('feature_store._store', None)
+    phases = []
+    model, bundle, metadata = ml_model._train_streaming(
+        TrainingSnapshot(str(snap)), lambda phase, rows=0: phases.append(phase))
+
+    assert metadata['training_rows'] == n
+    assert metadata['fraud_rows'] == int(df['fraud'].sum())
+    positives = metadata['fraud_rows']
+    assert metadata['params']['scale_pos_weight'] == (n - positives) / positives
+    assert set(bundle['customer']) == {'X', 'Y'}
+    assert ml_model.model_features(bundle) == ml_model.FEATURE_COLUMNS + ml_model.HISTORY_FEATURES
+    assert phases == ['encoding', 'building matrix', 'fitting']
+    assert len(model.predict_proba(ml_model.encode_features(df, bundle))) == n
+    # The external-memory cache is cleaned up with the matrix
+    assert sorted(p.name for p in snap.iterdir()) == ['a.parquet', 'b.parquet']
+
+
+def test_model_without_bundle_encodes_independently_of_batch(tmp_path, monkeypatch):
+    import pickle
+    import ml_model
+
+    mp = tmp_path / 'fraud_model.pkl'
+    with open(mp, 'wb') as f:
+        pickle.dump(EchoModel(), f)
+    snap = tmp_path / 'snap'
+    snap.mkdir()
+    make_fake_df().assign(fraud=[0, 1]).to_parquet(snap / 'a.parquet', index=False)
+    monkeypatch.setenv('MODEL_PATH', str(mp))
+    monkeypatch.setenv('MODEL_REGISTRY_DIR', str(tmp_path / 'models'))
+    monkeypatch.setenv('TRAINING_SNAPSHOT_DIR', str(snap))
+    monkeypatch.setenv('INFERENCE_BACKEND', 'sklearn')
+    monkeypatch.setattr(ml_model, 'get_engine', lambda: None)
+    monkeypatch.setattr(ml_model, 'fraud_model', None)
+
+    # The bundle is fitted once at load and saved next to the model
+    ml_model.load_fraud_model()
+    assert ml_model.fraud_model.encoders['merchant'].tolist() == ['A', 'B']
+    assert (tmp_path / 'fraud_model_encoders.npz').exists()
+
+    # A single row encodes the same on its own as inside a batch
+    col = ml_model.FEATURE_COLUMNS.index('merchant')
+    alone = ml_model.feature_matrix(make_fake_df().iloc[1:])
+    together = ml_model.feature_matrix(make_fake_df())
+    assert alone[0, col] == together[1, col] == 1
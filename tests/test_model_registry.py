@@ -0,0 +1,91 @@
+# tests/test_model_registry.py
+
+import errno
+import os
+
+import numpy as np
+import pytest
+
+from model_registry import ModelRegistry, ModelWatcher
+
+
+class ConstModel:
+    def __init__(self, p):
+        self.p = p
+
+    def predict_proba(self, X):
+        return np.column_stack([np.full(len(X), 1 - self.p), np.full(len(X), self.p)])
+
+
+def test_publish_and_load_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    assert registry.latest_version() is None
+
+    bundle = {'merchant': np.array(['A', 'B'])}
+    v1 = registry.publish(ConstModel(0.1), bundle, {'training_rows': 10})
+    v2 = registry.publish(ConstModel(0.9), bundle, {'training_rows': 20})
+    assert (v1, v2) == ('v0001', 'v0002')
+    assert registry.latest_version() == v2
+
+    serving = registry.load(v2)
+    assert serving.version == v2
+    assert serving.metadata['training_rows'] == 20
+    assert len(serving.metadata['sha256']) == 64
+    assert serving.encoders['merchant'].tolist() == ['A', 'B']
+    assert serving.predict_proba(np.zeros((1, 2)))[0, 1] == 0.9
+
+
+def test_watcher_activates_only_new_versions(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    v1 = registry.publish(ConstModel(0.1), {})
+    seen = []
+    watcher = ModelWatcher(registry, seen.append, current=v1, interval=60)
+
+    assert not watcher.poll_once()
+    v2 = registry.publish(ConstModel(0.9), {})
+    assert watcher.poll_once()
+    assert not watcher.poll_once()
+    assert seen == [v2]
+
+
+def test_hot_swap_reaches_scoring(tmp_path, monkeypatch):
+    import ml_model
+    import pandas as pd
+
+    monkeypatch.setenv('MODEL_REGISTRY_DIR', str(tmp_path / 'models'))
+    monkeypatch.setattr(ml_model, 'fraud_model', None)
+    registry = ml_model.get_registry()
+    registry.publish(ConstModel(0.2), {})
+    ml_model.load_fraud_model()
+    row = pd.DataFrame([{c: 1 for c in ml_model.FEATURE_COLUMNS}])
+    assert ml_model.score_transactions(row)[0] == 0.2
+
+    v2 = registry.publish(ConstModel(0.8), {})
+    ml_model.activate_version(v2)
+    assert ml_model.fraud_model.version == v2
+    assert ml_model.score_transactions(row)[0] == 0.8
+
+
+def test_versions_order_numerically_past_v9999(tmp_path):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+    for name in ('v9999', 'v10000'):
+        os.makedirs(tmp_path / 'models' / name)
+        (tmp_path / 'models' / name / registry.METADATA_FILE).write_text('{}')
+    assert registry.latest_version() == 'v10000'
+    assert registry.publish(ConstModel(0.5), {}) == 'v10001'
+
+    watcher = ModelWatcher(registry, lambda v: None, current='v9999', interval=60)
+    assert watcher.poll_once() and watcher.current == 'v10001'
+
+
+def test_publish_reraises_errors_other_than_collisions(tmp_path, monkeypatch):
+    registry = ModelRegistry(str(tmp_path / 'models'))
+
+    def read_only(src, dst):
+        raise OSError(errno.EROFS, "Read-only file system")
+
+    monkeypatch.setattr(os, 'rename', read_only)
+    with pytest.raises(OSError, match="Read-only"):
+        registry.publish(ConstModel(0.5), {})
+    monkeypatch.undo()
+    assert os.listdir(tmp_path / 'models') == []
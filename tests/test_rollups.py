@@ -0,0 +1,81 @@
+# tests/test_rollups.py
+
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import rollups
+import utils
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setattr("database._engine", engine)
+    monkeypatch.setattr(utils, "_summary_ready", False)
+    monkeypatch.setattr(rollups, "_ready", False)
+    return engine
+
+
+def make_df(fraud=True):
+    df = pd.DataFrame({
+        'step': [1, 2, 25, 3], 'customer': ['A', 'B', 'A', 'C'],
+        'merchant': ['M1', 'M1', 'M2', 'M2'], 'category': ['food', 'tech', 'food', 'food'],
+        'amount': [10.0, 20.0, 30.0, 40.0], 'fraud': [1, 0, 1, 0],
+    })
+    return df if fraud else df.drop(columns=['fraud'])
+
+
+def test_rollup_rows_single_pass():
+    rows = rollups.rollup_rows(make_df(), 't1', datetime(2025, 3, 1, 12)).to_pandas()
+    assert set(rows['dimension']) == set(rollups.ROLLUP_DIMENSIONS)
+    hour = rows[rows['dimension'] == 'hour'].set_index('dim_value')
+    assert hour.loc['0', 'row_count'] == 2 and hour.loc['0', 'fraud_sum'] == 2
+    cat = rows[rows['dimension'] == 'category'].set_index('dim_value')
+    assert cat.loc['food', 'amount_sum'] == 80.0
+    assert (rows['upload_date'] == '2025-03-01').all()
+
+
+def test_rollup_rows_skip_nan_steps():
+    df = pd.DataFrame({'step': [1.0, float('nan'), float('inf')], 'amount': [1.0, 2.0, 3.0]})
+    rows = rollups.rollup_rows(df, 't1', datetime(2025, 3, 1)).to_pandas()
+    assert rows[['dim_value', 'row_count']].values.tolist() == [['0', 1]]
+
+
+def test_save_maintains_rollups_and_date_filter(sqlite_engine, monkeypatch):
+    times = iter([datetime(2025, 1, 1), datetime(2025, 2, 1)])
+    monkeypatch.setattr(utils, "datetime", type("FakeDT", (), {"now": staticmethod(lambda: next(times))}))
+    assert utils.save_to_database(make_df(), 'jan.csv') is not None
+    # Unlabelled uploads count towards volume and amount, not the fraud rate
+    assert utils.save_to_database(make_df(fraud=False), 'feb.csv') is not None
+
+    hours = rollups.query_rollup('hour')
+    assert hours['row_count'].sum() == 8
+    assert hours['labelled_rows'].sum() == 4 and hours['fraud_sum'].sum() == 2
+    assert hours['value'].tolist() == [0, 1, 2]
+
+    jan = rollups.query_rollup('category', '2025-01-01', '2025-01-31T00:00:00')
+    assert jan.set_index('value').loc['food', 'amount_sum'] == 80.0
+    top = rollups.query_rollup('customer', order_by='fraud_sum', limit=1)
+    assert top['value'].tolist() == ['A'] and top.loc[0, 'fraud_rate'] == 100.0
+    assert rollups.rollup_date_range() == ('2025-01-01', '2025-02-01')
+
+
+def test_backfill_adds_registered_uploads(sqlite_engine):
+    make_df().to_sql('transactions_old', sqlite_engine, schema='dbo', index=False)
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_old', 'old.csv', '2024-12-31 00:00:00')"))
+    assert rollups.backfill_rollups() == 1
+    assert rollups.backfill_rollups() == 0
+    assert rollups.query_rollup('merchant')['row_count'].tolist() == [2, 2]
@@ -0,0 +1,99 @@
+# tests/test_scoring.py
+
+import threading
+import numpy as np
+
+from scoring import MicroBatcher, ParallelScorer
+
+
+def test_concurrent_requests_share_one_batch():
+    calls = []
+
+    def fake_score(df):
+        calls.append(len(df))
+        return np.asarray(df['amount'], dtype=float) / 100
+
+    batcher = MicroBatcher(fake_score, max_batch_size=64, max_wait_ms=200)
+    results = {}
+
+    def worker(i):
+        results[i] = batcher.score([{'amount': i}], timeout=5)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sum(calls) == 8
+    assert len(calls) < 8
+    assert all(abs(results[i][0] - i / 100) < 1e-9 for i in range(8))
+
+
+def test_batch_error_reaches_every_caller():
+    def failing(df):
+        raise RuntimeError("model down")
+
+    batcher = MicroBatcher(failing, max_batch_size=4, max_wait_ms=1)
+    fut = batcher.submit([{'amount': 1}])
+    assert isinstance(fut.exception(timeout=5), RuntimeError)
+
+
+def test_bad_request_does_not_fail_its_batch():
+    calls = []
+
+    def fake_score(df):
+        calls.append(len(df))
+        return np.asarray(df['amount'], dtype=float) / 100
+
+    batcher = MicroBatcher(fake_score, max_batch_size=64, max_wait_ms=200)
+    good = batcher.submit([{'amount': 5}])
+    bad = batcher.submit([{'amount': 'n/a'}])
+    assert abs(good.result(timeout=5)[0] - 0.05) < 1e-9
+    assert isinstance(bad.exception(timeout=5), ValueError)
+    assert calls[0] == 2
+
+
+def test_parallel_scorer_matches_in_process(monkeypatch):
+    import pandas as pd
+    import xgboost as xgb
+    import ml_model
+    from inference import make_backend
+    from model_registry import ServingModel
+
+    rng = np.random.default_rng(1)
+    n = 3000
+    df = pd.DataFrame({
+        'step': rng.integers(0, 100, n), 'customer': rng.choice(['C1', 'C2', 'C3'], n),
+        'age': '3', 'gender': rng.choice(['F', 'M'], n), 'zipcodeOri': '28007',
+        'merchant': rng.choice(['M1', 'M2'], n), 'zipMerchant': '28007',
+        'category': rng.choice(['food', 'tech'], n), 'amount': rng.random(n) * 500,
+    })
+    bundle = ml_model.fit_encoders(df)
+    model = xgb.XGBClassifier(n_estimators=5, max_depth=3)
+    model.fit(ml_model.feature_matrix(df, bundle), (df['amount'] > 400).astype(int))
+    monkeypatch.setattr(ml_model, 'fraud_model', ServingModel(make_backend(model, 'booster'), bundle, "t"))
+
+    scorer = ParallelScorer(workers=2, min_rows=1000)
+    try:
+        parallel = scorer.score(df)
+        assert scorer._pool is not None
+    finally:
+        scorer.close()
+    np.testing.assert_allclose(parallel, ml_model.score_transactions(df), rtol=1e-6)
+
+
+def test_pool_worker_reuses_the_parents_library_dir(monkeypatch):
+    import xgboost as xgb
+    import inference
+    import scoring
+
+    X = np.random.default_rng(0).random((50, 3))
+    booster = xgb.train({}, xgb.DMatrix(X, label=X[:, 0] > 0.5), num_boost_round=2)
+    built = []
+    monkeypatch.setattr(inference, 'make_backend',
+                        lambda model, name=None, lib_dir=None: built.append((name, lib_dir)) or model)
+    monkeypatch.setattr(scoring, '_worker_model', None)
+
+    scoring._init_worker(bytes(booster.save_raw("ubj")), 'treelite', '/models/v0001')
+    assert built == [('treelite', '/models/v0001')]
@@ -5,28 +5,152 @@ from flask import Flask
 
 @pytest.fixture
 def client(monkeypatch):
+    from response_cache import transactions_cache
+    transactions_cache.clear()
     app = Flask(__name__)
     register_api_routes(app)
     return app.test_client()
 
-def test_get_transactions_empty(client, monkeypatch):
-    # simulate no tables
+@pytest.fixture
+def stored(tmp_path, monkeypatch):
+    # Fact-mode store on SQLite, with 'dbo' attached as a second database
     import pandas as pd
-    monkeypatch.setattr("server.pd.read_sql", lambda *a, **k: pd.DataFrame())
+    from sqlalchemy import create_engine, event, text
+    from bulk_load import typed_frame
+    from storage import write_batch
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    monkeypatch.setenv("STORAGE_MODE", "fact")
+    monkeypatch.setattr("database._engine", engine)
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    for i, name in enumerate(['transactions_a', 'transactions_b']):
+        df = pd.DataFrame({'step': range(5), 'customer': [f"C{j}" for j in range(5)],
+                           'category': ['food', 'tech'] * 2 + ['food'],
+                           'amount': [float(j) for j in range(5)], 'fraud': [0, 1, 0, 1, 0]})
+        write_batch(engine, typed_frame(df), name)
+        with engine.begin() as conn:
+            conn.execute(text("INSERT INTO dbo.MasterTable VALUES (:t, 'f.csv', :u)"),
+                         {"t": name, "u": f"2025-01-0{i + 1} 00:00:00"})
+    return engine
+
+def test_get_transactions_empty(client, monkeypatch):
+    from sqlalchemy import create_engine
+    monkeypatch.setattr("database._engine", create_engine("sqlite://"))
+    monkeypatch.setattr("server.transactions_select", lambda *a, **k: None)
     resp = client.get("/api/v1/transactions")
     assert resp.status_code == 200
     assert resp.json == []
 
-def test_get_transactions_success(client, monkeypatch):
-    import pandas as pd
-    df_master = pd.DataFrame({'table_name':['transactions_1']})
-    df_data = pd.DataFrame([{'a':1,'b':2}])
-    calls = {'count':0}
-    def fake_read_sql(q, engine):
-        calls['count'] += 1
-        return df_master if calls['count']==1 else df_data
-    monkeypatch.setattr("server.pd.read_sql", fake_read_sql)
+def test_get_transactions_before_any_upload(client, tmp_path, monkeypatch):
+    # A fresh fact-mode database: MasterTable exists, dbo.Transactions not yet
+    from sqlalchemy import create_engine, event, text
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setenv("STORAGE_MODE", "fact")
+    monkeypatch.setattr("database._engine", engine)
     resp = client.get("/api/v1/transactions")
     assert resp.status_code == 200
-    assert isinstance(resp.json, list)
-    assert resp.json[0]['a'] == 1
+    assert resp.json == []
+
+def test_get_transactions_keyset_pages(client, stored):
+    first = client.get("/api/v1/transactions?limit=4&fields=amount,batch_name").json
+    assert [r['id'] for r in first] == [1, 2, 3, 4]
+    assert set(first[0]) == {'id', 'amount', 'batch_name'}
+
+    rest = client.get(f"/api/v1/transactions?limit=100&after={first[-1]['id']}").json
+    assert [r['id'] for r in rest] == [5, 6, 7, 8, 9, 10]
+    assert rest[-1]['batch_name'] == 'transactions_b'
+
+def test_get_transactions_filters_ndjson(client, stored):
+    resp = client.get("/api/v1/transactions?format=ndjson&fraud=1&since=2025-01-01T12:00")
+    assert resp.mimetype == 'application/x-ndjson'
+    rows = [json.loads(line) for line in resp.get_data(as_text=True).splitlines()]
+    assert [(r['batch_name'], r['fraud']) for r in rows] == [('transactions_b', 1)] * 2
+
+    rows = client.get("/api/v1/transactions?category=food&step_to=2").json
+    assert [r['step'] for r in rows] == [0, 2, 0, 2]
+
+def test_get_transactions_bad_args(client, stored):
+    assert client.get("/api/v1/transactions?fields=password").status_code == 400
+    assert client.get("/api/v1/transactions?limit=0").status_code == 400
+    assert client.get("/api/v1/transactions?fraud=yes").status_code == 400
+
+def test_get_transactions_etag_and_invalidation(client, stored, monkeypatch):
+    import pandas as pd
+    import server
+    import utils
+
+    first = client.get("/api/v1/transactions?limit=3")
+    etag = first.headers['ETag']
+    select = server.transactions_select
+
+    # Repeat polls are answered from the cache without a query
+    def no_db(*a, **k):
+        raise AssertionError("database queried")
+    monkeypatch.setattr("server.transactions_select", no_db)
+    again = client.get("/api/v1/transactions?limit=3", headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert client.get("/api/v1/transactions?limit=3").json == first.json
+    monkeypatch.setattr("server.transactions_select", select)
+
+    # A new upload clears the cache, so the next poll sees fresh rows
+    assert client.get("/api/v1/transactions?after=10").json == []
+    utils.write_transactions(pd.DataFrame({'step': [9], 'amount': [1.0], 'fraud': [1]}), 'transactions_c')
+    assert [r['step'] for r in client.get("/api/v1/transactions?after=10").json] == [9]
+
+def test_db_health(client, stored):
+    resp = client.get("/api/v1/health/db")
+    assert resp.status_code == 200
+    assert resp.json['status'] == 'ok'
+    assert 'checkout_wait' in resp.json and resp.json['pool']['created']
+
+def test_predict_single_and_batch(client, monkeypatch):
+    import numpy as np
+    import ml_model
+
+    class DummyModel:
+        def predict_proba(self, X):
+            p = np.where(X[:, ml_model.FEATURE_COLUMNS.index('amount')] > 100, 0.9, 0.1)
+            return np.column_stack([1 - p, p])
+
+    monkeypatch.setattr(ml_model, 'fraud_model', DummyModel())
+    row = {'step': 1, 'customer': 'C1', 'age': '3', 'gender': 'F', 'zipcodeOri': '28007',
+           'merchant': 'M1', 'zipMerchant': '28007', 'category': 'food', 'amount': 50.0}
+
+    resp = client.post("/api/v1/predict", json=row)
+    assert resp.status_code == 200
+    assert resp.json['predictions'][0]['fraud'] == 0
+
+    resp = client.post("/api/v1/predict", json=[row, dict(row, amount=500.0)])
+    assert [p['fraud'] for p in resp.json['predictions']] == [0, 1]
+
+    resp = client.post("/api/v1/predict",
+                       json={'transactions': [row, dict(row, amount=500.0)], 'summary': True})
+    summary = resp.json['summary']
+    assert summary['rows'] == 2
+    assert summary['category_amount'] == {'food': 550.0}
+    assert summary['hour_counts'] == {'0': 2}
+    assert summary['top_fraud_customers'] == {'C1': 1}
+
+def test_predict_missing_features(client):
+    resp = client.post("/api/v1/predict", json={'amount': 1.0})
+    assert resp.status_code == 400
+    assert 'Missing required features' in resp.json['error']
+
+def test_train_status_unknown_job(client):
+    resp = client.get("/api/v1/train/doesnotexist")
+    assert resp.status_code == 404
@@ -0,0 +1,95 @@
+# tests/test_storage.py
+
+import pandas as pd
+import polars as pl
+import pytest
+from sqlalchemy import create_engine, event, text
+
+from bulk_load import typed_frame
+from storage import batch_query, migrate_per_upload_tables, write_batch
+
+
+@pytest.fixture
+def dbo_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    return engine
+
+
+def make_df(n, fraud=0):
+    return pd.DataFrame({
+        'step': list(range(n)), 'customer': [f"C{i}" for i in range(n)],
+        'merchant': ['M1'] * n, 'category': ['food'] * n,
+        'amount': [float(i) for i in range(n)], 'fraud': [fraud] * n,
+    })
+
+
+def test_fact_mode_keeps_batches_apart(dbo_engine, monkeypatch):
+    monkeypatch.setenv("STORAGE_MODE", "fact")
+    write_batch(dbo_engine, typed_frame(make_df(3)), 'transactions_a')
+    write_batch(dbo_engine, typed_frame(make_df(5, fraud=1)), 'transactions_b')
+
+    a = pd.read_sql(batch_query('transactions_a'), dbo_engine)
+    b = pd.read_sql(batch_query('transactions_b', "COUNT(*) AS n", "fraud = 1"), dbo_engine)
+    assert len(a) == 3 and set(a['batch_name']) == {'transactions_a'}
+    assert b.loc[0, 'n'] == 5
+
+
+def test_migrate_copies_registered_tables(dbo_engine, monkeypatch):
+    make_df(4).astype(str).to_sql('transactions_old', dbo_engine, schema='dbo', index=False)
+    with dbo_engine.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_old', 'old.csv', '2025-01-01 00:00:00')"))
+
+    assert migrate_per_upload_tables(dbo_engine) == 4
+    # Re-running skips batches that were already copied
+    assert migrate_per_upload_tables(dbo_engine, drop=True) == 0
+
+    monkeypatch.setenv("STORAGE_MODE", "fact")
+    rows = pl.read_database(batch_query('transactions_old', "step, amount"), connection=dbo_engine)
+    assert rows['amount'].sum() == 6.0
+    with dbo_engine.connect() as conn:
+        left = conn.execute(text("SELECT COUNT(*) FROM dbo.sqlite_master "
+                                 "WHERE name = 'transactions_old'")).scalar()
+    assert left == 0
+
+
+def test_select_reads_only_columns_a_legacy_table_has(dbo_engine, monkeypatch):
+    from storage import transactions_select
+
+    monkeypatch.setenv("STORAGE_MODE", "per_upload")
+    legacy = pd.DataFrame({'customer': ['C1', 'C2'], 'zipcodeOri': ['1', '2'],
+                           'merchant': ['M1', 'M2'], 'zipMerchant': ['1', '2'],
+                           'category': ['food', 'tech'], 'amount': [1.5, 2.5], 'fraud': [0, 1]})
+    legacy.to_sql('transactions_old', dbo_engine, schema='dbo', index=False)
+    with dbo_engine.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_old', 'old.csv', '2025-01-01 00:00:00')"))
+
+    with dbo_engine.connect() as conn:
+        rows = conn.execute(transactions_select(dbo_engine)).mappings().all()
+        assert set(rows[0]) == set(legacy.columns) | {'batch_name'}
+        rows = conn.execute(transactions_select(dbo_engine, ['step', 'amount'], {'fraud': 1})).all()
+        assert rows == [(2.5,)]
+        rows = conn.execute(transactions_select(dbo_engine, filters={'step_from': 0})).all()
+        assert rows == []
+
+
+def test_older_fact_table_gains_new_columns(dbo_engine, monkeypatch):
+    monkeypatch.setenv("STORAGE_MODE", "fact")
+    with dbo_engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.Transactions (id INTEGER PRIMARY KEY, "
+                          "batch_name TEXT, step INTEGER, amount FLOAT, fraud SMALLINT)"))
+    scored = typed_frame(make_df(2)).with_columns(pl.lit(0.25).alias('fraud_probability'))
+    write_batch(dbo_engine, scored, 'transactions_a')
+
+    stored = pd.read_sql(batch_query('transactions_a', "fraud_probability, zipMerchant"), dbo_engine)
+    assert stored['fraud_probability'].to_list() == [0.25, 0.25]
+    assert stored['zipMerchant'].isna().all()
@@ -0,0 +1,266 @@
+# tests/test_stream_consumer.py
+
+import json
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, event, text
+
+import ml_model
+import rollups
+import stream_consumer
+import utils
+from model_registry import ServingModel
+from stream_consumer import FileSource, SocketSource, StreamConsumer
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setattr("database._engine", engine)
+    monkeypatch.setattr(utils, "_summary_ready", False)
+    monkeypatch.setattr(rollups, "_ready", False)
+    return engine
+
+
+class AmountModel:
+    """Fraud probability grows with the amount (last feature column)."""
+
+    def predict_proba(self, X):
+        p = np.clip(np.asarray(X)[:, -1] / 100.0, 0, 1)
+        return np.column_stack([1 - p, p])
+
+
+@pytest.fixture
+def serving_model(monkeypatch):
+    monkeypatch.setattr(ml_model, 'fraud_model', ServingModel(AmountModel(), None, "v0001"))
+
+
+def make_lines(n, start=0):
+    return [json.dumps({
+        'step': i % 5, 'customer': f"C{i % 7}", 'age': '3', 'gender': 'F',
+        'zipcodeOri': '28007', 'merchant': f"M{i % 3}", 'zipMerchant': '28007',
+        'category': 'es_food', 'amount': float(i % 100),
+    }) + "\n" for i in range(start, start + n)]
+
+
+def run_until(consumer, rows, timeout=20):
+    """Run consumer in a thread until it has scored rows rows, then stop it."""
+    stop = threading.Event()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(consumer.run(stop)))
+    thread.start()
+    deadline = time.monotonic() + timeout
+    while consumer.stats.totals['rows'] < rows and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join(timeout)
+    return result
+
+
+def test_file_stream_is_scored_written_and_resumed(tmp_path, sqlite_engine, serving_model, monkeypatch):
+    alerts = []
+    monkeypatch.setattr(stream_consumer, 'send_slack_notification', lambda *a: alerts.append(a))
+    monkeypatch.setattr(stream_consumer, 'send_email_notification', lambda *a: None)
+    path = tmp_path / 'in.ndjson'
+    path.write_text("".join(make_lines(250)) + "not json\n" + '{"step": 1}\n')
+    out = tmp_path / 'out.ndjson'
+
+    consumer = StreamConsumer(FileSource(str(path), from_start=True), output_path=str(out),
+                              batch_rows=100, max_wait_ms=20, report_seconds=60)
+    totals = run_until(consumer, 250)
+    assert totals['rows'] == 250 and totals['invalid'] == 2 and totals['batches'] >= 3
+
+    scored = [json.loads(line) for line in out.read_text().splitlines()]
+    assert len(scored) == 250
+    assert scored[99]['fraud_probability'] == pytest.approx(0.99)
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {consumer.table_name}")).scalar() == 250
+        # The scores are stored and the table is registered like an upload
+        assert conn.execute(text(f"SELECT fraud_probability FROM {consumer.table_name} "
+                                 "WHERE amount = 99")).scalar() == pytest.approx(0.99)
+        assert conn.execute(text("SELECT table_name, file_name FROM dbo.MasterTable")).all() == \
+            [(consumer.table_name, f"stream:{path}")]
+    hours = rollups.query_rollup('hour')
+    assert hours['row_count'].sum() == 250
+    # Every batch has a row over 0.7, but the cooldown allows one alert
+    assert len(alerts) == 1 and alerts[0][0] == "Severe"
+    assert json.loads((tmp_path / 'in.ndjson.offset').read_text())['offset'] == path.stat().st_size
+
+    # A new run resumes after the checkpoint and only sees appended lines
+    with open(path, "a") as f:
+        f.writelines(make_lines(30, start=250))
+    consumer = StreamConsumer(FileSource(str(path)), output_path=str(out), store=False,
+                              notify=False, batch_rows=100, max_wait_ms=20, report_seconds=60)
+    assert run_until(consumer, 30)['rows'] == 30
+    assert len(out.read_text().splitlines()) == 280
+
+
+def test_backpressure_bounds_what_is_read(tmp_path, serving_model):
+    path = tmp_path / 'in.ndjson'
+    path.write_text("".join(make_lines(200)))
+    release = threading.Event()
+
+    def slow_score(df):
+        release.wait(10)
+        return ml_model.score_transactions(df)
+
+    consumer = StreamConsumer(FileSource(str(path), from_start=True), store=False, notify=False,
+                              batch_rows=10, max_wait_ms=5, queue_lines=20,
+                              report_seconds=60, score_fn=slow_score)
+    stop = threading.Event()
+    thread = threading.Thread(target=consumer.run, args=(stop,))
+    thread.start()
+    time.sleep(0.5)
+    # One batch is being scored and the queue is full: the tail stops reading
+    assert consumer.lines.qsize() == 20
+    assert consumer.stats.totals['lines'] == 0
+
+    release.set()
+    deadline = time.monotonic() + 20
+    while consumer.stats.totals['rows'] < 200 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join(10)
+    assert consumer.stats.totals['rows'] == 200
+    assert consumer.stats.totals['blocked_s'] > 0
+
+
+def test_socket_producers(tmp_path, serving_model):
+    source = SocketSource("127.0.0.1", 0)
+    out = tmp_path / 'out.ndjson'
+    consumer = StreamConsumer(source, output_path=str(out), store=False, notify=False,
+                              batch_rows=50, max_wait_ms=20, report_seconds=60)
+    stop = threading.Event()
+    thread = threading.Thread(target=consumer.run, args=(stop,))
+    thread.start()
+    for start in (0, 40):
+        with socket.create_connection(source.address) as conn:
+            conn.sendall("".join(make_lines(40, start=start)).encode())
+    deadline = time.monotonic() + 20
+    while consumer.stats.totals['rows'] < 80 and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join(10)
+    assert len(out.read_text().splitlines()) == 80
+
+
+def test_bad_values_drop_only_their_line():
+    lines = [line.encode() for line in make_lines(3)]
+    lines[1] = lines[1].replace(b'"amount": 1.0', b'"amount": "n/a"')
+    labelled = json.loads(lines[2])
+    lines.append(json.dumps(dict(labelled, fraud=1.0)).encode())
+    lines.append(json.dumps(dict(labelled, fraud=0.5)).encode())
+
+    df, invalid = stream_consumer.parse_lines(lines, "run")
+    assert invalid == 2
+    assert df['amount'].to_list() == [0.0, 2.0, 2.0]
+    assert df['fraud'].to_list() == [None, None, 1]
+
+
+def test_failed_write_is_retried_before_the_checkpoint_moves(tmp_path, sqlite_engine, serving_model,
+                                                             monkeypatch):
+    path = tmp_path / 'in.ndjson'
+    path.write_text("".join(make_lines(20)))
+    real_write = utils.write_transactions
+    failures = []
+
+    def flaky_write(*args, **kwargs):
+        if len(failures) < 2:
+            failures.append(1)
+            raise RuntimeError("connection lost")
+        return real_write(*args, **kwargs)
+
+    monkeypatch.setattr(utils, 'write_transactions', flaky_write)
+    monkeypatch.setenv("STREAM_RETRY_MAX_SECONDS", "0")
+    source = FileSource(str(path), from_start=True)
+    commits = []
+    monkeypatch.setattr(source, 'commit', commits.append)
+    consumer = StreamConsumer(source, notify=False, batch_rows=100, max_wait_ms=20,
+                              report_seconds=60)
+    stop = threading.Event()
+    thread = threading.Thread(target=consumer.run, args=(stop,))
+    thread.start()
+    deadline = time.monotonic() + 20
+    while not commits and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join(10)
+
+    assert consumer.stats.totals['write_errors'] == 2
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {consumer.table_name}")).scalar() == 20
+    assert len(commits) == 1
+
+    # Stopped while the write still fails: nothing is checkpointed
+    monkeypatch.setattr(utils, 'write_transactions', lambda *a, **k: time.sleep(0.2) or 1 / 0)
+    source = FileSource(str(path), from_start=True)
+    monkeypatch.setattr(source, 'commit', commits.append)
+    consumer = StreamConsumer(source, store=True, notify=False, batch_rows=100, max_wait_ms=20,
+                              report_seconds=60)
+    run_until(consumer, 20)
+    assert consumer.stats.totals['write_errors'] >= 1
+    assert len(commits) == 1
+
+
+def test_rows_that_fail_to_score_are_dropped_alone(tmp_path, serving_model):
+    path = tmp_path / 'in.ndjson'
+    lines = make_lines(10)
+    lines[3] = lines[3].replace('"customer": "C3"', '"customer": "poison"')
+    path.write_text("".join(lines))
+
+    def picky_score(df):
+        if "poison" in df['customer'].to_list():
+            raise ValueError("unexpected value")
+        return ml_model.score_transactions(df)
+
+    out = tmp_path / 'out.ndjson'
+    consumer = StreamConsumer(FileSource(str(path), from_start=True), output_path=str(out),
+                              store=False, notify=False, batch_rows=100, max_wait_ms=20,
+                              report_seconds=60, score_fn=picky_score)
+    totals = run_until(consumer, 9)
+    assert totals['rows'] == 9 and totals['invalid'] == 1
+    assert [json.loads(line)['customer'] for line in out.read_text().splitlines()] == \
+        [f"C{i % 7}" for i in range(10) if i != 3]
+
+
+def test_failed_rollups_are_retried(tmp_path, sqlite_engine, serving_model, monkeypatch):
+    path = tmp_path / 'in.ndjson'
+    path.write_text("".join(make_lines(10)))
+    real_record = stream_consumer.record_rollups
+    attempts = []
+
+    def flaky_record(rows):
+        attempts.append(rows.height)
+        return len(attempts) > 1 and real_record(rows)
+
+    monkeypatch.setattr(stream_consumer, 'record_rollups', flaky_record)
+    monkeypatch.setenv("STREAM_RETRY_MAX_SECONDS", "0")
+    source = FileSource(str(path), from_start=True)
+    consumer = StreamConsumer(source, notify=False, batch_rows=100, max_wait_ms=20,
+                              report_seconds=60)
+    stop = threading.Event()
+    thread = threading.Thread(target=consumer.run, args=(stop,))
+    thread.start()
+    deadline = time.monotonic() + 20
+    while source._committed is None and time.monotonic() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    thread.join(10)
+
+    assert len(attempts) == 2 and consumer.stats.totals['write_errors'] == 1
+    assert rollups.query_rollup('hour')['row_count'].sum() == 10
+    # The table was written once; only the rollups were retried
+    with sqlite_engine.connect() as conn:
+        assert conn.execute(text(f"SELECT COUNT(*) FROM {consumer.table_name}")).scalar() == 10
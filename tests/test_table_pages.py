@@ -0,0 +1,59 @@
+# tests/test_table_pages.py
+
+import polars as pl
+
+from table_pages import FrameCache, cache_upload, table_columns, table_page, upload_frames
+
+
+def make_df():
+    return pl.DataFrame({
+        'step': list(range(25)),
+        'category': ['es_food' if i % 2 else 'es_transportation' for i in range(25)],
+        'amount': [float(i * 10) for i in range(25)],
+    })
+
+
+def test_page_slices_and_counts():
+    records, page_count = table_page(make_df(), page_current=2, page_size=10)
+    assert page_count == 3
+    assert [r['step'] for r in records] == [20, 21, 22, 23, 24]
+
+
+def test_sort_and_filter_on_server():
+    df = make_df()
+    records, page_count = table_page(
+        df, 0, 3,
+        sort_by=[{'column_id': 'amount', 'direction': 'desc'}],
+        filter_query='{amount} >= 50 && {category} contains food'
+    )
+    assert page_count == 4  # steps 5, 7, ..., 23
+    assert [r['step'] for r in records] == [23, 21, 19]
+
+    # Case-insensitive and exact text matches; bad numbers match nothing
+    assert table_page(df, filter_query='{category} icontains FOOD')[1] == 2
+    assert len(table_page(df, page_size=50, filter_query='{category} = es_food')[0]) == 12
+    assert table_page(df, filter_query='{amount} > lots')[0] == []
+    # Unknown columns are ignored rather than failing the page
+    assert len(table_page(df, filter_query='{nope} = 1', sort_by=[{'column_id': 'nope'}])[0]) == 10
+
+
+def test_cached_upload_round_trip():
+    df = make_df()
+    key = cache_upload(df)
+    assert upload_frames.get(key) is df
+    assert [c['type'] for c in table_columns(df)] == ['numeric', 'text', 'numeric']
+
+
+def test_frame_cache_evicts_by_size():
+    df = make_df()
+    size = df.estimated_size()
+    cache = FrameCache(max_entries=8, max_bytes=2 * size, ttl=60)
+    for key in 'abc':
+        cache.put(key, df)
+    assert cache.get('a') is None and cache.get('c') is df
+    assert len(cache) == 2 and cache.nbytes == 2 * size
+
+    # A frame over the budget on its own is still kept
+    big = pl.concat([df] * 10)
+    cache.put('big', big)
+    assert len(cache) == 1 and cache.get('big') is big
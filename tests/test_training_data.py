@@ -0,0 +1,111 @@
+# tests/test_training_data.py
+
+import pandas as pd
+from datetime import datetime
+from sqlalchemy import create_engine, event
+
+import training_data
+from training_data import TrainingSnapshot
+
+
+def make_engine(tmp_path):
+    # SQLite stand-in: attach a second database as the 'dbo' schema
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    return engine
+
+
+def add_table(engine, name, n_rows):
+    df = pd.DataFrame({
+        'step': range(n_rows), 'customer': 'C1', 'age': '3', 'gender': 'F',
+        'zipcodeOri': '28007', 'merchant': 'M1', 'zipMerchant': '28007',
+        'category': 'food', 'amount': 1.5, 'fraud': [i % 2 for i in range(n_rows)]
+    })
+    df.to_sql(name, engine, schema='dbo', index=False)
+
+
+def test_sync_reads_only_new_tables(tmp_path, monkeypatch):
+    engine = make_engine(tmp_path)
+    master = [('transactions_a', datetime(2025, 1, 1)), ('transactions_b', datetime(2025, 1, 2))]
+    add_table(engine, 'transactions_a', 3)
+    add_table(engine, 'transactions_b', 4)
+
+    discovered_since = []
+
+    def fake_discover(eng, since):
+        discovered_since.append(since)
+        rows = [m for m in master if since is None or m[1] >= since]
+        return pd.DataFrame(rows, columns=['table_name', 'uploaded_at'])
+
+    read_tables = []
+    real_read = training_data.read_training_table
+
+    def spy_read(eng, tbl):
+        read_tables.append(tbl)
+        return real_read(eng, tbl)
+
+    monkeypatch.setattr(training_data, 'discover_training_tables', fake_discover)
+    monkeypatch.setattr(training_data, 'read_training_table', spy_read)
+
+    snapshot = TrainingSnapshot(str(tmp_path / 'snap'))
+    assert snapshot.sync(engine) == 7
+    assert len(snapshot.load()) == 7
+
+    # A second upload arrives; only it is read from the database
+    master.append(('transactions_c', datetime(2025, 1, 3)))
+    add_table(engine, 'transactions_c', 2)
+    assert snapshot.sync(engine) == 2
+    assert read_tables == ['transactions_a', 'transactions_b', 'transactions_c']
+    assert discovered_since[-1] == datetime(2025, 1, 2)
+
+    df = snapshot.load()
+    assert len(df) == 9
+    assert set(df.columns) == set(training_data.TRAINING_COLUMNS)
+
+
+def test_empty_snapshot_loads_none(tmp_path):
+    assert TrainingSnapshot(str(tmp_path / 'missing')).load() is None
+
+
+def test_iter_batches_streams_in_chunks(tmp_path):
+    snap = tmp_path / 'snap'
+    snap.mkdir()
+    df = pd.DataFrame({c: ['x'] * 5 for c in training_data.TRAINING_COLUMNS})
+    df.to_parquet(snap / 'a.parquet', index=False)
+    # An older table without zipMerchant
+    df.drop(columns=['zipMerchant']).to_parquet(snap / 'b.parquet', index=False)
+
+    batches = list(TrainingSnapshot(str(snap)).iter_batches(batch_rows=2))
+    assert sum(b.height for b in batches) == 10
+    assert max(b.height for b in batches) <= 2
+    assert all(b.columns == training_data.TRAINING_COLUMNS for b in batches)
+    assert batches[-1]['zipMerchant'].null_count() == batches[-1].height
+
+
+def test_failed_table_is_retried_on_next_sync(tmp_path, monkeypatch):
+    engine = make_engine(tmp_path)
+    master = [('transactions_a', datetime(2025, 1, 1)), ('transactions_b', datetime(2025, 1, 2))]
+    add_table(engine, 'transactions_a', 3)
+    add_table(engine, 'transactions_b', 4)
+    monkeypatch.setattr(training_data, 'discover_training_tables', lambda eng, since: pd.DataFrame(
+        [m for m in master if since is None or m[1] >= since], columns=['table_name', 'uploaded_at']))
+
+    real_read = training_data.read_training_table
+    failures = {'transactions_a'}
+
+    def flaky_read(eng, tbl):
+        if tbl in failures:
+            failures.discard(tbl)
+            raise RuntimeError("connection reset")
+        return real_read(eng, tbl)
+
+    monkeypatch.setattr(training_data, 'read_training_table', flaky_read)
+    snapshot = TrainingSnapshot(str(tmp_path / 'snap'))
+    assert snapshot.sync(engine) == 4
+    assert snapshot.watermark()['tables'] == ['transactions_b']
+    assert snapshot.sync(engine) == 3
+    assert len(snapshot.load()) == 7
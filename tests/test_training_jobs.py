@@ -0,0 +1,77 @@
+# tests/test_training_jobs.py
+
+import time
+
+from training_jobs import TrainingJobManager
+
+
+def wait_for(manager, job_id, timeout=60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job['state'] in ('succeeded', 'failed'):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_training_job_runs_in_background_and_reloads(tmp_path):
+    mp = tmp_path / 'fraud_model.pkl'
+    reloaded = []
+    manager = TrainingJobManager(on_success=reloaded.append)
+
+    job, created = manager.start(str(mp))
+    assert created
+    assert job['state'] in ('queued', 'running')
+
+    # A second request while the first is running returns the same job
+    again, created_again = manager.start(str(mp))
+    assert not created_again
+    assert again['job_id'] == job['job_id']
+
+    done = wait_for(manager, job['job_id'])
+    assert done['state'] == 'succeeded', done['error']
+    assert done['phase'] == 'saving'
+    assert done['elapsed'] > 0
+    assert mp.exists()
+    assert reloaded == [str(mp)]
+
+
+def test_unknown_job_returns_none():
+    assert TrainingJobManager().get('missing') is None
+
+
+def test_final_event_read_after_child_exit():
+    import queue
+
+    class ExitedProcess:
+        exitcode = 0
+
+        def is_alive(self):
+            return False
+
+        def join(self):
+            pass
+
+    class LateEvents:
+        """The child's last event only arrives after it has exited."""
+
+        def __init__(self):
+            self.calls = 0
+
+        def get(self, timeout):
+            self.calls += 1
+            if self.calls == 1:
+                raise queue.Empty
+            if self.calls == 2:
+                return ("done", "model.pkl")
+            raise queue.Empty
+
+    reloaded = []
+    manager = TrainingJobManager(on_success=reloaded.append)
+    job = {'job_id': 'j', 'state': 'queued', 'phase': None, 'rows': 0, 'error': None,
+           'started_at': time.time(), 'finished_at': None}
+    manager._jobs['j'] = job
+    manager._monitor(job, ExitedProcess(), LateEvents())
+    assert manager.get('j')['state'] == 'succeeded'
+    assert reloaded == ['model.pkl']
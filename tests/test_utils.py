@@ -30,3 +30,63 @@ def test_get_historical_fraud_rate():
     rate = get_historical_fraud_rate()
     assert isinstance(rate, float)
     assert 0 <= rate <= 100
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path, monkeypatch):
+    # SQLite stand-in for SQL Server: attach a second database as 'dbo'
+    from sqlalchemy import create_engine, event, text
+    import utils
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(conn, _):
+        conn.execute(f"ATTACH DATABASE '{tmp_path / 'dbo.db'}' AS dbo")
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE dbo.MasterTable "
+                          "(table_name TEXT, file_name TEXT, uploaded_at TIMESTAMP)"))
+    monkeypatch.setattr("database._engine", engine)
+    monkeypatch.setattr(utils, "_summary_ready", False)
+    monkeypatch.setattr("rollups._ready", False)
+    monkeypatch.setattr(utils, "_cache", {})
+    return engine
+
+
+def test_fraud_rate_from_summary_aggregates(sqlite_engine):
+    from sqlalchemy import text
+    import utils
+
+    # A table uploaded before FraudSummary existed gets backfilled
+    legacy = pd.DataFrame({'category': ['Food', 'Food'], 'merchant': ['M1', 'M2'],
+                           'amount': ['1', '2'], 'fraud': ['1', '1']})
+    legacy.to_sql('transactions_old', sqlite_engine, schema='dbo', index=False)
+    with sqlite_engine.begin() as conn:
+        conn.execute(text("INSERT INTO dbo.MasterTable VALUES "
+                          "('transactions_old', 'old.csv', '2025-01-01 00:00:00')"))
+
+    new = pd.DataFrame({'customer': ['A', 'B', 'C', 'D'], 'category': ['Food', 'Tech', 'Tech', 'Tech'],
+                        'merchant': ['M1', 'M1', 'M2', 'M2'], 'amount': [1.0, 2.0, 3.0, 4.0],
+                        'fraud': [0, 0, 0, 1]})
+    assert utils.save_to_database(new, 'new.csv') is not None
+
+    rate = utils.get_historical_fraud_rate()
+    assert abs(rate - 50.0) < 1e-9
+
+    by_cat = utils.get_fraud_breakdown('category').set_index('value')
+    assert by_cat.loc['Food', 'row_count'] == 3
+    assert by_cat.loc['Tech', 'fraud_sum'] == 1
+
+    by_date = utils.get_fraud_breakdown('upload_date')
+    assert by_date['row_count'].sum() == 6
+    assert by_date.iloc[0]['value'] == '2025-01-01'
+
+
+def test_parse_uploaded_file_skips_duplicate_header():
+    from utils import parse_uploaded_file
+    header = "step,customer,age,gender,zipcodeOri,merchant,zipMerchant,category,amount,fraud"
+    csv = "\n".join([header, header, "1,Bob,40,M,22222,Shop,33333,Clothing,50.0,1"])
+    df = parse_uploaded_file(make_csv(csv))
+    assert df.height == 1
+    assert df["customer"][0] == "Bob"
@@ -0,0 +1,168 @@
+# training_data.py
+
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+import polars as pl
+from sqlalchemy import text
+
+from storage import batch_query, storage_mode
+
+TRAINING_COLUMNS = [
+    'step', 'customer', 'age', 'gender',
+    'zipcodeOri', 'merchant', 'zipMerchant',
+    'category', 'amount', 'fraud'
+]
+
+
+def default_snapshot_dir(model_path: str | None = None) -> str:
+    """TRAINING_SNAPSHOT_DIR, or a 'training_snapshot' directory next to MODEL_PATH."""
+    model_path = model_path or os.getenv("MODEL_PATH", "fraud_model.pkl")
+    return os.getenv("TRAINING_SNAPSHOT_DIR") or \
+        os.path.join(os.path.dirname(model_path) or ".", "training_snapshot")
+
+
+def discover_training_tables(engine, since: datetime | None) -> pd.DataFrame:
+    """
+    List MasterTable entries with a 'fraud' column uploaded at or after
+    `since` (all of them when since is None), oldest first. In fact-table
+    storage every registered upload is labelled, so no schema lookup is needed.
+    Tables written by stream_consumer keep growing after they are registered,
+    while the snapshot copies each table once, so they are left out.
+    """
+    if storage_mode() == 'fact':
+        schema_sql = """
+    SELECT m.table_name, m.uploaded_at
+      FROM dbo.MasterTable AS m
+     WHERE m.table_name LIKE 'transactions_%'
+       AND (m.file_name IS NULL OR m.file_name NOT LIKE 'stream:%')
+    """
+    else:
+        schema_sql = """
+    SELECT m.table_name, m.uploaded_at
+      FROM dbo.MasterTable AS m
+      JOIN INFORMATION_SCHEMA.COLUMNS AS c
+        ON c.TABLE_SCHEMA = 'dbo'
+       AND c.TABLE_NAME = m.table_name
+       AND c.COLUMN_NAME = 'fraud'
+     WHERE m.table_name LIKE 'transactions_%'
+       AND (m.file_name IS NULL OR m.file_name NOT LIKE 'stream:%')
+    """
+    if since is None:
+        return pd.read_sql(text(schema_sql + " ORDER BY m.uploaded_at"), engine)
+    return pd.read_sql(
+        text(schema_sql + " AND m.uploaded_at >= :since ORDER BY m.uploaded_at"),
+        engine,
+        params={"since": since}
+    )
+
+
+def read_training_table(engine, table_name: str) -> pl.DataFrame:
+    qry = batch_query(table_name, ', '.join(TRAINING_COLUMNS), "fraud IN (0,1)")
+    return pl.read_database(qry, connection=engine)
+
+
+class TrainingSnapshot:
+    """
+    Local Parquet copy of the training tables, one file per upload table,
+    plus a watermark (latest uploaded_at and the tables already copied).
+    Upload tables are immutable once registered, so each is read from SQL
+    Server exactly once; later syncs only fetch tables past the watermark.
+    """
+
+    WATERMARK_FILE = "watermark.json"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def watermark(self) -> dict:
+        path = os.path.join(self.root, self.WATERMARK_FILE)
+        if not os.path.exists(path):
+            return {"uploaded_at": None, "tables": []}
+        with open(path) as f:
+            return json.load(f)
+
+    def _save_watermark(self, state: dict):
+        path = os.path.join(self.root, self.WATERMARK_FILE)
+        with open(path + ".tmp", "w") as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def sync(self, engine, progress=None) -> int:
+        """
+        Copy tables registered since the watermark into the snapshot.
+        progress(rows) is called after each table. Returns the rows added.
+        """
+        state = self.watermark()
+        since = datetime.fromisoformat(state["uploaded_at"]) if state["uploaded_at"] else None
+        known = set(state["tables"])
+        new_tables = discover_training_tables(engine, since)
+
+        os.makedirs(self.root, exist_ok=True)
+        added = 0
+        failed = False
+        for tbl, uploaded_at in zip(new_tables['table_name'], new_tables['uploaded_at']):
+            if tbl in known:
+                continue
+            try:
+                df_part = read_training_table(engine, tbl)
+                if df_part.height:
+                    path = os.path.join(self.root, f"{tbl}.parquet")
+                    df_part.write_parquet(path + ".tmp")
+                    os.replace(path + ".tmp", path)
+                    added += df_part.height
+            except Exception as e:
+                print(f"[training_data] Skipping table {tbl} until the next sync: {e}")
+                failed = True
+                continue
+
+            # A table is only recorded once its rows are in the snapshot. The
+            # watermark time stops at the first failed table, so the next
+            # sync discovers that one again.
+            known.add(tbl)
+            state["tables"].append(tbl)
+            if not failed:
+                state["uploaded_at"] = pd.Timestamp(uploaded_at).isoformat()
+            self._save_watermark(state)
+            if progress is not None:
+                progress(added)
+
+        return added
+
+    def files(self) -> list[str]:
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(
+            os.path.join(self.root, name) for name in os.listdir(self.root)
+            if name.endswith(".parquet")
+        )
+
+    def iter_batches(self, batch_rows: int | None = None, columns: list[str] | None = None):
+        """
+        Yield the snapshot as polars frames of at most batch_rows rows
+        (TRAIN_BATCH_ROWS, default 100000), file by file, so only one batch
+        is in memory at a time. Every frame has all of `columns`
+        (TRAINING_COLUMNS by default), null where a table lacks one.
+        """
+        batch_rows = batch_rows or int(os.getenv("TRAIN_BATCH_ROWS", 100_000))
+        columns = columns or TRAINING_COLUMNS
+        for path in self.files():
+            lf = pl.scan_parquet(path)
+            present = set(lf.collect_schema().names())
+            lf = lf.select([
+                pl.col(c) if c in present else pl.lit(None, dtype=pl.Utf8).alias(c)
+                for c in columns
+            ])
+            for batch in lf.collect_batches(chunk_size=batch_rows):
+                if batch.height:
+                    yield batch
+
+    def load(self) -> pd.DataFrame | None:
+        """All snapshot rows as one DataFrame, or None if the snapshot is empty."""
+        files = self.files()
+        if not files:
+            return None
+        frames = [pl.read_parquet(path) for path in files]
+        return pl.concat(frames, how="diagonal_relaxed").to_pandas()
@@ -0,0 +1,123 @@
+# training_jobs.py
+
+import multiprocessing as mp
+import queue
+import threading
+import time
+import uuid
+
+
+def _train_worker(model_path: str, events):
+    """Child-process entry point: run a forced retrain and stream progress events."""
+    try:
+        # Imported lazily: the spawned child imports this module to find the
+        # function, and only the training itself should pay for ml_model
+        import ml_model
+        saved = ml_model.train_fraud_model(
+            force=True,
+            progress=lambda phase, rows: events.put(("progress", phase, rows)),
+            model_path=model_path
+        )
+        if saved is None:
+            events.put(("error", "Training finished without saving a model."))
+        else:
+            events.put(("done", saved))
+    except Exception as e:
+        events.put(("error", str(e)))
+
+
+class TrainingJobManager:
+    """
+    Run training jobs in a separate process and track their progress.
+    One job runs at a time; on success on_success(model_path) is called in
+    the serving process so the new model is picked up without a restart.
+    """
+
+    def __init__(self, on_success=None, target=_train_worker):
+        self.on_success = on_success
+        self.target = target
+        self._ctx = mp.get_context("spawn")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def start(self, model_path: str) -> tuple[dict, bool]:
+        """
+        Start a job unless one is already running. Returns the job status
+        and whether a new job was created.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job["state"] in ("queued", "running"):
+                    return self._snapshot(job), False
+
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "state": "queued",
+                "phase": None,
+                "rows": 0,
+                "error": None,
+                "started_at": time.time(),
+                "finished_at": None,
+            }
+            self._jobs[job["job_id"]] = job
+
+        events = self._ctx.Queue()
+        proc = self._ctx.Process(target=self.target, args=(model_path, events), daemon=True)
+        proc.start()
+        threading.Thread(target=self._monitor, args=(job, proc, events), daemon=True).start()
+        return self.get(job["job_id"]), True
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    @staticmethod
+    def _snapshot(job: dict) -> dict:
+        end = job["finished_at"] or time.time()
+        status = {k: v for k, v in job.items() if k not in ("started_at", "finished_at")}
+        status["elapsed"] = round(end - job["started_at"], 3)
+        return status
+
+    def _finish(self, job: dict, state: str, error: str | None = None):
+        with self._lock:
+            job["state"] = state
+            job["error"] = error
+            job["finished_at"] = time.time()
+
+    def _monitor(self, job: dict, proc, events):
+        with self._lock:
+            job["state"] = "running"
+        exited = False
+        while True:
+            try:
+                event = events.get(timeout=0.5)
+            except queue.Empty:
+                if exited:
+                    self._finish(job, "failed", f"Training process exited with code {proc.exitcode}.")
+                    return
+                # The child can exit before its last events are read: drain
+                # the queue once more after it is gone before giving up
+                if not proc.is_alive():
+                    proc.join()
+                    exited = True
+                continue
+
+            kind = event[0]
+            if kind == "progress":
+                with self._lock:
+                    job["phase"], job["rows"] = event[1], event[2] or job["rows"]
+            elif kind == "done":
+                proc.join()
+                try:
+                    if self.on_success is not None:
+                        self.on_success(event[1])
+                except Exception as e:
+                    self._finish(job, "failed", f"Model reload failed: {e}")
+                    return
+                self._finish(job, "succeeded")
+                return
+            else:
+                proc.join()
+                self._finish(job, "failed", event[1])
+                return
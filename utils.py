@@ -2,27 +2,104 @@
 
 import base64
 import io
+import os
+import tempfile
 import uuid
 import time
 from datetime import datetime
 
 import polars as pl
 import pandas as pd
-from sqlalchemy import create_engine, text
-import sqlalchemy
-
-# ——— Database connection ———
-SERVER = 'CND3420Y19'
-DATABASE = 'TransactionsDB'
-engine = create_engine(
-    f'mssql+pyodbc://@{SERVER}/{DATABASE}?trusted_connection=yes&driver=ODBC+Driver+17+for+SQL+Server',
-    connect_args={'fast_executemany': True}
-)
+from sqlalchemy import text, MetaData, Table, Column, String, BigInteger, DateTime
+
+from bulk_load import typed_frame
+from database import get_engine
+from response_cache import transactions_cache
+from rollups import record_rollups, rollup_rows
+from storage import batch_query, drop_batch, write_batch
+
+# ——— Database connection (see database.py; built on first use) ———
+def __getattr__(name):
+    # `utils.engine` is kept for callers written before get_engine()
+    if name == 'engine':
+        return get_engine()
+    raise AttributeError(f"module 'utils' has no attribute '{name}'")
+
 
 # ——— Cache for historical fraud rate ———
 _cache = {}
 _CACHE_TIMEOUT = 300  # seconds
 
+# ——— Running fraud aggregates, one row per (upload table, dimension, value) ———
+_summary_meta = MetaData(schema='dbo')
+fraud_summary = Table(
+    'FraudSummary', _summary_meta,
+    Column('table_name', String(128), nullable=False),
+    Column('dimension', String(32), nullable=False),
+    Column('dim_value', String(256), nullable=False),
+    Column('upload_date', String(10), nullable=False),
+    Column('uploaded_at', DateTime, nullable=False),
+    Column('fraud_sum', BigInteger, nullable=False),
+    Column('row_count', BigInteger, nullable=False),
+)
+SUMMARY_DIMENSIONS = ['category', 'merchant']
+_summary_ready = False
+
+
+def _clean_frame(df_pl: pl.DataFrame, transaction_id: str) -> pl.DataFrame:
+    """
+    Shared cleaning for whole files and streamed chunks: strip brackets from
+    column names, cast amount/fraud, fill nulls, keep fraud in (0, 1) and
+    add the upload's transaction_id.
+    """
+    df_pl.columns = [c.replace('[','').replace(']','').strip() for c in df_pl.columns]
+
+    # cast types; fraud goes through Float64 so labels written as 1.0 parse
+    # whether the column was read as numbers or as text
+    casts = [pl.col("amount").cast(pl.Float64)]
+    if 'fraud' in df_pl.columns:
+        casts.append(pl.col("fraud").cast(pl.Float64))
+    df_pl = df_pl.with_columns(casts).fill_null(0)
+    if 'fraud' in df_pl.columns:
+        df_pl = df_pl.filter(pl.col("fraud").is_in([0.0, 1.0]))\
+            .with_columns(pl.col("fraud").cast(pl.Int64))
+
+    # add transaction_id
+    return df_pl.with_columns(pl.lit(transaction_id).alias("transaction_id"))
+
+
+def _is_duplicate_header(first: str, second: str) -> bool:
+    """True if a labelled file repeats its header on the second line."""
+    header = [c.strip().lower() for c in first.strip().split(',')]
+    second_cols = [c.strip().lower() for c in second.strip().split(',')]
+    return "fraud" in header and set(second_cols) == set(header)
+
+
+def parse_uploaded_file(contents: str) -> pl.DataFrame | None:
+    """
+    Polars counterpart of process_uploaded_file. The decoded bytes are parsed
+    in place, without splitting into lines or building pandas copies.
+    Returns None on error.
+    """
+    try:
+        _, b64 = contents.split(',', 1)
+        decoded = base64.b64decode(b64)
+        if not decoded.strip():
+            raise ValueError("Empty file")
+
+        # detect & skip duplicate headers
+        lines = decoded.split(b'\n', 2)
+        dup = len(lines) > 1 and _is_duplicate_header(lines[0].decode('utf-8'),
+                                                      lines[1].decode('utf-8'))
+
+        df_pl = pl.read_csv(io.BytesIO(decoded), try_parse_dates=False,
+                            skip_rows_after_header=1 if dup else 0)
+        return _clean_frame(df_pl, str(uuid.uuid4()))
+
+    except Exception as e:
+        print(f"[utils] Error in parse_uploaded_file: {e}")
+        return None
+
 
 def process_uploaded_file(contents: str) -> pd.DataFrame | None:
     """
@@ -30,81 +107,183 @@ def process_uploaded_file(contents: str) -> pd.DataFrame | None:
     transaction_id, cast types, and return a pandas DataFrame.
     Returns None on error.
     """
+    df_pl = parse_uploaded_file(contents)
+    return df_pl.to_pandas() if df_pl is not None else None
+
+
+# Base64 characters decoded per step when streaming an upload (multiple of 4)
+_B64_CHUNK = 4 * 1024 * 1024
+
+
+def _decode_to_tempfile(contents: str) -> str:
+    """Decode a base64 data URL to a temp file in bounded-size slices."""
+    start = contents.index(',') + 1
+    fd, path = tempfile.mkstemp(suffix=".csv")
+    with os.fdopen(fd, "wb") as f:
+        for pos in range(start, len(contents), _B64_CHUNK):
+            f.write(base64.b64decode(contents[pos:pos + _B64_CHUNK]))
+    return path
+
+
+def iter_uploaded_file(contents: str, chunk_rows: int | None = None, as_polars: bool = False):
+    """
+    Streaming counterpart of process_uploaded_file: yield the upload as
+    cleaned pandas DataFrames (polars with as_polars) of at most chunk_rows
+    rows (UPLOAD_CHUNK_ROWS, default 50,000). Every column is read as text
+    and cast per chunk, so all chunks share one schema. Raises ValueError on
+    an empty file, or on a chunk that cannot be parsed or cast.
+    """
+    chunk_rows = chunk_rows or int(os.getenv("UPLOAD_CHUNK_ROWS", 50_000))
+    path = _decode_to_tempfile(contents)
     try:
-        _, b64 = contents.split(',', 1)
-        decoded = base64.b64decode(b64).decode('utf-8')
-        lines = decoded.splitlines()
-        if not lines:
+        with open(path, "rb") as f:
+            first = f.readline().decode('utf-8')
+            second = f.readline().decode('utf-8')
+        if not first.strip():
             raise ValueError("Empty file")
 
         # detect & skip duplicate headers
-        header = [c.strip().lower() for c in lines[0].split(',')]
-        if "fraud" in header and len(lines) > 1:
-            second = [c.strip().lower() for c in lines[1].split(',')]
-            if set(second) == set(header):
-                lines = lines[2:]
-
-        csv_data = "\n".join(lines)
-        df_pl = pl.read_csv(io.StringIO(csv_data), try_parse_dates=False)
-
-        # clean column names
-        clean_cols = [c.replace('[','').replace(']','').strip() for c in df_pl.columns]
-        df_pl.columns = clean_cols
-        df_pl = df_pl.fill_null(0)
-
-        # add transaction_id
-        df_pl = df_pl.with_columns(
-            pl.Series("transaction_id", [str(uuid.uuid4())] * df_pl.height)
+        dup = _is_duplicate_header(first, second)
+
+        transaction_id = str(uuid.uuid4())
+        lf = pl.scan_csv(path, infer_schema=False, skip_rows_after_header=1 if dup else 0)
+        batches = lf.collect_batches(chunk_size=chunk_rows)
+        while True:
+            try:
+                batch = next(batches, None)
+                if batch is None:
+                    return
+                chunk = _clean_frame(batch, transaction_id)
+            except pl.exceptions.PolarsError as e:
+                raise ValueError(f"Invalid file format: {e}") from e
+            yield chunk if as_polars else chunk.to_pandas()
+    finally:
+        os.remove(path)
+
+
+def _ensure_fraud_summary():
+    global _summary_ready
+    if not _summary_ready:
+        _summary_meta.create_all(get_engine(), checkfirst=True)
+        _summary_ready = True
+
+
+def summarize_fraud(df: pd.DataFrame, table_name: str, uploaded_at: datetime) -> list[dict]:
+    """
+    Aggregate one upload into FraudSummary rows: a 'total' row plus one row
+    per category and merchant, each with the fraud sum and row count.
+    """
+    if isinstance(df, pl.DataFrame):
+        df = df.select([c for c in ['fraud'] + SUMMARY_DIMENSIONS if c in df.columns]).to_pandas()
+    fraud = pd.to_numeric(df['fraud'], errors='coerce')
+    valid = df[fraud.isin([0, 1])].assign(fraud=fraud[fraud.isin([0, 1])].astype(int))
+    base = {
+        'table_name': table_name,
+        'upload_date': uploaded_at.strftime('%Y-%m-%d'),
+        'uploaded_at': uploaded_at,
+    }
+    rows = [dict(base, dimension='total', dim_value='',
+                 fraud_sum=int(valid['fraud'].sum()), row_count=int(len(valid)))]
+    for dim in SUMMARY_DIMENSIONS:
+        if dim not in valid.columns:
+            continue
+        agg = valid.groupby(valid[dim].astype(str))['fraud'].agg(['sum', 'count'])
+        rows.extend(
+            dict(base, dimension=dim, dim_value=key, fraud_sum=int(s), row_count=int(c))
+            for key, s, c in zip(agg.index, agg['sum'], agg['count'])
         )
+    return rows
 
-        # cast types
-        if 'fraud' in df_pl.columns:
-            df_pl = df_pl.with_columns([
-                pl.col("amount").cast(pl.Float64),
-                pl.col("fraud").cast(pl.Int64)
-            ]).filter(pl.col("fraud").is_in([0,1]))
-        else:
-            df_pl = df_pl.with_columns(pl.col("amount").cast(pl.Float64))
 
-        return df_pl.to_pandas()
+def new_table_name(uploaded_at: datetime) -> str:
+    # Microseconds keep two uploads in the same second from colliding
+    return f"transactions_{uploaded_at.strftime('%Y%m%d_%H%M%S_%f')}"
+
+
+def write_transactions(df: pd.DataFrame | pl.DataFrame, table_name: str,
+                       append: bool = False, progress=None) -> pl.DataFrame:
+    """
+    Bulk-load the stored columns of df, cast to their column types, as
+    upload table_name (see storage.STORAGE_MODE), replacing it unless
+    append is set. The loader comes from bulk_load.get_loader
+    (BULK_LOADER / BULK_BATCH_SIZE); progress, if given, is called as
+    progress(rows_written, total_rows) after each batch.
+    Returns the written subset.
+    """
+    subset = typed_frame(df)
+    write_batch(get_engine(), subset, table_name, append=append, progress=progress)
+    transactions_cache.clear()
+    return subset
+
 
+def drop_upload(table_name: str):
+    """Remove the rows of an upload that failed part-way through storing."""
+    try:
+        drop_batch(get_engine(), table_name)
     except Exception as e:
-        print(f"[utils] Error in process_uploaded_file: {e}")
-        return None
+        print(f"[utils] Error dropping {table_name}: {e}")
+    transactions_cache.clear()
+
+
+def register_table(table_name: str, file_name: str, uploaded_at: datetime, summary: list[dict]):
+    """Record a training table in MasterTable with its FraudSummary rows, atomically."""
+    _ensure_fraud_summary()
+    with get_engine().begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO dbo.MasterTable (table_name, file_name, uploaded_at) "
+                "VALUES (:tn, :fn, :ts)"
+            ),
+            {"tn": table_name, "fn": file_name, "ts": uploaded_at}
+        )
+        conn.execute(fraud_summary.insert(), summary)
+    _cache.pop('fraud_rate', None)
+    transactions_cache.clear()
+
+
+def add_fraud_summary(rows: list[dict]):
+    """Add FraudSummary rows for more rows of an already registered table."""
+    _ensure_fraud_summary()
+    with get_engine().begin() as conn:
+        conn.execute(fraud_summary.insert(), rows)
+    _cache.pop('fraud_rate', None)
 
 
-def save_to_database(df: pd.DataFrame, file_name: str = "") -> str | None:
+def merge_summary_rows(rows: list[dict]) -> list[dict]:
+    """Combine FraudSummary rows from several chunks of the same upload."""
+    merged = {}
+    for row in rows:
+        key = (row['dimension'], row['dim_value'])
+        if key in merged:
+            merged[key]['fraud_sum'] += row['fraud_sum']
+            merged[key]['row_count'] += row['row_count']
+        else:
+            merged[key] = dict(row)
+    return list(merged.values())
+
+
+def save_to_database(df: pd.DataFrame | pl.DataFrame, file_name: str = "",
+                     progress=None) -> str | None:
     """
-    Write the given DataFrame to transactions_<timestamp>.
-    Only tables with a 'fraud' column are recorded in MasterTable.
+    Write the given DataFrame (pandas or polars) to transactions_<timestamp>
+    with typed columns, reporting progress(rows_written, total_rows).
+    Only tables with a 'fraud' column are recorded in MasterTable, together
+    with their FraudSummary aggregates in the same transaction; every
+    upload's rows are added to the dashboard rollups (see rollups.py).
     Returns the table name or None on failure.
     """
-    table_name = f"transactions_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    uploaded_at = datetime.now()
+    table_name = new_table_name(uploaded_at)
     try:
-        required = ['customer','zipcodeOri','merchant','zipMerchant','category','amount','fraud']
-        subset = df[[c for c in required if c in df.columns]].copy()
-        subset.columns = [c.replace('[','').replace(']','') for c in subset.columns]
-
-        subset.to_sql(
-            table_name,
-            engine,
-            if_exists='replace',
-            index=False,
-            chunksize=5000,
-            dtype={col: sqlalchemy.types.String() for col in subset.columns}
-        )
+        subset = write_transactions(df, table_name, progress=progress)
 
         # record only training tables
         if 'fraud' in subset.columns:
-            with engine.begin() as conn:
-                conn.execute(
-                    text(
-                        "INSERT INTO dbo.MasterTable (table_name, file_name, uploaded_at) "
-                        "VALUES (:tn, :fn, GETDATE())"
-                    ),
-                    {"tn": table_name, "fn": file_name}
-                )
+            register_table(table_name, file_name, uploaded_at,
+                           summarize_fraud(subset, table_name, uploaded_at))
 
+        # every upload feeds the dashboard history
+        record_rollups(rollup_rows(subset, table_name, uploaded_at))
         return table_name
 
     except Exception as e:
@@ -112,39 +291,60 @@ def save_to_database(df: pd.DataFrame, file_name: str = "") -> str | None:
         return None
 
 
+def backfill_fraud_summary() -> int:
+    """
+    One-off scan of MasterTable entries that predate FraudSummary, so the
+    aggregates cover the whole history. Returns the number of tables added.
+    """
+    _ensure_fraud_summary()
+    missing_sql = """
+    SELECT m.table_name, m.uploaded_at
+      FROM dbo.MasterTable AS m
+     WHERE m.table_name LIKE 'transactions_%'
+       AND NOT EXISTS (SELECT 1 FROM dbo.FraudSummary AS s
+                        WHERE s.table_name = m.table_name)
+    """
+    missing = pd.read_sql(text(missing_sql), get_engine())
+    added = 0
+    for tbl, uploaded_at in zip(missing['table_name'], missing['uploaded_at']):
+        try:
+            df = pd.read_sql(batch_query(tbl), get_engine())
+            if 'fraud' not in df.columns:
+                continue
+            rows = summarize_fraud(df, tbl, pd.Timestamp(uploaded_at).to_pydatetime())
+            with get_engine().begin() as conn:
+                conn.execute(fraud_summary.insert(), rows)
+            added += 1
+        except Exception as e:
+            print(f"[utils] Skipping backfill of {tbl}: {e}")
+    return added
+
+
 def get_historical_fraud_rate() -> float | None:
     """
-    Compute and cache the overall fraud rate across tables that truly
-    contain a 'fraud' column. Returns percentage 0–100, or None.
+    Overall fraud rate from the FraudSummary totals, as a percentage 0–100,
+    or None. Tables registered before FraudSummary existed are backfilled on
+    the first call.
     """
     now = time.time()
     if 'fraud_rate' in _cache and now - _cache['ts'] < _CACHE_TIMEOUT:
         return _cache['fraud_rate']
 
     try:
-        schema_sql = """
-        SELECT m.table_name
-        FROM dbo.MasterTable AS m
-        JOIN INFORMATION_SCHEMA.COLUMNS AS c
-          ON c.TABLE_SCHEMA = 'dbo'
-         AND c.TABLE_NAME = m.table_name
-         AND c.COLUMN_NAME = 'fraud'
-        WHERE m.table_name LIKE 'transactions_%'
-        """
-        tbls = pd.read_sql(schema_sql, engine)
-        if tbls.empty:
-            return None
+        if not _cache.get('backfilled'):
+            backfill_fraud_summary()
+            _cache['backfilled'] = True
 
-        unions = [
-            f"SELECT fraud FROM dbo.{t} WHERE fraud IN (0,1)"
-            for t in tbls['table_name']
-        ]
-        full_q = " UNION ALL ".join(unions)
-        df_all = pd.read_sql(full_q, engine)
-        if df_all.empty:
+        totals = pd.read_sql(
+            text("SELECT SUM(fraud_sum) AS fraud_sum, SUM(row_count) AS row_count "
+                 "FROM dbo.FraudSummary WHERE dimension = 'total'"),
+            get_engine()
+        )
+        row_count = totals.loc[0, 'row_count'] if not totals.empty else None
+        if pd.isna(row_count) or not row_count:
             return None
 
-        rate = df_all['fraud'].astype(int).mean() * 100
+        rate = float(totals.loc[0, 'fraud_sum']) / float(row_count) * 100
         _cache['fraud_rate'] = rate
         _cache['ts'] = now
         return rate
@@ -152,3 +352,34 @@ def get_historical_fraud_rate() -> float | None:
     except Exception as e:
         print(f"[utils] Error in get_historical_fraud_rate: {e}")
         return None
+
+
+def get_fraud_breakdown(dimension: str) -> pd.DataFrame | None:
+    """
+    Fraud sum, row count and rate (%) per value of `dimension`: 'category',
+    'merchant' or 'upload_date'. Reads FraudSummary only.
+    """
+    try:
+        if dimension == 'upload_date':
+            qry = text(
+                "SELECT upload_date AS value, SUM(fraud_sum) AS fraud_sum, "
+                "SUM(row_count) AS row_count FROM dbo.FraudSummary "
+                "WHERE dimension = 'total' GROUP BY upload_date ORDER BY upload_date"
+            )
+            df = pd.read_sql(qry, get_engine())
+        elif dimension in SUMMARY_DIMENSIONS:
+            qry = text(
+                "SELECT dim_value AS value, SUM(fraud_sum) AS fraud_sum, "
+                "SUM(row_count) AS row_count FROM dbo.FraudSummary "
+                "WHERE dimension = :dim GROUP BY dim_value ORDER BY dim_value"
+            )
+            df = pd.read_sql(qry, get_engine(), params={"dim": dimension})
+        else:
+            raise ValueError(f"Unknown dimension '{dimension}'")
+
+        df['fraud_rate'] = df['fraud_sum'] / df['row_count'].where(df['row_count'] > 0) * 100
+        return df
+
+    except Exception as e:
+        print(f"[utils] Error in get_fraud_breakdown: {e}")
+        return None